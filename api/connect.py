@@ -1,5 +1,23 @@
+from eth_utils import to_bytes
+
 from utils.config import load_config
-from utils.contract import connect_to_web3
+
+
+def load_private_key(config):
+    """Load the private key without connecting to web3.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+
+    Returns
+    -------
+    private_key : bytes
+        The private key.
+    """
+
+    return to_bytes(hexstr=config['account']['private_key'])
 
 
 def connect_to_network(config_file):
@@ -19,15 +37,22 @@ def connect_to_network(config_file):
     private_key : str
         The private key.
     """
+    # Imported here so offline signers do not load the web3 stack
+    from utils.contract import connect_to_web3
+    from utils.rpc_cache import create_block_cache
+
     # Load config
     config = load_config(config_file)
     network = config['network']['network']
     api_key = config['network']['api_key']
+    endpoints = config['network'].get('endpoints')
+    hedge = config['network'].getboolean('hedge', fallback=False)
 
     # Connect to web3
-    w3, status = connect_to_web3(network, api_key)
+    w3, status = connect_to_web3(network, api_key, endpoints, hedge)
+    create_block_cache(w3, config)
 
     # Load the private key
-    private_key = w3.to_bytes(hexstr=config['account']['private_key'])
+    private_key = load_private_key(config)
 
     return w3, status, private_key
@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel
 
 
@@ -8,6 +10,18 @@ class TokenData(BaseModel):
     token_id: str
 
 
+class TokenBatchData(BaseModel):
+    """Token batch data model."""
+
+    tokens: List[TokenData]
+
+
+class TokenIdsData(BaseModel):
+    """Token IDs data model."""
+
+    token_ids: List[str]
+
+
 class UnauthorizedMessage(BaseModel):
     """Unauthorized message model."""
 
@@ -1,22 +1,66 @@
 """Main module of the API."""
 
+import asyncio
 import sys
 
+import requests
+
 from fastapi import FastAPI
 from fastapi import Header
 from fastapi import HTTPException
 from starlette import status
 
-from utils.signer import sign_message
+from utils.cache import create_signature_cache
+from utils.config import load_config
+from utils.executor import create_signing_executor
+from utils.rpc import EndpointError
+from utils.rpc import RPCError
+from utils.signer import MessageSigner
+from utils.signer import build_message
+from utils.sigtable import load_signature_table
+from api.schemas import TokenBatchData
 from api.schemas import TokenData
+from api.schemas import TokenIdsData
 from api.schemas import UnauthorizedMessage
 from api.connect import connect_to_network
+from api.connect import load_private_key
+
+config = load_config('config.ini')
+
+# In offline mode only the signing key is loaded, without any RPC provider
+offline = config.getboolean('signer', 'offline', fallback=False)
+
+status_reader = None
+
+if offline:
+    w3, private_key = None, load_private_key(config)
+else:
+    # Connect to web3
+    w3, connection, private_key = connect_to_network('config.ini')
+
+    if not connection:
+        sys.exit(1)
+
+    # Only load the contract when token statuses are served
+    if config.getboolean('status', 'enabled', fallback=False):
+        # Imported here so signers without token statuses skip the contract
+        from utils.contract import load_contract
+        from utils.status import create_token_status_reader
+
+        # Serve token statuses from a cache, coalescing the chain reads
+        contract = load_contract(w3, config['contract']['address'],
+                                 config['contract']['abi'])
+        status_reader = create_token_status_reader(config, w3, contract)
+
+# Parse the signing key once and create the pool that signs off the event loop
+signer = MessageSigner(private_key)
+executor = create_signing_executor(config, signer)
 
-# Connect to web3
-w3, connection, private_key = connect_to_network('config.ini')
+# Cache issued signatures, bound to the address of the signing key
+cache = create_signature_cache(config, signer.address)
 
-if not connection:
-    sys.exit(1)
+# Serve the signatures generated ahead of a drop from a mapped table
+signature_table = load_signature_table(config, signer.address)
 
 # Create app
 app = FastAPI()
@@ -24,6 +68,9 @@ app = FastAPI()
 # Set access tokens
 known_tokens = set([''])
 
+# Maximum number of items accepted by the batch route
+MAX_BATCH_SIZE = 1000
+
 
 @app.get("/")
 async def root() -> dict:
@@ -32,17 +79,36 @@ async def root() -> dict:
     return {"message": "This API is up and running!"}
 
 
-# Post a message with parameters token_id and wallet_address
-@app.post(
-    "/sign_message",
+@app.get("/health")
+async def health_route(rpc: bool = False) -> dict:
+    """Health of the signer, optionally probing the RPC connection."""
+
+    response = {"signer": signer.address, "offline": offline}
+
+    if rpc and w3 is not None:
+        loop = asyncio.get_running_loop()
+        response["rpc_connected"] = await loop.run_in_executor(
+            None, w3.is_connected)
+
+    return response
+
+
+@app.on_event("shutdown")
+def shutdown() -> None:
+    """Release the signing pool when the API stops."""
+
+    executor.shutdown()
+
+
+@app.get(
+    "/stats",
     response_model=dict,
     responses={status.HTTP_401_UNAUTHORIZED: {
         'model': UnauthorizedMessage
     }},
 )
-async def sign_message_route(
-    token_data: TokenData, auth_token: str = Header()) -> str:
-    """Protected path of the API."""
+async def stats_route(auth_token: str = Header()) -> dict:
+    """Protected path with signing pool and signature cache statistics."""
 
     if auth_token not in known_tokens:
         raise HTTPException(
@@ -50,28 +116,178 @@ async def sign_message_route(
             detail=UnauthorizedMessage().detail,
         )
 
-    data = token_data.dict()
+    response = {"executor": executor.stats(), "cache": cache.stats()}
+
+    if signature_table is not None:
+        response["signature_table"] = signature_table.stats()
+
+    if status_reader is not None:
+        response["token_status"] = status_reader.stats()
+
+    return response
+
+
+def parse_token_ids(token_ids):
+    """Parse hex token IDs, raising a 400 error for invalid ones."""
 
     try:
-        token_id = int(data['token_id'], 16)
+        return [int(token_id, 16) for token_id in token_ids]
     except ValueError as exc:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid token_id!",
         ) from exc
 
-    wallet_address = data['address']
 
-    if len(wallet_address) != 42:
+async def read_token_statuses(token_ids):
+    """Read the status of tokens, raising a 503 error if they are disabled.
+
+    Errors of the node reading them raise a 502 error, and nodes that cannot
+    be reached a 503 error.
+
+    Parameters
+    ----------
+    token_ids : list
+        List of hex token IDs.
+
+    Returns
+    -------
+    results : list
+        The `token_id`, `exists`, `owner` and `token_uri` of each token.
+    """
+
+    if status_reader is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Token status is not enabled!",
+        )
+
+    token_numbers = parse_token_ids(token_ids)
+
+    try:
+        statuses = await status_reader.get_many(token_numbers)
+    except RPCError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Token status read failed!",
+        ) from exc
+    except (EndpointError, requests.RequestException) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Token status is unavailable!",
+        ) from exc
+
+    return [{
+        "token_id": token_id,
+        **statuses[token_number]
+    } for token_id, token_number in zip(token_ids, token_numbers)]
+
+
+@app.get(
+    "/token_status/{token_id}",
+    response_model=dict,
+    responses={status.HTTP_401_UNAUTHORIZED: {
+        'model': UnauthorizedMessage
+    }},
+)
+async def token_status_route(
+    token_id: str, auth_token: str = Header()) -> dict:
+    """Protected path with the existence, owner and URI of a token."""
+
+    if auth_token not in known_tokens:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=UnauthorizedMessage().detail,
+        )
+
+    return (await read_token_statuses([token_id]))[0]
+
+
+@app.post(
+    "/token_status",
+    response_model=dict,
+    responses={status.HTTP_401_UNAUTHORIZED: {
+        'model': UnauthorizedMessage
+    }},
+)
+async def token_statuses_route(
+    token_ids_data: TokenIdsData, auth_token: str = Header()) -> dict:
+    """Protected path with the existence, owner and URI of many tokens."""
+
+    if auth_token not in known_tokens:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=UnauthorizedMessage().detail,
+        )
+
+    if len(token_ids_data.token_ids) > MAX_BATCH_SIZE:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Address is probably wrong!",
+            detail=f"Batch is limited to {MAX_BATCH_SIZE} items!",
+        )
+
+    return {"results": await read_token_statuses(token_ids_data.token_ids)}
+
+
+async def sign(message):
+    """Sign a message, reusing a pre-generated or cached signature.
+
+    Parameters
+    ----------
+    message : str
+        The message to sign.
+
+    Returns
+    -------
+    message_hash : str
+        The message hash.
+    signature : str
+        The signature.
+    """
+
+    if signature_table is not None:
+        signed = signature_table.get(message)
+
+        if signed is not None:
+            return signed
+
+    signed = cache.get(message)
+
+    if signed is None:
+        signed = await executor.sign(message)
+        cache.put(message, signed)
+
+    return signed
+
+
+# Post a message with parameters token_id and wallet_address
+@app.post(
+    "/sign_message",
+    response_model=dict,
+    responses={status.HTTP_401_UNAUTHORIZED: {
+        'model': UnauthorizedMessage
+    }},
+)
+async def sign_message_route(
+    token_data: TokenData, auth_token: str = Header()) -> str:
+    """Protected path of the API."""
+
+    if auth_token not in known_tokens:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=UnauthorizedMessage().detail,
         )
 
-    message = f"{wallet_address}_{token_id}"
+    try:
+        message = build_message(token_data.dict())
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
 
     # Sign the message
-    message_hash, signature = sign_message(w3, private_key, message)
+    message_hash, signature = await sign(message)
 
     response = {
         "message": message,
@@ -80,3 +296,59 @@ async def sign_message_route(
     }
 
     return response
+
+
+# Post many messages at once, each with parameters token_id and wallet_address
+@app.post(
+    "/sign_messages",
+    response_model=dict,
+    responses={status.HTTP_401_UNAUTHORIZED: {
+        'model': UnauthorizedMessage
+    }},
+)
+async def sign_messages_route(
+    batch_data: TokenBatchData, auth_token: str = Header()) -> dict:
+    """Protected path of the API to sign a batch of messages.
+
+    Every item is validated on its own, so a bad entry is reported in its
+    own result and does not fail the rest of the batch.
+    """
+
+    if auth_token not in known_tokens:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=UnauthorizedMessage().detail,
+        )
+
+    if len(batch_data.tokens) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch is limited to {MAX_BATCH_SIZE} items!",
+        )
+
+    messages, results = [], []
+    for token_data in batch_data.tokens:
+        data = token_data.dict()
+
+        try:
+            message = build_message(data)
+        except ValueError as exc:
+            results.append({**data, "error": str(exc)})
+            continue
+
+        messages.append((len(results), message))
+        results.append(None)
+
+    # Sign all the valid messages concurrently in the pool
+    signatures = await asyncio.gather(
+        *[sign(message) for _, message in messages])
+
+    for (index, message), (message_hash, signature) in zip(
+            messages, signatures):
+        results[index] = {
+            "message": message,
+            "message_hash": message_hash,
+            "signature": signature
+        }
+
+    return {"results": results}
@@ -0,0 +1 @@
+"""Pytest configuration, so the tests import `utils` from the repository."""
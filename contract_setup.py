@@ -6,9 +6,16 @@ from utils.config import load_config
 from utils.config import setup_custom_logger
 from utils.contract import connect_to_web3
 from utils.contract import load_contract
+from utils.transaction import send_transaction
+from utils.transaction import wait_for_receipt
 
 
-def set_token_uri(w3, contract, private_key, owner_address, token_uri):
+def set_token_uri(w3,
+                  contract,
+                  private_key,
+                  owner_address,
+                  token_uri,
+                  wait=True):
     """Set the vault address.
 
     Parameters
@@ -23,6 +30,9 @@ def set_token_uri(w3, contract, private_key, owner_address, token_uri):
         The owner address.
     token_uri : str
         The token URI.
+    wait : bool, optional
+        Wait for the transaction receipt, by default True. Otherwise the
+        transaction hash is returned right after sending the transaction.
 
     Returns
     -------
@@ -32,19 +42,14 @@ def set_token_uri(w3, contract, private_key, owner_address, token_uri):
 
     logger = logging.getLogger('minter')
 
-    txn = contract.functions.setBaseURI(token_uri).build_transaction({
-        'nonce':
-        w3.eth.get_transaction_count(owner_address),
-        'gas':
-        1000000
-    })
+    # Send the transaction and wait for the transaction receipt if required
+    txn_hash = send_transaction(w3, contract.functions.setBaseURI(token_uri),
+                                private_key, owner_address, {})
 
-    # Sign the transaction
-    txn_signed = w3.eth.account.sign_transaction(txn, private_key)
+    if not wait:
+        return txn_hash.hex()
 
-    # Send the transaction and wait for the transaction receipt
-    txn_hash = w3.eth.send_raw_transaction(txn_signed.rawTransaction)
-    txn_receipt = w3.eth.wait_for_transaction_receipt(txn_hash)
+    txn_receipt = wait_for_receipt(w3, txn_hash, owner_address)
     txn_receipt = txn_receipt.transactionHash.hex()
 
     log_msg = f"TXN with hash: { txn_receipt }"
@@ -53,7 +58,12 @@ def set_token_uri(w3, contract, private_key, owner_address, token_uri):
     return txn_receipt
 
 
-def set_signer_address(w3, contract, private_key, owner_address, signer):
+def set_signer_address(w3,
+                       contract,
+                       private_key,
+                       owner_address,
+                       signer,
+                       wait=True):
     """Set the vault address.
 
     Parameters
@@ -68,6 +78,9 @@ def set_signer_address(w3, contract, private_key, owner_address, signer):
         The owner address.
     signer : str
         The signer address.
+    wait : bool, optional
+        Wait for the transaction receipt, by default True. Otherwise the
+        transaction hash is returned right after sending the transaction.
 
     Returns
     -------
@@ -77,21 +90,14 @@ def set_signer_address(w3, contract, private_key, owner_address, signer):
 
     logger = logging.getLogger('minter')
 
-    txn = contract.functions.setSigner(signer).build_transaction({
-        'nonce':
-        w3.eth.get_transaction_count(owner_address),
-        'gas':
-        800000,
-        'maxFeePerGas':
-        100000000,
-    })
-
-    # Sign the transaction
-    txn_signed = w3.eth.account.sign_transaction(txn, private_key)
-
-    # Send the transaction and wait for the transaction receipt
-    txn_hash = w3.eth.send_raw_transaction(txn_signed.rawTransaction)
-    txn_receipt = w3.eth.wait_for_transaction_receipt(txn_hash)
+    # Send the transaction and wait for the transaction receipt if required
+    txn_hash = send_transaction(w3, contract.functions.setSigner(signer),
+                                private_key, owner_address, {})
+
+    if not wait:
+        return txn_hash.hex()
+
+    txn_receipt = wait_for_receipt(w3, txn_hash, owner_address)
     txn_receipt = txn_receipt.transactionHash.hex()
 
     log_msg = f"TXN with hash: { txn_receipt }"
@@ -109,7 +115,10 @@ def main():
 
     # Connect to web3
     w3, status = connect_to_web3(network=config['network']['network'],
-                                 api_key=config['network']['api_key'])
+                                 api_key=config['network']['api_key'],
+                                 endpoints=config['network'].get('endpoints'),
+                                 hedge=config['network'].getboolean(
+                                     'hedge', fallback=False))
     private_key = config['account']['private_key']
     address = config['account']['address']
 
@@ -15,7 +15,10 @@ def main():
 
     # Connect to web3
     w3, status = connect_to_web3(network=config['network']['network'],
-                                 api_key=config['network']['api_key'])
+                                 api_key=config['network']['api_key'],
+                                 endpoints=config['network'].get('endpoints'),
+                                 hedge=config['network'].getboolean(
+                                     'hedge', fallback=False))
     private_key = config['account']['private_key']
     address = config['account']['address']
 
@@ -16,7 +16,10 @@ def main():
 
     # Connect to web3
     w3, status = connect_to_web3(network=config['network']['network'],
-                                 api_key=config['network']['api_key'])
+                                 api_key=config['network']['api_key'],
+                                 endpoints=config['network'].get('endpoints'),
+                                 hedge=config['network'].getboolean(
+                                     'hedge', fallback=False))
 
     if status:
         connection_msg = 'Web3 connection successful!'
@@ -0,0 +1,104 @@
+"""Script to prefetch the metadata of tokens into the local cache."""
+
+import argparse
+import json
+
+from tqdm import tqdm
+
+from utils.config import load_config
+from utils.config import setup_custom_logger
+from utils.contract import connect_to_web3
+from utils.contract import load_contract
+from utils.metadata import MetadataCache
+from utils.metadata import fetch_metadata
+
+
+def resolve_base_uri(config):
+    """Read the base token URI of the contract.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+
+    Returns
+    -------
+    base_uri : str
+        The base token URI.
+    """
+
+    w3, status = connect_to_web3(network=config['network']['network'],
+                                 api_key=config['network']['api_key'],
+                                 endpoints=config['network'].get('endpoints'),
+                                 hedge=config['network'].getboolean(
+                                     'hedge', fallback=False))
+
+    if not status:
+        assert False, 'Web3 connection failed!'
+
+    contract = load_contract(w3, config['contract']['address'],
+                             config['contract']['abi'])
+
+    return contract.functions.getBaseURI().call()
+
+
+def main():
+    """Fetch the metadata of the tokens of a JSON file."""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tokens',
+                        default='../event-listener/tokens.json',
+                        help='JSON file whose keys are hex tokens')
+    parser.add_argument('--base-uri',
+                        default=None,
+                        help='Base token URI, by default read from the '
+                        'contract')
+    parser.add_argument('--output',
+                        default=None,
+                        help='JSON file to write the metadata to')
+    args = parser.parse_args()
+
+    # Load config and setup logger
+    config = load_config('config.ini')
+    logger = setup_custom_logger()
+
+    with open(args.tokens, encoding='utf-8') as f:
+        token_ids = [int(token, 16) for token in json.load(f)]
+
+    base_uri = args.base_uri or resolve_base_uri(config)
+    print(f'[INFO] Base URI: {base_uri}')
+
+    cache = MetadataCache(
+        config.get('metadata', 'cache_dir', fallback='metadata_cache'))
+
+    with tqdm(total=len(token_ids), unit='token') as progress:
+        metadata = fetch_metadata(
+            base_uri,
+            token_ids,
+            cache,
+            workers=config.getint('metadata', 'workers', fallback=16),
+            retries=config.getint('metadata', 'retries', fallback=3),
+            backoff=config.getfloat('metadata', 'backoff', fallback=0.5),
+            timeout=config.getfloat('metadata', 'timeout', fallback=10),
+            max_age=config.getfloat('metadata', 'max_age', fallback=0) or None,
+            progress=progress)
+
+    cache.close()
+
+    failed = [token_id for token_id, data in metadata.items() if data is None]
+    log_msg = (f'Fetched metadata of {len(metadata) - len(failed)} tokens, '
+               f'{len(failed)} failed')
+    print(f'[INFO] {log_msg}')
+    logger.info(log_msg)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(
+                {hex(token_id): data
+                 for token_id, data in metadata.items()},
+                f,
+                indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Script to mint a drop of tokens through the streaming mint pipeline."""
+
+import argparse
+import json
+
+from utils.config import load_config
+from utils.config import setup_custom_logger
+from utils.contract import connect_to_web3
+from utils.contract import load_contract
+from utils.pipeline import create_mint_pipeline
+from utils.rpc_cache import create_block_cache
+from utils.token_ids import create_token_id_buffer
+
+
+def main():
+    """Mint tokens from the token service until the count is reached."""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count',
+                        type=int,
+                        required=True,
+                        help='Number of tokens to mint')
+    parser.add_argument('--output',
+                        default=None,
+                        help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    # Load config and setup logger
+    config = load_config('config.ini')
+    logger = setup_custom_logger()
+
+    # Connect to web3
+    w3, status = connect_to_web3(network=config['network']['network'],
+                                 api_key=config['network']['api_key'],
+                                 endpoints=config['network'].get('endpoints'),
+                                 hedge=config['network'].getboolean(
+                                     'hedge', fallback=False))
+
+    if status:
+        connection_msg = 'Web3 connection successful!'
+        print(f'[INFO] {connection_msg}')
+        logger.info(connection_msg)
+    else:
+        assert False, 'Web3 connection failed!'
+
+    # Serve repeated reads from the cache
+    create_block_cache(w3, config)
+
+    # Load the contract
+    contract = load_contract(w3, config['contract']['address'],
+                             config['contract']['abi'])
+
+    with create_token_id_buffer(config) as token_ids:
+        pipeline = create_mint_pipeline(config, w3, contract, token_ids.get)
+        results = pipeline.run(args.count)
+
+    minted = sum(1 for result in results if result['status'] == 'success')
+    log_msg = f'Minted {minted} of {args.count} tokens'
+    print(f'[INFO] {log_msg}')
+    logger.info(log_msg)
+
+    for name, stats in pipeline.stats().items():
+        log_msg = (f"Stage {name}: {stats['processed']} processed, "
+                   f"{stats['failed']} failed, "
+                   f"{stats['throughput']:.2f} items/s")
+        if stats['mean_latency'] is not None:
+            log_msg += f", {stats['mean_latency']:.3f}s mean latency"
+        print(f'[INFO] {log_msg}')
+        logger.info(log_msg)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
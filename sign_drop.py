@@ -0,0 +1,61 @@
+"""Script to pre-generate the signatures of a drop into a signature table."""
+
+import argparse
+import json
+import time
+
+from api.connect import load_private_key
+from utils.config import load_config
+from utils.config import setup_custom_logger
+from utils.signer import MessageSigner
+from utils.signer import build_message
+from utils.sigtable import build_signature_table
+
+
+def main():
+    """Sign the items of a drop manifest on all cores."""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--manifest',
+                        required=True,
+                        help='JSON list of items with address and hex '
+                        'token_id fields')
+    parser.add_argument('--output',
+                        default='signatures.bin',
+                        help='Signature table file to write')
+    parser.add_argument('--workers',
+                        type=int,
+                        default=0,
+                        help='Number of worker processes, 0 uses all CPUs')
+    args = parser.parse_args()
+
+    # Load config and setup logger
+    config = load_config('config.ini')
+    logger = setup_custom_logger()
+
+    with open(args.manifest, encoding='utf-8') as f:
+        items = json.load(f)
+
+    # Invalid items are reported like the API does, and left out
+    messages = []
+    for item in items:
+        try:
+            messages.append(build_message(item))
+        except (ValueError, KeyError) as exc:
+            logger.warning(f'Skipping manifest item {item}: {exc}')
+
+    signer = MessageSigner(load_private_key(config))
+
+    start = time.monotonic()
+    count = build_signature_table(messages, signer, args.output, args.workers)
+    elapsed = time.monotonic() - start
+
+    log_msg = (f'Wrote {count} signatures of {signer.address} to '
+               f'{args.output} in {elapsed:.1f}s, '
+               f'{len(items) - len(messages)} items skipped')
+    print(f'[INFO] {log_msg}')
+    logger.info(log_msg)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Indexer syncs through the pooled provider against stub JSON-RPC nodes."""
+
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from web3 import Web3
+
+from utils.indexer import TRANSFER_TOPIC
+from utils.indexer import OwnershipIndex
+from utils.indexer import sync_index
+from utils.rpc_pool import PooledHTTPProvider
+
+CONTRACT = '0x' + '11' * 20
+OWNER = '0x' + '22' * 20
+HEAD = 64
+MAX_RANGE = 8
+
+
+def _log(block):
+    # One mint of token `block` to OWNER in each block
+    word = f'0x{block:064x}'
+    topics = [TRANSFER_TOPIC, f'0x{0:064x}', f'0x{OWNER[2:]:0>64}', word]
+
+    return {
+        'address': CONTRACT,
+        'blockHash': word,
+        'blockNumber': hex(block),
+        'data': '0x',
+        'logIndex': '0x0',
+        'removed': False,
+        'topics': topics,
+        'transactionHash': word,
+        'transactionIndex': '0x0',
+    }
+
+
+def _serve(rejected):
+    """Start a stub node rejecting log queries over MAX_RANGE blocks.
+
+    `rejected` is called with the JSON-RPC request of each rejected query
+    and returns its error object.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(
+                self.rfile.read(int(self.headers['Content-Length'])))
+            response = {'jsonrpc': '2.0', 'id': request['id']}
+
+            if request['method'] == 'eth_blockNumber':
+                response['result'] = hex(HEAD)
+            elif request['method'] == 'eth_getLogs':
+                query = request['params'][0]
+                from_block = int(query['fromBlock'], 16)
+                to_block = int(query['toBlock'], 16)
+
+                if to_block - from_block + 1 > MAX_RANGE:
+                    response['error'] = rejected(request)
+                else:
+                    response['result'] = [
+                        _log(block)
+                        for block in range(from_block, to_block + 1)
+                    ]
+            else:
+                response['error'] = {
+                    'code': -32601,
+                    'message': 'method not found'
+                }
+
+            body = json.dumps(response).encode()
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except OSError:
+                # The client timed out and closed the connection
+                pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = OwnershipIndex(str(tmp_path / 'index.db'))
+    yield index
+    index.close()
+
+
+def _sync(urls, index, timeout=5):
+    provider = PooledHTTPProvider(urls, request_kwargs={'timeout': timeout})
+    w3 = Web3(provider)
+
+    last_block = sync_index(w3,
+                            CONTRACT,
+                            index,
+                            confirmations=0,
+                            block_range=32)
+
+    return provider, last_block
+
+
+def test_sync_shrinks_range_on_log_limit_errors(index):
+    servers = [
+        _serve(lambda request: {
+            'code': -32005,
+            'message': 'query returned more than 10000 results',
+        }) for _ in range(2)
+    ]
+
+    try:
+        provider, last_block = _sync([
+            f'http://127.0.0.1:{server.server_address[1]}'
+            for server in servers
+        ], index)
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    assert last_block == HEAD
+    assert index.count() == HEAD + 1
+    assert index.tokens_of(OWNER) == list(range(HEAD + 1))
+
+    # The rejected queries were not failed over, the endpoints are healthy
+    assert all(endpoint.healthy() for endpoint in provider.endpoints)
+    assert all(endpoint.error_rate == 0 for endpoint in provider.endpoints)
+
+
+def test_sync_shrinks_range_on_timeouts(index):
+
+    def rejected(request):
+        time.sleep(1)
+        return {'code': -32000, 'message': 'too slow'}
+
+    server = _serve(rejected)
+
+    try:
+        _, last_block = _sync([f'http://127.0.0.1:{server.server_address[1]}'],
+                              index,
+                              timeout=0.2)
+    finally:
+        server.shutdown()
+
+    assert last_block == HEAD
+    assert index.tokens_of(OWNER) == list(range(HEAD + 1))
@@ -0,0 +1,153 @@
+"""Metadata fetches through the cache against a stub HTTP server."""
+
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from utils.metadata import MetadataCache
+from utils.metadata import fetch_metadata
+
+LAST_MODIFIED = 'Wed, 01 Jan 2025 00:00:00 GMT'
+
+
+def _metadata(token_id):
+    return {'name': f'Item #{token_id}'}
+
+
+class StubServer:
+    """Stub metadata server counting the requests of each path.
+
+    Even token IDs are served with an `ETag` and odd ones with a
+    `Last-Modified` header. The first `failures[path]` requests of a path
+    answer 503.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.failures = {}
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.handle(self)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.base_uri = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def count(self, path):
+        return sum(1 for request in self.requests if request[0] == path)
+
+    def handle(self, handler):
+        path = handler.path
+        token_id = int(path.strip('/'))
+
+        with self._lock:
+            self.requests.append((path, dict(handler.headers)))
+            failing = self.failures.get(path, 0) > 0
+            if failing:
+                self.failures[path] -= 1
+
+        if failing:
+            handler.send_response(503)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        if token_id % 2 == 0:
+            etag = f'"token-{token_id}"'
+            headers = {'ETag': etag}
+            fresh = handler.headers.get('If-None-Match') == etag
+        else:
+            headers = {'Last-Modified': LAST_MODIFIED}
+            fresh = handler.headers.get('If-Modified-Since') == LAST_MODIFIED
+
+        if fresh:
+            handler.send_response(304)
+            for name, value in headers.items():
+                handler.send_header(name, value)
+            handler.end_headers()
+            return
+
+        body = json.dumps(_metadata(token_id)).encode()
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = MetadataCache(str(tmp_path / 'cache'))
+    yield cache
+    cache.close()
+
+
+def test_revalidates_with_conditional_requests(server, cache):
+    token_ids = [1, 2, 3, 4]
+    expected = {token_id: _metadata(token_id) for token_id in token_ids}
+
+    assert fetch_metadata(server.base_uri, token_ids, cache) == expected
+    assert fetch_metadata(server.base_uri, token_ids, cache) == expected
+
+    for token_id in token_ids:
+        path = f'/{token_id}'
+        first, second = [
+            headers for request_path, headers in server.requests
+            if request_path == path
+        ]
+
+        assert 'If-None-Match' not in first
+        assert 'If-Modified-Since' not in first
+
+        if token_id % 2 == 0:
+            assert second['If-None-Match'] == f'"token-{token_id}"'
+        else:
+            assert second['If-Modified-Since'] == LAST_MODIFIED
+
+
+def test_serves_fresh_entries_from_the_cache(server, cache):
+    fetch_metadata(server.base_uri, [1, 2], cache)
+    metadata = fetch_metadata(server.base_uri, [1, 2], cache, max_age=60)
+
+    assert metadata == {1: _metadata(1), 2: _metadata(2)}
+    assert len(server.requests) == 2
+
+
+def test_retries_server_errors(server, cache):
+    server.failures = {'/1': 2, '/2': 5}
+
+    metadata = fetch_metadata(server.base_uri, [1, 2],
+                              cache,
+                              retries=3,
+                              backoff=0)
+
+    # The second token still fails after the retries
+    assert metadata == {1: _metadata(1), 2: None}
+    assert server.count('/1') == 3
+    assert server.count('/2') == 4
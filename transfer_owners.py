@@ -1,17 +1,49 @@
 """Script to verify owners of tokens."""
 
+import argparse
 import logging
 import json
+import os
 
 from tqdm import tqdm
 
+from utils.bulk import plan_owner_mint
+from utils.bulk import preflight_owner_mint
 from utils.config import load_config
 from utils.config import setup_custom_logger
 from utils.contract import connect_to_web3
 from utils.contract import load_contract
-
-
-def owner_mint(w3, contract, private_key, owner_address, tokens, owners):
+from utils.indexer import OwnershipIndex
+from utils.indexer import sync_index
+from utils.journal import PLANNED
+from utils.journal import SENT
+from utils.journal import SIGNED
+from utils.journal import Journal
+from utils.journal import execute_run
+from utils.journal import resume_run
+from utils.minter import transfer_many
+from utils.ownership import fetch_owners
+from utils.reconcile import MINT
+from utils.reconcile import OK
+from utils.reconcile import TRANSFER
+from utils.reconcile import plan_reconciliation
+from utils.reconcile import plan_to_json
+from utils.rpc_cache import create_block_cache
+from utils.snapshot import TokenSnapshot
+from utils.snapshot import load_tokens
+from utils.transaction import send_transaction
+from utils.transaction import wait_for_receipt
+from utils.transfers import create_transfer_executor
+from utils.transfers import summarize_report
+
+
+def owner_mint(w3,
+               contract,
+               private_key,
+               owner_address,
+               tokens,
+               owners,
+               wait=True):
     """Mint tokens to owners.
 
     Parameters
@@ -28,6 +60,9 @@ def owner_mint(w3, contract, private_key, owner_address, tokens, owners):
         List of tokens.
     owners : list
         List of owners.
+    wait : bool, optional
+        Wait for the transaction receipt, by default True. Otherwise the
+        transaction hash is returned right after sending the transaction.
 
     Returns
     -------
@@ -37,20 +72,15 @@ def owner_mint(w3, contract, private_key, owner_address, tokens, owners):
 
     logger = logging.getLogger('minter')
 
-    txn = contract.functions.ownerMint(tokens, owners).build_transaction({
-        'nonce':
-        w3.eth.get_transaction_count(owner_address),
-        'gas':
-        700000000,
-        # 'maxFeePerGas': 100000000,
-    })
+    # Send the transaction and wait for the transaction receipt if required
+    txn_hash = send_transaction(w3,
+                                contract.functions.ownerMint(tokens, owners),
+                                private_key, owner_address, {})
 
-    # Sign the transaction
-    txn_signed = w3.eth.account.sign_transaction(txn, private_key)
+    if not wait:
+        return txn_hash.hex()
 
-    # Send the transaction and wait for the transaction receipt
-    txn_hash = w3.eth.send_raw_transaction(txn_signed.rawTransaction)
-    txn_receipt = w3.eth.wait_for_transaction_receipt(txn_hash)
+    txn_receipt = wait_for_receipt(w3, txn_hash, owner_address)
     txn_receipt = txn_receipt.transactionHash.hex()
 
     log_msg = f"TXN with hash: { txn_receipt }"
@@ -60,7 +90,26 @@ def owner_mint(w3, contract, private_key, owner_address, tokens, owners):
 
 
 def parse_tokens(tokens):
-    """Convert hex tokens to int."""
+    """Convert hex tokens to int.
+
+    A `TokenSnapshot` is not converted, its token and owner sequences are
+    returned as they are.
+
+    Parameters
+    ----------
+    tokens : dict or TokenSnapshot
+        The owner of each hex token.
+
+    Returns
+    -------
+    tokens_int : list
+        List of token IDs as int.
+    owners : list
+        List of owners.
+    """
+
+    if isinstance(tokens, TokenSnapshot):
+        return tokens.tokens, tokens.owners
 
     tokens_int, owners = [], []
     for token, owner in tokens.items():
@@ -70,8 +119,133 @@ def parse_tokens(tokens):
     return tokens_int, owners
 
 
-def verify_owners(tokens):
-    """Verify owners of tokens."""
+def read_owners(config, w3, contract, token_numbers):
+    """Read the owners of tokens at the same block in batched calls.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+    w3 : Web3
+        The web3 object.
+    contract : contract
+        Contract instance.
+    token_numbers : list
+        List of token IDs as int.
+
+    Returns
+    -------
+    owners : dict
+        The owner of each token, or None if the token does not exist.
+    """
+
+    with tqdm(total=len(token_numbers), unit='token') as progress:
+        return fetch_owners(w3,
+                            contract,
+                            token_numbers,
+                            batch_size=config.getint('verify',
+                                                     'batch_size',
+                                                     fallback=100),
+                            workers=config.getint('verify',
+                                                  'workers',
+                                                  fallback=4),
+                            block_identifier=w3.eth.block_number,
+                            progress=progress,
+                            retries=config.getint('verify',
+                                                  'retries',
+                                                  fallback=3))
+
+
+def update_index(config, w3):
+    """Sync the local `Transfer` index of the contract up to the chain head.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+    w3 : Web3
+        The web3 object.
+
+    Returns
+    -------
+    index : OwnershipIndex
+        The synced index.
+    """
+
+    index = OwnershipIndex(config.get('index', 'path', fallback='index.db'))
+
+    with tqdm(unit='block') as progress:
+        sync_index(w3,
+                   config['contract']['address'],
+                   index,
+                   start_block=config.getint('index',
+                                             'start_block',
+                                             fallback=0),
+                   confirmations=config.getint('index',
+                                               'confirmations',
+                                               fallback=5),
+                   block_range=config.getint('index',
+                                             'block_range',
+                                             fallback=2000),
+                   progress=progress)
+    print(f'[INFO] Indexed {index.count()} tokens up to block '
+          f'{index.last_block()}')
+
+    return index
+
+
+def read_current_owners(config, w3, contract, token_numbers, use_index=False):
+    """Read the current owners of tokens from the chain or the local index.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+    w3 : Web3
+        The web3 object.
+    contract : contract
+        Contract instance.
+    token_numbers : list
+        List of token IDs as int.
+    use_index : bool, optional
+        Read the local `Transfer` index after syncing it instead of batched
+        calls, by default False.
+
+    Returns
+    -------
+    owners : dict
+        The owner of each token, or None if the token does not exist.
+    """
+
+    if not use_index:
+        return read_owners(config, w3, contract, token_numbers)
+
+    index = update_index(config, w3)
+    owners_of = index.owners_of(token_numbers)
+    index.close()
+
+    return owners_of
+
+
+def verify_owners(tokens, use_index=False):
+    """Verify owners of tokens.
+
+    Existence and ownership are read in batched JSON-RPC calls, or from the
+    local `Transfer` index after syncing it when `use_index` is set. Tokens
+    that do not exist are reported instead of stopping the verification.
+
+    Parameters
+    ----------
+    tokens : dict or TokenSnapshot
+        The expected owner of each hex token.
+    use_index : bool, optional
+        Check against the local `Transfer` index, by default False.
+
+    Returns
+    -------
+    owners_verified : list
+        Whether each existing token has its expected owner.
+    """
 
     # Load config and setup logger
     config = load_config('config.ini')
@@ -79,7 +253,10 @@ def verify_owners(tokens):
 
     # Connect to web3
     w3, status = connect_to_web3(network=config['network']['network'],
-                                 api_key=config['network']['api_key'])
+                                 api_key=config['network']['api_key'],
+                                 endpoints=config['network'].get('endpoints'),
+                                 hedge=config['network'].getboolean(
+                                     'hedge', fallback=False))
 
     if status:
         connection_msg = 'Web3 connection successful!'
@@ -88,36 +265,223 @@ def verify_owners(tokens):
     else:
         assert False, 'Web3 connection failed!'
 
+    # Serve repeated reads from the cache
+    create_block_cache(w3, config)
+
     # Load the contract
     contract = load_contract(w3, config['contract']['address'],
                              config['contract']['abi'])
 
-    owners_verified = []
-    for token, owner in tqdm(tokens.items()):
-        token_number = int(token, 16)
-        exists = contract.functions.exists(token_number).call()
+    token_numbers, expected_owners = parse_tokens(tokens)
+    owners_of = read_current_owners(config, w3, contract, token_numbers,
+                                    use_index)
 
-        if not exists:
-            break
+    owners_verified, missing = [], []
+    for token_number, owner in zip(token_numbers, expected_owners):
+        owner_of = owners_of[token_number]
+
+        if owner_of is None:
+            missing.append(hex(token_number))
+            continue
 
-        owner_of = contract.functions.ownerOf(token_number).call()
         owners_verified.append(owner_of == owner)
 
+    if missing:
+        missing_msg = f'{len(missing)} tokens do not exist: {missing}'
+        print(f'[WARNING] {missing_msg}')
+        logger.warning(missing_msg)
+
     return owners_verified
 
 
-def transfer_tokens(tokens, owners):
-    """Verify owners of tokens."""
+def next_run(journal, run):
+    """Return the name of a new journal run applying a fresh plan.
+
+    Each plan gets its own run, named `run`, then `run-2`, `run-3` and so
+    on, so runs of earlier plans are not resumed in its place. A new run is
+    only started once the last one is finished.
+
+    Parameters
+    ----------
+    journal : Journal
+        The journal of the runs.
+    run : str
+        The name of the first run.
+
+    Returns
+    -------
+    name : str
+        The name of the new run, or None if the last run is not finished.
+    """
+
+    name, last, number = run, None, 1
+    while journal.has_run(name):
+        last, number = name, number + 1
+        name = f'{run}-{number}'
+
+    if last is not None and journal.entries(last, [PLANNED, SIGNED, SENT]):
+        print(f'[ERROR] Run {last} is not finished, resume it first')
+        return None
+
+    return name
+
+
+def reconcile_tokens(tokens, use_index=False, output=None, run=None):
+    """Plan the mints and transfers that bring tokens to their owners.
+
+    The desired owners are compared with the current ones, read in bulk.
+    The plan is written to `output` if given, and applied if `run` is given:
+    missing tokens are minted and tokens held by the account of
+    `config_transfer.ini` are transferred, each in a new journal run named
+    by `next_run`.
+
+    Parameters
+    ----------
+    tokens : dict or TokenSnapshot
+        The desired owner of each hex token.
+    use_index : bool, optional
+        Read the current owners from the local `Transfer` index, by default
+        False.
+    output : str, optional
+        JSON file to write the plan to, by default None.
+    run : str, optional
+        The name of the journal runs applying the plan, by default None (the
+        plan is not applied).
+
+    Returns
+    -------
+    plan : dict
+        The plan from `plan_reconciliation`.
+    """
+
+    logger = logging.getLogger('minter')
+
+    config, w3, contract = connect('config.ini')
+
+    token_numbers, desired_owners = parse_tokens(tokens)
+    owners_of = read_current_owners(config, w3, contract, token_numbers,
+                                    use_index)
+    plan = plan_reconciliation(token_numbers, desired_owners, owners_of)
+
+    log_msg = (f'Reconciliation of {len(token_numbers)} tokens: '
+               f'{len(plan[MINT])} to mint, {len(plan[TRANSFER])} to '
+               f'transfer, {len(plan[OK])} already owned')
+    print(f'[INFO] {log_msg}')
+    logger.info(log_msg)
+
+    if output is not None:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(plan_to_json(plan), f, indent=2)
+
+    if run is None:
+        return plan
+
+    transfer_config = load_config('config_transfer.ini')
+    journal = Journal(
+        transfer_config.get('journal', 'path', fallback='journal.db'))
+
+    if plan[MINT]:
+        mint_run = next_run(journal, f'{run}-mint')
+
+        if mint_run is not None:
+            mint_tokens, mint_owners = zip(*plan[MINT])
+            transfer_tokens(list(mint_tokens), list(mint_owners), mint_run)
+
+    transfer_run = None
+    if plan[TRANSFER]:
+        transfer_run = next_run(journal, f'{run}-transfer')
+
+    if transfer_run is not None:
+        config, w3, contract = connect('config_transfer.ini')
+        address = w3.to_checksum_address(config['account']['address'])
+
+        # Only the tokens held by the account can be transferred by it
+        transfers = [(owner, token_id)
+                     for token_id, current_owner, owner in plan[TRANSFER]
+                     if current_owner.lower() == address.lower()]
+        if len(transfers) < len(plan[TRANSFER]):
+            held_msg = (f'{len(plan[TRANSFER]) - len(transfers)} tokens are '
+                        f'held by other accounts and were not transferred')
+            print(f'[WARNING] {held_msg}')
+            logger.warning(held_msg)
+
+        if transfers:
+            summary = transfer_many(w3,
+                                    contract,
+                                    journal,
+                                    transfer_run,
+                                    address,
+                                    config['account']['private_key'],
+                                    transfers,
+                                    max_pending=config.getint('bulk',
+                                                              'max_pending',
+                                                              fallback=16),
+                                    timeout=config.getfloat('bulk',
+                                                            'receipt_timeout',
+                                                            fallback=120))
+            print(f'[INFO] Run {transfer_run}: {summary}')
+
+    return plan
+
+
+def transfer_jobs(jobs, report=None):
+    """Transfer tokens from many sender wallets in parallel.
+
+    Parameters
+    ----------
+    jobs : list
+        List of dicts with the `from` and `to` addresses, the hex
+        `token_id` and the private `key` of the sender.
+    report : str, optional
+        JSON file to write the result of each job to, by default None.
+    """
+
+    logger = logging.getLogger('minter')
+
+    config, w3, contract = connect('config_transfer.ini')
+
+    executor = create_transfer_executor(config, w3, contract)
+    results = executor.run([(job['from'], job['to'], int(job['token_id'],
+                                                         16), job['key'])
+                            for job in jobs])
+
+    log_msg = f'Transfers of {len(jobs)} jobs: {summarize_report(results)}'
+    print(f'[INFO] {log_msg}')
+    logger.info(log_msg)
+
+    if report is not None:
+        with open(report, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+def connect(config_file):
+    """Load the config, connect to web3 and load the contract.
+
+    Parameters
+    ----------
+    config_file : str
+        The config file.
+
+    Returns
+    -------
+    config : ConfigParser
+        The configuration object.
+    w3 : Web3
+        The web3 object.
+    contract : contract
+        Contract instance.
+    """
 
     # Load config and setup logger
-    config = load_config('config_transfer.ini')
+    config = load_config(config_file)
     logger = setup_custom_logger()
 
     # Connect to web3
     w3, status = connect_to_web3(network=config['network']['network'],
-                                 api_key=config['network']['api_key'])
-    private_key = config['account']['private_key']
-    address = config['account']['address']
+                                 api_key=config['network']['api_key'],
+                                 endpoints=config['network'].get('endpoints'),
+                                 hedge=config['network'].getboolean(
+                                     'hedge', fallback=False))
 
     if status:
         connection_msg = 'Web3 connection successful!'
@@ -126,12 +490,145 @@ def transfer_tokens(tokens, owners):
     else:
         assert False, 'Web3 connection failed!'
 
+    # Serve repeated reads from the cache
+    create_block_cache(w3, config)
+
     # Load the contract
     contract = load_contract(w3, config['contract']['address'],
                              config['contract']['abi'])
 
-    txn = owner_mint(w3, contract, private_key, address, tokens, owners)
-    print(f'Transaction receipt: { txn }')
+    return config, w3, contract
+
+
+def transfer_tokens(tokens, owners, run):
+    """Mint tokens to owners in chunks recorded in the journal.
+
+    Parameters
+    ----------
+    tokens : list
+        List of tokens.
+    owners : list
+        List of owners.
+    run : str
+        The name of the run in the journal.
+    """
+
+    config, w3, contract = connect('config_transfer.ini')
+    private_key = config['account']['private_key']
+    address = config['account']['address']
+
+    journal = Journal(config.get('journal', 'path', fallback='journal.db'))
+
+    if journal.has_run(run):
+        print(f'[ERROR] Run {run} already exists, resume it instead')
+        return
+
+    # Leave out the tokens that would revert their chunk
+    if config.getboolean('bulk', 'preflight', fallback=True):
+        tokens, owners, rejected = preflight_owner_mint(
+            w3,
+            contract,
+            address,
+            tokens,
+            owners,
+            chunk_size=config.getint('bulk', 'preflight_chunk', fallback=200),
+            batch_size=config.getint('bulk', 'preflight_batch', fallback=20))
+
+        if rejected:
+            print(f'[WARNING] {len(rejected)} tokens would revert and are '
+                  f'not minted, see the log')
+
+        if not tokens:
+            print(f'[ERROR] No tokens left to mint in run {run}')
+            return
+
+    # Plan chunks sized to the gas target of the config
+    chunks = plan_owner_mint(w3,
+                             contract,
+                             address,
+                             tokens,
+                             owners,
+                             gas_target=config.getint('bulk',
+                                                      'gas_target',
+                                                      fallback=20000000),
+                             sample_size=config.getint('bulk',
+                                                       'sample_size',
+                                                       fallback=10),
+                             margin=config.getfloat('bulk',
+                                                    'gas_margin',
+                                                    fallback=1.2))
+    print(f'[INFO] Planned {len(chunks)} ownerMint chunks for {len(tokens)} '
+          f'tokens')
+
+    journal.plan(run, 'owner_mint', address, [{
+        'tokens': chunk_tokens,
+        'owners': chunk_owners,
+        'gas': gas
+    } for chunk_tokens, chunk_owners, gas in chunks])
+
+    with tqdm(total=len(tokens), unit='token') as progress:
+        summary = execute_run(w3,
+                              contract,
+                              journal,
+                              run,
+                              private_key,
+                              max_pending=config.getint('bulk',
+                                                        'max_pending',
+                                                        fallback=16),
+                              progress=progress,
+                              replace_after=config.getint('bulk',
+                                                          'replace_after',
+                                                          fallback=0),
+                              timeout=config.getfloat('bulk',
+                                                      'receipt_timeout',
+                                                      fallback=120))
+
+    print(f'[INFO] Run {run}: {summary}')
+
+
+def resume_tokens(run, replace=False):
+    """Resume an interrupted run of the journal.
+
+    Parameters
+    ----------
+    run : str
+        The name of the run in the journal.
+    replace : bool, optional
+        Replace pending transactions with higher fees, by default False.
+    """
+
+    config, w3, contract = connect('config_transfer.ini')
+    private_key = config['account']['private_key']
+
+    journal = Journal(config.get('journal', 'path', fallback='journal.db'))
+
+    if not journal.has_run(run):
+        print(f'[ERROR] Run {run} does not exist')
+        return
+
+    remaining = journal.entries(run, [PLANNED, SIGNED, SENT])
+    total = sum(
+        len(entry['payload'].get('tokens', [None])) for entry in remaining)
+
+    with tqdm(total=total, unit='token') as progress:
+        summary = resume_run(w3,
+                             contract,
+                             journal,
+                             run,
+                             private_key,
+                             replace=replace,
+                             max_pending=config.getint('bulk',
+                                                       'max_pending',
+                                                       fallback=16),
+                             progress=progress,
+                             replace_after=config.getint('bulk',
+                                                         'replace_after',
+                                                         fallback=0),
+                             timeout=config.getfloat('bulk',
+                                                     'receipt_timeout',
+                                                     fallback=120))
+
+    print(f'[INFO] Run {run}: {summary}')
 
 
 def test_owner_mint(token, owner, config_file='config.ini'):
@@ -143,7 +640,10 @@ def test_owner_mint(token, owner, config_file='config.ini'):
 
     # Connect to web3
     w3, status = connect_to_web3(network=config['network']['network'],
-                                 api_key=config['network']['api_key'])
+                                 api_key=config['network']['api_key'],
+                                 endpoints=config['network'].get('endpoints'),
+                                 hedge=config['network'].getboolean(
+                                     'hedge', fallback=False))
     private_key = config['account']['private_key']
     address = config['account']['address']
 
@@ -154,6 +654,9 @@ def test_owner_mint(token, owner, config_file='config.ini'):
     else:
         assert False, 'Web3 connection failed!'
 
+    # Serve repeated reads from the cache
+    create_block_cache(w3, config)
+
     # Load the contract
     contract = load_contract(w3, config['contract']['address'],
                              config['contract']['abi'])
@@ -162,20 +665,136 @@ def test_owner_mint(token, owner, config_file='config.ini'):
     print(f'Transaction receipt: { txn }')
 
 
+def parse_args():
+    """Parse the command line arguments."""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='command')
+
+    mint_parser = subparsers.add_parser('mint', help='Mint tokens to owners')
+    mint_parser.add_argument('--tokens',
+                             default='../event-listener/tokens.json',
+                             help='JSON file mapping hex tokens to owners, '
+                             'or a binary snapshot')
+    mint_parser.add_argument('--run',
+                             default=None,
+                             help='Name of the run, by default the file name')
+
+    verify_parser = subparsers.add_parser('verify',
+                                          help='Verify the owners of tokens')
+    verify_parser.add_argument('--tokens',
+                               default='../event-listener/tokens.json',
+                               help='JSON file mapping hex tokens to owners, '
+                               'or a binary snapshot')
+    verify_parser.add_argument('--index',
+                               action='store_true',
+                               help='Check against the local Transfer index')
+
+    subparsers.add_parser('index', help='Sync the local Transfer index')
+
+    reconcile_parser = subparsers.add_parser(
+        'reconcile', help='Plan the mints and transfers of tokens')
+    reconcile_parser.add_argument('--tokens',
+                                  default='../event-listener/tokens.json',
+                                  help='JSON file mapping hex tokens to '
+                                  'owners, or a binary snapshot')
+    reconcile_parser.add_argument('--index',
+                                  action='store_true',
+                                  help='Read the owners from the local '
+                                  'Transfer index')
+    reconcile_parser.add_argument('--output',
+                                  default=None,
+                                  help='JSON file to write the plan to')
+    reconcile_parser.add_argument('--apply',
+                                  action='store_true',
+                                  help='Mint and transfer the tokens of the '
+                                  'plan')
+    reconcile_parser.add_argument('--run',
+                                  default=None,
+                                  help='Name of the runs applying the plan, '
+                                  'by default the file name')
+
+    transfers_parser = subparsers.add_parser(
+        'transfers', help='Transfer tokens from many sender wallets')
+    transfers_parser.add_argument('--jobs',
+                                  required=True,
+                                  help='JSON list of transfers with from, '
+                                  'to, token_id and key fields')
+    transfers_parser.add_argument('--report',
+                                  default=None,
+                                  help='JSON file to write the result of '
+                                  'each transfer to')
+
+    snapshot_parser = subparsers.add_parser(
+        'snapshot', help='Convert a JSON token file to a binary snapshot')
+    snapshot_parser.add_argument('--tokens',
+                                 default='../event-listener/tokens.json',
+                                 help='JSON file mapping hex tokens to owners')
+    snapshot_parser.add_argument('--output',
+                                 default='tokens.snap',
+                                 help='Binary snapshot file to write')
+
+    resume_parser = subparsers.add_parser('resume',
+                                          help='Resume an interrupted run')
+    resume_parser.add_argument('--run',
+                               default='tokens.json',
+                               help='Name of the run')
+    resume_parser.add_argument('--replace',
+                               action='store_true',
+                               help='Replace pending transactions with '
+                               'higher fees')
+
+    args = parser.parse_args()
+
+    # Minting is the default command
+    if args.command is None:
+        args = parser.parse_args(['mint'])
+
+    return args
+
+
 if __name__ == '__main__':
-    # Open JSON file
-    with open('../event-listener/tokens.json', encoding='utf-8') as f:
-        tokens_list = json.load(f)
-
-    # Verify ownership and existence
-    # owners_verification = verify_owners(tokens_list)
-    # print('Total tokens verified:', len(owners_verification))
-    # print('All owners correspond:', all(owners_verification))
-
-    # Parse tokens
-    token_ids, new_owners = parse_tokens(tokens_list)
-    # for token, owner in zip(token_ids, new_owners):
-    #     print(f'Token: { token } | Owner: { owner }')
-
-    # Transfer tokens
-    transfer_tokens(token_ids, new_owners)
+    args = parse_args()
+
+    if args.command == 'resume':
+        resume_tokens(args.run, args.replace)
+    elif args.command == 'index':
+        index_config, index_w3, _ = connect('config.ini')
+        update_index(index_config, index_w3).close()
+    elif args.command == 'reconcile':
+        reconcile_tokens(load_tokens(args.tokens),
+                         use_index=args.index,
+                         output=args.output,
+                         run=(args.run or os.path.basename(args.tokens))
+                         if args.apply else None)
+    elif args.command == 'transfers':
+        with open(args.jobs, encoding='utf-8') as f:
+            transfer_jobs(json.load(f), args.report)
+    elif args.command == 'snapshot':
+        snapshot = TokenSnapshot.from_json(args.tokens)
+        snapshot.save(args.output)
+        print(f'[INFO] Saved {len(snapshot)} tokens of '
+              f'{snapshot.owner_count} owners to {args.output}')
+    elif args.command == 'verify':
+        tokens_list = load_tokens(args.tokens)
+
+        owners_verification = verify_owners(tokens_list, args.index)
+        print('Total tokens verified:', len(owners_verification))
+        print('All owners correspond:', all(owners_verification))
+    else:
+        # Stream the JSON file, or map the binary snapshot
+        tokens_list = load_tokens(args.tokens)
+
+        # Verify ownership and existence
+        # owners_verification = verify_owners(tokens_list)
+        # print('Total tokens verified:', len(owners_verification))
+        # print('All owners correspond:', all(owners_verification))
+
+        # Parse tokens
+        token_ids, new_owners = parse_tokens(tokens_list)
+        # for token, owner in zip(token_ids, new_owners):
+        #     print(f'Token: { token } | Owner: { owner }')
+
+        # Transfer tokens
+        transfer_tokens(token_ids, new_owners, args.run
+                        or os.path.basename(args.tokens))
@@ -0,0 +1,339 @@
+"""Local transaction building with cached chain parameters."""
+
+import math
+import threading
+
+from weakref import WeakKeyDictionary
+
+from utils.fees import get_async_fee_oracle
+from utils.fees import get_fee_oracle
+
+# Transaction builders shared by every helper using the same web3 object
+_builders = WeakKeyDictionary()
+_builders_lock = threading.Lock()
+
+
+class TransactionBuilder:
+    """Build contract transactions without RPC round trips.
+
+    The chain id is fetched once and the fees come from the fee oracle shared
+    by the web3 object, refreshed at most once per block. The calldata is
+    encoded locally from the ABI of the contract. Calls are estimated every
+    time with a safety margin, since the cost of minting or transferring
+    depends on the recipient: a new holder costs more than a repeat one, and
+    a contract recipient runs `onERC721Received`. Gas limits of the
+    `memoized` functions are estimated once per length of their array
+    arguments instead, which is only safe for functions whose cost does not
+    depend on the values of their arguments.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    gas_margin : float, optional
+        The safety margin of the estimated gas limits, by default 1.2.
+    memoized : tuple, optional
+        The names of the functions with memoized gas limits, by default
+        none.
+    """
+
+    def __init__(self, w3, gas_margin=1.2, memoized=()):
+        self.w3 = w3
+        self.gas_margin = gas_margin
+        self.memoized = set(memoized)
+        self.oracle = get_fee_oracle(w3)
+        self._chain_id = None
+        self._gas_limits = {}
+        self._lock = threading.Lock()
+
+    @property
+    def chain_id(self):
+        """The chain id, fetched on first use."""
+
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+
+        return self._chain_id
+
+    def fees(self):
+        """Return the fee parameters for the next block.
+
+        Returns
+        -------
+        fees : dict
+            The `maxFeePerGas` and `maxPriorityFeePerGas`, or `gasPrice` on
+            legacy chains.
+        """
+
+        return self.oracle.fees()
+
+    def gas_limit(self, contract_function, sender):
+        """Return the gas limit of a contract function call.
+
+        Estimates of the `memoized` functions are memoized per function and
+        length of each array argument, other calls are estimated every time.
+
+        Parameters
+        ----------
+        contract_function
+            The contract function call, e.g. `contract.functions.X(...)`.
+        sender : str
+            The sender address.
+
+        Returns
+        -------
+        gas : int
+            The estimated gas with the safety margin.
+        """
+
+        if contract_function.fn_name not in self.memoized:
+            estimate = contract_function.estimate_gas({'from': sender})
+            return math.ceil(estimate * self.gas_margin)
+
+        key = _gas_key(contract_function)
+
+        with self._lock:
+            gas = self._gas_limits.get(key)
+
+        if gas is None:
+            estimate = contract_function.estimate_gas({'from': sender})
+            gas = math.ceil(estimate * self.gas_margin)
+
+            with self._lock:
+                self._gas_limits[key] = gas
+
+        return gas
+
+    def build(self, contract_function, sender, params, nonce):
+        """Build a contract transaction.
+
+        Parameters
+        ----------
+        contract_function
+            The contract function call, e.g. `contract.functions.X(...)`.
+        sender : str
+            The sender address.
+        params : dict
+            The transaction parameters. The fees are filled from the fee
+            oracle and the gas from `gas_limit`, unless given.
+        nonce : int
+            The nonce of the transaction.
+
+        Returns
+        -------
+        txn : dict
+            The transaction dictionary, ready to be signed.
+        """
+
+        txn = _transaction(contract_function, self.chain_id, params, nonce)
+
+        if 'gasPrice' not in txn:
+            _set_fees(txn, self.fees())
+
+        if 'gas' not in txn:
+            txn['gas'] = self.gas_limit(contract_function, sender)
+
+        txn.pop('from', None)
+
+        return txn
+
+
+class AsyncTransactionBuilder:
+    """Build contract transactions without RPC round trips with async web3.
+
+    Async version of `TransactionBuilder`: the chain id is fetched once and
+    the fees come from the async fee oracle shared by the web3 object.
+
+    Parameters
+    ----------
+    w3 : AsyncWeb3
+        The async web3 object.
+    gas_margin : float, optional
+        The safety margin of the estimated gas limits, by default 1.2.
+    memoized : tuple, optional
+        The names of the functions with memoized gas limits, by default
+        none.
+    """
+
+    def __init__(self, w3, gas_margin=1.2, memoized=()):
+        self.w3 = w3
+        self.gas_margin = gas_margin
+        self.memoized = set(memoized)
+        self.oracle = get_async_fee_oracle(w3)
+        self._chain_id = None
+        self._gas_limits = {}
+
+    async def chain_id(self):
+        """Return the chain id, fetched on first use.
+
+        Returns
+        -------
+        chain_id : int
+            The chain id.
+        """
+
+        if self._chain_id is None:
+            self._chain_id = await self.w3.eth.chain_id
+
+        return self._chain_id
+
+    async def fees(self):
+        """Return the fee parameters for the next block.
+
+        Returns
+        -------
+        fees : dict
+            The `maxFeePerGas` and `maxPriorityFeePerGas`, or `gasPrice` on
+            legacy chains.
+        """
+
+        return await self.oracle.fees()
+
+    async def gas_limit(self, contract_function, sender):
+        """Return the gas limit of a contract function call.
+
+        Parameters
+        ----------
+        contract_function
+            The async contract function call, e.g.
+            `contract.functions.X(...)`.
+        sender : str
+            The sender address.
+
+        Returns
+        -------
+        gas : int
+            The estimated gas with the safety margin.
+        """
+
+        memoized = contract_function.fn_name in self.memoized
+
+        if memoized:
+            key = _gas_key(contract_function)
+            gas = self._gas_limits.get(key)
+
+            if gas is not None:
+                return gas
+
+        estimate = await contract_function.estimate_gas({'from': sender})
+        gas = math.ceil(estimate * self.gas_margin)
+
+        if memoized:
+            self._gas_limits[key] = gas
+
+        return gas
+
+    async def build(self, contract_function, sender, params, nonce):
+        """Build a contract transaction.
+
+        Parameters
+        ----------
+        contract_function
+            The async contract function call, e.g.
+            `contract.functions.X(...)`.
+        sender : str
+            The sender address.
+        params : dict
+            The transaction parameters. The fees are filled from the fee
+            oracle and the gas from `gas_limit`, unless given.
+        nonce : int
+            The nonce of the transaction.
+
+        Returns
+        -------
+        txn : dict
+            The transaction dictionary, ready to be signed.
+        """
+
+        txn = _transaction(contract_function, await self.chain_id(), params,
+                           nonce)
+
+        if 'gasPrice' not in txn:
+            _set_fees(txn, await self.fees())
+
+        if 'gas' not in txn:
+            txn['gas'] = await self.gas_limit(contract_function, sender)
+
+        txn.pop('from', None)
+
+        return txn
+
+
+def _gas_key(contract_function):
+    shape = tuple(
+        len(arg) if isinstance(arg, (list, tuple)) else None
+        for arg in contract_function.args or ())
+
+    return (contract_function.address, contract_function.fn_name, shape)
+
+
+def _transaction(contract_function, chain_id, params, nonce):
+    # The calldata is encoded from the ABI, without calling the provider
+    data = contract_function._encode_transaction_data()
+
+    return {
+        'chainId': chain_id,
+        'to': contract_function.address,
+        'value': 0,
+        'data': data,
+        **params,
+        'nonce': nonce,
+    }
+
+
+def _set_fees(txn, fees):
+    if 'gasPrice' in fees and 'maxFeePerGas' not in txn:
+        txn['gasPrice'] = fees['gasPrice']
+    else:
+        txn.setdefault('maxFeePerGas',
+                       fees.get('maxFeePerGas', fees.get('gasPrice')))
+        tip = fees.get('maxPriorityFeePerGas', 0)
+        txn.setdefault('maxPriorityFeePerGas', min(tip, txn['maxFeePerGas']))
+
+
+def get_transaction_builder(w3):
+    """Return the transaction builder shared by all helpers of a web3 object.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+
+    Returns
+    -------
+    builder : TransactionBuilder
+        The shared transaction builder.
+    """
+
+    with _builders_lock:
+        builder = _builders.get(w3)
+
+        if builder is None:
+            builder = TransactionBuilder(w3)
+            _builders[w3] = builder
+
+        return builder
+
+
+def get_async_transaction_builder(w3):
+    """Return the transaction builder shared by all helpers of an async web3.
+
+    Parameters
+    ----------
+    w3 : AsyncWeb3
+        The async web3 object.
+
+    Returns
+    -------
+    builder : AsyncTransactionBuilder
+        The shared transaction builder.
+    """
+
+    with _builders_lock:
+        builder = _builders.get(w3)
+
+        if builder is None:
+            builder = AsyncTransactionBuilder(w3)
+            _builders[w3] = builder
+
+        return builder
@@ -0,0 +1,621 @@
+"""Utility functions to plan and send bulk `ownerMint` transactions."""
+
+import logging
+import math
+import time
+
+from hexbytes import HexBytes
+from tqdm import tqdm
+from web3.exceptions import TimeExhausted
+
+from utils.receipts import ReceiptPoller
+from utils.rpc import RPCError
+from utils.rpc import batch_request
+from utils.rpc import to_int
+from utils.transaction import send_transaction
+from utils.transaction import speed_up_transaction
+
+
+def estimate_owner_mint_gas(contract,
+                            sender,
+                            tokens,
+                            owners,
+                            sample_size=10,
+                            margin=1.2):
+    """Estimate the gas used by `ownerMint` as a base plus a per-token cost.
+
+    Two estimates are made, one minting a single token and one minting a
+    sample of tokens, and the gas is assumed to grow linearly in between.
+    The projection depends on the recipients of the sample, so chunks
+    planned from it are checked with `fit_chunks`.
+
+    Parameters
+    ----------
+    contract
+        The contract object.
+    sender : str
+        The owner address sending the transactions.
+    tokens : list
+        List of tokens.
+    owners : list
+        List of owners.
+    sample_size : int, optional
+        The number of tokens of the sample, by default 10.
+    margin : float, optional
+        The safety margin applied to both costs, by default 1.2.
+
+    Returns
+    -------
+    base_gas : int
+        The gas used by the transaction regardless of the number of tokens.
+    token_gas : int
+        The gas used per minted token.
+    """
+
+    sample_size = min(sample_size, len(tokens))
+
+    single_gas = contract.functions.ownerMint(
+        tokens[:1], owners[:1]).estimate_gas({'from': sender})
+
+    if sample_size < 2:
+        return 0, math.ceil(single_gas * margin)
+
+    sample_gas = contract.functions.ownerMint(
+        tokens[:sample_size],
+        owners[:sample_size]).estimate_gas({'from': sender})
+
+    token_gas = (sample_gas - single_gas) / (sample_size - 1)
+    base_gas = max(0, single_gas - token_gas)
+
+    return math.ceil(base_gas * margin), math.ceil(token_gas * margin)
+
+
+def plan_chunks(tokens, owners, base_gas, token_gas, gas_target):
+    """Split tokens and owners into chunks that fit in a gas target.
+
+    Parameters
+    ----------
+    tokens : list
+        List of tokens.
+    owners : list
+        List of owners.
+    base_gas : int
+        The gas used by each transaction regardless of the number of tokens.
+    token_gas : int
+        The gas used per minted token.
+    gas_target : int
+        The maximum gas of each transaction.
+
+    Returns
+    -------
+    chunks : list
+        List of `(tokens, owners, gas)` tuples, with the gas limit of each
+        chunk.
+
+    Raises
+    ------
+    ValueError
+        If the sizes of tokens and owners differ, or if a chunk of a single
+        token does not fit in the gas target.
+    """
+
+    if len(tokens) != len(owners):
+        raise ValueError('Tokens and owners should have the same size')
+
+    chunk_size = (gas_target - base_gas) // max(1, token_gas)
+
+    if chunk_size < 1:
+        raise ValueError(f'A single token needs {base_gas + token_gas} gas, '
+                         f'over the gas target of {gas_target}')
+
+    chunks = []
+    for start in range(0, len(tokens), chunk_size):
+        chunk_tokens = tokens[start:start + chunk_size]
+        chunk_owners = owners[start:start + chunk_size]
+        gas = base_gas + token_gas * len(chunk_tokens)
+        chunks.append((chunk_tokens, chunk_owners, gas))
+
+    return chunks
+
+
+def fit_chunks(w3,
+               contract,
+               sender,
+               chunks,
+               gas_target,
+               margin=1.2,
+               batch_size=20,
+               retries=3):
+    """Estimate the gas of each planned chunk and split the ones over target.
+
+    The per-token cost of `plan_chunks` is projected from a sample, but
+    minting to a new holder writes a zero balance and costs more than
+    minting to a repeat one. Each chunk is estimated on its own with
+    `eth_estimateGas`, in JSON-RPC batches, and its gas limit is set to the
+    estimate with the margin. Chunks over the gas target are split in even
+    parts and estimated again, keeping the token order. Chunks that revert keep their
+    projected gas limit.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    sender : str
+        The owner address sending the transactions.
+    chunks : list
+        List of `(tokens, owners, gas)` tuples from `plan_chunks`.
+    gas_target : int
+        The maximum gas of each transaction.
+    margin : float, optional
+        The safety margin applied to the estimates, by default 1.2.
+    batch_size : int, optional
+        The number of estimates per JSON-RPC batch, by default 20.
+    retries : int, optional
+        The number of times estimates failed by the node are sent again, by
+        default 3.
+
+    Returns
+    -------
+    chunks : list
+        List of `(tokens, owners, gas)` tuples, in the same token order.
+
+    Raises
+    ------
+    ValueError
+        If a chunk of a single token does not fit in the gas target.
+    RPCError
+        If an estimate still fails for other reasons than a revert after the
+        retries.
+    """
+
+    logger = logging.getLogger('minter')
+
+    tokens = [token for chunk_tokens, _, _ in chunks for token in chunk_tokens]
+    owners = [owner for _, chunk_owners, _ in chunks for owner in chunk_owners]
+
+    pending, start = [], 0
+    for chunk_tokens, _, gas in chunks:
+        pending.append((start, start + len(chunk_tokens), gas))
+        start += len(chunk_tokens)
+
+    fitted, splits = [], 0
+    while pending:
+        ranges, pending = pending[:batch_size], pending[batch_size:]
+
+        calls = []
+        for start, stop, _ in ranges:
+            data = contract.encodeABI(
+                fn_name='ownerMint',
+                args=[tokens[start:stop], owners[start:stop]])
+            calls.append(('eth_estimateGas', [{
+                'from': sender,
+                'to': contract.address,
+                'data': data
+            }]))
+
+        estimates = batch_request(w3, calls, retries=retries)
+
+        for (start, stop, planned), estimate in zip(ranges, estimates):
+            if isinstance(estimate, RPCError):
+                if not estimate.reverted:
+                    raise estimate
+
+                logger.warning(f'Gas estimate of {stop - start} tokens '
+                               f'reverted: {estimate}')
+                fitted.append((start, stop, planned))
+                continue
+
+            gas = math.ceil(to_int(estimate) * margin)
+            if gas <= gas_target:
+                fitted.append((start, stop, gas))
+            elif stop - start == 1:
+                raise ValueError(f'A single token needs {gas} gas, over the '
+                                 f'gas target of {gas_target}')
+            else:
+                # Split in even parts expected to fit, estimated again
+                size = math.ceil((stop - start) / math.ceil(gas / gas_target))
+                pending += [(part, min(part + size, stop), planned)
+                            for part in range(start, stop, size)]
+                splits += 1
+
+    if splits:
+        logger.info(f'Split {splits} ownerMint chunks over the gas target')
+
+    fitted.sort()
+
+    return [(tokens[start:stop], owners[start:stop], gas)
+            for start, stop, gas in fitted]
+
+
+def simulate_owner_mint(w3,
+                        contract,
+                        sender,
+                        tokens,
+                        owners,
+                        ranges,
+                        block_identifier='latest',
+                        retries=3):
+    """Simulate `ownerMint` calls of token ranges in one JSON-RPC batch.
+
+    Calls failing for other reasons than a revert, e.g. rate limits or
+    missing block headers, are sent again with exponential backoff.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    sender : str
+        The owner address sending the transactions.
+    tokens : list
+        List of tokens.
+    owners : list
+        List of owners.
+    ranges : list
+        List of `(start, stop)` tuples of the tokens of each call.
+    block_identifier : str or int, optional
+        The block to simulate the calls at, by default 'latest'.
+    retries : int, optional
+        The number of times calls failed by the node are sent again, by
+        default 3.
+
+    Returns
+    -------
+    errors : list
+        The revert reason of each call, or None if it succeeds.
+
+    Raises
+    ------
+    RPCError
+        If a call still fails for other reasons than a revert after the
+        retries.
+    """
+
+    if isinstance(block_identifier, int):
+        block_identifier = hex(block_identifier)
+
+    calls = []
+    for start, stop in ranges:
+        data = contract.encodeABI(
+            fn_name='ownerMint', args=[tokens[start:stop], owners[start:stop]])
+        calls.append(('eth_call', [{
+            'from': sender,
+            'to': contract.address,
+            'data': data
+        }, block_identifier]))
+
+    results = batch_request(w3, calls, retries=retries)
+
+    # Only reverts are caused by the tokens, other errors are raised
+    for result in results:
+        if isinstance(result, RPCError) and not result.reverted:
+            raise result
+
+    return [
+        str(result) if isinstance(result, RPCError) else None
+        for result in results
+    ]
+
+
+def preflight_owner_mint(w3,
+                         contract,
+                         sender,
+                         tokens,
+                         owners,
+                         chunk_size=200,
+                         batch_size=20):
+    """Find the tokens that would revert an `ownerMint` before sending it.
+
+    Tokens are simulated with `eth_call` in chunks, several chunks per
+    JSON-RPC batch, all at the same block. Chunks that revert are bisected
+    until the offending tokens are found, e.g. already minted tokens or
+    recipients rejecting `onERC721Received`. Tokens repeated in the list and
+    invalid recipients are rejected without a call.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    sender : str
+        The owner address sending the transactions.
+    tokens : list
+        List of tokens.
+    owners : list
+        List of owners.
+    chunk_size : int, optional
+        The number of tokens simulated per call, by default 200.
+    batch_size : int, optional
+        The number of calls per JSON-RPC batch, by default 20.
+
+    Returns
+    -------
+    clean_tokens : list
+        The tokens that can be minted, in their original order.
+    clean_owners : list
+        The owners of the clean tokens.
+    rejected : list
+        List of `(token, owner, reason)` tuples of the offending tokens.
+    """
+
+    logger = logging.getLogger('minter')
+
+    if len(tokens) != len(owners):
+        raise ValueError('Tokens and owners should have the same size')
+
+    kept_tokens, kept_owners, rejected = [], [], []
+    seen = set()
+    for token, owner in zip(tokens, owners):
+        if token in seen:
+            rejected.append((token, owner, 'Token repeated in the list'))
+        elif not w3.is_address(owner):
+            rejected.append((token, owner, 'Invalid owner address'))
+        else:
+            seen.add(token)
+            kept_tokens.append(token)
+            kept_owners.append(w3.to_checksum_address(owner))
+
+    block_number = w3.eth.block_number
+    pending = [(start, min(start + chunk_size, len(kept_tokens)))
+               for start in range(0, len(kept_tokens), chunk_size)]
+    clean, calls = [], 0
+
+    while pending:
+        ranges, pending = pending[:batch_size], pending[batch_size:]
+        errors = simulate_owner_mint(w3, contract, sender, kept_tokens,
+                                     kept_owners, ranges, block_number)
+        calls += len(ranges)
+
+        for (start, stop), error in zip(ranges, errors):
+            if error is None:
+                clean.append((start, stop))
+            elif stop - start == 1:
+                rejected.append(
+                    (kept_tokens[start], kept_owners[start], error))
+            else:
+                # Bisect the range to isolate the offending tokens
+                middle = (start + stop) // 2
+                pending += [(start, middle), (middle, stop)]
+
+    clean.sort()
+    clean_tokens = [
+        token for start, stop in clean for token in kept_tokens[start:stop]
+    ]
+    clean_owners = [
+        owner for start, stop in clean for owner in kept_owners[start:stop]
+    ]
+
+    logger.info(f'Pre-flight of {len(tokens)} tokens in {calls} simulated '
+                f'calls: {len(rejected)} rejected')
+
+    for token, owner, reason in rejected:
+        logger.warning(f'Token {hex(token)} to {owner} rejected: {reason}')
+
+    return clean_tokens, clean_owners, rejected
+
+
+def submit_chunks(w3,
+                  contract,
+                  private_key,
+                  owner_address,
+                  chunks,
+                  max_pending=16,
+                  poll_interval=1.0,
+                  replace_after=None,
+                  timeout=120):
+    """Send `ownerMint` chunks as a pipelined sequence of transactions.
+
+    Chunks are sent without waiting for each other, up to `max_pending`
+    transactions in flight, and their receipts are tracked in batches.
+    Chunks pending for `replace_after` blocks are replaced with higher fees.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    private_key : str
+        Private key of the account.
+    owner_address : str
+        Address of the owner.
+    chunks : list
+        List of `(tokens, owners, gas)` tuples from `plan_chunks`.
+    max_pending : int, optional
+        Maximum number of transactions in flight, by default 16.
+    poll_interval : float, optional
+        Seconds between receipt checks, by default 1.
+    replace_after : int, optional
+        Number of blocks after which a pending chunk is replaced, by default
+        None (never).
+    timeout : float, optional
+        Seconds to wait for the receipt of a chunk, by default 120.
+
+    Returns
+    -------
+    results : list
+        List of `(txn_hash, status)` tuples, one per chunk, where the status
+        is 1 for successful transactions, 0 for reverted ones and None for
+        chunks not mined in time.
+    """
+
+    logger = logging.getLogger('minter')
+
+    futures = []
+    total = sum(len(chunk_tokens) for chunk_tokens, _, _ in chunks)
+
+    with ReceiptPoller(w3,
+                       poll_interval=poll_interval,
+                       timeout=timeout,
+                       replace_after=replace_after) as poller, tqdm(
+                           total=total, unit='token') as progress:
+        for chunk_tokens, chunk_owners, gas in chunks:
+            while poller.pending() >= max_pending:
+                time.sleep(poll_interval)
+
+            txn_hash = send_transaction(
+                w3, contract.functions.ownerMint(chunk_tokens, chunk_owners),
+                private_key, owner_address, {'gas': gas})
+            logger.info(f'Sent ownerMint of {len(chunk_tokens)} tokens with '
+                        f'hash: {txn_hash.hex()}')
+
+            size = len(chunk_tokens)
+            future = poller.track(
+                txn_hash,
+                callback=lambda _, n=size: progress.update(n),
+                sender=owner_address,
+                replace=lambda h: speed_up_transaction(w3, h, private_key))
+            futures.append((txn_hash.hex(), future))
+
+        results = []
+        for txn_hash, future in futures:
+            try:
+                receipt = future.result()
+            except TimeExhausted as exc:
+                logger.warning(f'ownerMint not mined: {exc}')
+                results.append((txn_hash, None))
+                continue
+
+            # The receipt has the hash of the replacement, if any was mined
+            results.append((HexBytes(receipt['transactionHash']).hex(),
+                            to_int(receipt['status'])))
+
+    return results
+
+
+def plan_owner_mint(w3,
+                    contract,
+                    owner_address,
+                    tokens,
+                    owners,
+                    gas_target=20000000,
+                    sample_size=10,
+                    margin=1.2):
+    """Plan the `ownerMint` chunks of many tokens sized to a gas target.
+
+    Chunks are sized from the gas projected by `estimate_owner_mint_gas`,
+    then each chunk is estimated by `fit_chunks` and split if it is over the
+    gas target.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    owner_address : str
+        Address of the owner.
+    tokens : list
+        List of tokens.
+    owners : list
+        List of owners.
+    gas_target : int, optional
+        The maximum gas of each transaction, by default 20,000,000. It is
+        capped by the gas limit of the latest block.
+    sample_size : int, optional
+        The number of tokens used to estimate the gas, by default 10.
+    margin : float, optional
+        The safety margin of the gas estimates, by default 1.2.
+
+    Returns
+    -------
+    chunks : list
+        List of `(tokens, owners, gas)` tuples.
+    """
+
+    logger = logging.getLogger('minter')
+
+    block_gas_limit = w3.eth.get_block('latest')['gasLimit']
+    gas_target = min(gas_target, block_gas_limit)
+
+    base_gas, token_gas = estimate_owner_mint_gas(contract, owner_address,
+                                                  tokens, owners, sample_size,
+                                                  margin)
+    chunks = plan_chunks(tokens, owners, base_gas, token_gas, gas_target)
+    chunks = fit_chunks(w3, contract, owner_address, chunks, gas_target,
+                        margin)
+
+    logger.info(f'Planned {len(chunks)} ownerMint chunks for {len(tokens)} '
+                f'tokens (base gas: {base_gas}, gas per token: {token_gas})')
+
+    return chunks
+
+
+def bulk_owner_mint(w3,
+                    contract,
+                    private_key,
+                    owner_address,
+                    tokens,
+                    owners,
+                    gas_target=20000000,
+                    sample_size=10,
+                    margin=1.2,
+                    max_pending=16,
+                    replace_after=None,
+                    preflight=True,
+                    timeout=120):
+    """Mint many tokens in chunks sized to a gas target.
+
+    Unless `preflight` is disabled, the tokens that would revert their
+    chunk are found with simulated calls first and left out.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    private_key : str
+        Private key of the account.
+    owner_address : str
+        Address of the owner.
+    tokens : list
+        List of tokens.
+    owners : list
+        List of owners.
+    gas_target : int, optional
+        The maximum gas of each transaction, by default 20,000,000. It is
+        capped by the gas limit of the latest block.
+    sample_size : int, optional
+        The number of tokens used to estimate the gas, by default 10.
+    margin : float, optional
+        The safety margin of the gas estimates, by default 1.2.
+    max_pending : int, optional
+        Maximum number of transactions in flight, by default 16.
+    replace_after : int, optional
+        Number of blocks after which a pending chunk is replaced, by default
+        None (never).
+    preflight : bool, optional
+        Simulate the chunks and leave out the offending tokens, by default
+        True.
+    timeout : float, optional
+        Seconds to wait for the receipt of a chunk, by default 120.
+
+    Returns
+    -------
+    results : list
+        List of `(txn_hash, status)` tuples, one per chunk.
+    """
+
+    if preflight:
+        tokens, owners, _ = preflight_owner_mint(w3, contract, owner_address,
+                                                 tokens, owners)
+
+    if not tokens:
+        return []
+
+    chunks = plan_owner_mint(w3, contract, owner_address, tokens, owners,
+                             gas_target, sample_size, margin)
+
+    return submit_chunks(w3,
+                         contract,
+                         private_key,
+                         owner_address,
+                         chunks,
+                         max_pending,
+                         replace_after=replace_after,
+                         timeout=timeout)
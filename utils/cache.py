@@ -0,0 +1,149 @@
+"""Cache utilities for issued signatures."""
+
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class SignatureCache:
+    """Bounded LRU cache with TTL for signatures.
+
+    Entries are keyed by the signer and the signed message, which encodes the
+    wallet address and token ID. Signatures are deterministic for a given key
+    and message, so a cached entry is always valid while the key is the same.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        The maximum number of entries, by default 100000. A value of 0
+        disables the cache.
+    ttl : float, optional
+        The time to live of each entry in seconds, by default 3600.
+    """
+
+    def __init__(self, maxsize=100000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.key_id = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bind_key(self, key_id):
+        """Bind the cache to a signing key, clearing it if the key changed.
+
+        Parameters
+        ----------
+        key_id : str
+            An identifier of the signing key, e.g. the signer address.
+        """
+
+        with self._lock:
+            if key_id != self.key_id:
+                self._entries.clear()
+                self.key_id = key_id
+
+    def get(self, message):
+        """Get the cached signature of a message.
+
+        Parameters
+        ----------
+        message : str
+            The signed message.
+
+        Returns
+        -------
+        value : tuple or None
+            The message hash and signature, or None if missing or expired.
+        """
+
+        key = (self.key_id, message)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def put(self, message, value):
+        """Store the signature of a message.
+
+        Parameters
+        ----------
+        message : str
+            The signed message.
+        value : tuple
+            The message hash and signature.
+        """
+
+        if self.maxsize <= 0:
+            return
+
+        key = (self.key_id, message)
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Return the cache size and hit/miss counters.
+
+        Returns
+        -------
+        stats : dict
+            The cache size, bounds and counters.
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def create_signature_cache(config, key_id):
+    """Create a signature cache from the `[cache]` config section.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+    key_id : str
+        An identifier of the signing key, e.g. the signer address.
+
+    Returns
+    -------
+    cache : SignatureCache
+        The signature cache bound to the signing key.
+    """
+
+    maxsize = config.getint('cache', 'size', fallback=100000)
+    ttl = config.getfloat('cache', 'ttl', fallback=3600)
+
+    cache = SignatureCache(maxsize=maxsize, ttl=ttl)
+    cache.bind_key(key_id)
+
+    return cache
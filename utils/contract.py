@@ -2,25 +2,28 @@
 
 import json
 
+from aiohttp import ClientSession
+from aiohttp import ClientTimeout
+from aiohttp import TCPConnector
+from web3 import AsyncHTTPProvider
+from web3 import AsyncWeb3
 from web3 import Web3
 
 
-def connect_to_web3(network='goerli', api_key=None):
-    """Connect to web3 and return the web3 object and connection status.
-    
+def get_network_url(network='goerli', api_key=None):
+    """Return the Alchemy RPC URL of a network.
+
     Parameters
     ----------
     network : str, optional
         The network to connect to, by default 'goerli'.
     api_key : str
         The API key for the Alchemy API.
-    
+
     Returns
     -------
-    w3 : Web3
-        The web3 object.
-    status : bool
-        The connection status.
+    url : str
+        The RPC URL.
     """
 
     if api_key is None or api_key == '':
@@ -41,12 +44,128 @@ def connect_to_web3(network='goerli', api_key=None):
     else:
         raise ValueError('Invalid network')
 
-    w3 = Web3(Web3.HTTPProvider(url))
+    return url
+
+
+def parse_endpoints(endpoints):
+    """Parse a comma or newline separated list of RPC URLs.
+
+    Parameters
+    ----------
+    endpoints : str or list
+        The RPC URLs.
+
+    Returns
+    -------
+    urls : list
+        The non-empty RPC URLs.
+    """
+
+    if endpoints is None:
+        return []
+
+    if isinstance(endpoints, str):
+        endpoints = endpoints.replace('\n', ',').split(',')
+
+    return [url.strip() for url in endpoints if url.strip()]
+
+
+def connect_to_web3(network='goerli',
+                    api_key=None,
+                    endpoints=None,
+                    hedge=False):
+    """Connect to web3 and return the web3 object and connection status.
+
+    With extra endpoints, requests are routed by latency to the Alchemy
+    endpoint and the extra ones, failing over between them.
+
+    Parameters
+    ----------
+    network : str, optional
+        The network to connect to, by default 'goerli'.
+    api_key : str
+        The API key for the Alchemy API. Optional with extra endpoints.
+    endpoints : str or list, optional
+        Extra RPC URLs of the same network, comma separated.
+    hedge : bool, optional
+        Hedge slow read-only requests on a second endpoint, by default False.
+
+    Returns
+    -------
+    w3 : Web3
+        The web3 object.
+    status : bool
+        The connection status.
+    """
+
+    urls = parse_endpoints(endpoints)
+
+    if api_key or not urls:
+        urls.insert(0, get_network_url(network, api_key))
+
+    if len(urls) > 1:
+        # Imported here so single endpoint setups do not start the pool
+        from utils.rpc_pool import PooledHTTPProvider
+        provider = PooledHTTPProvider(urls, hedge=hedge)
+    else:
+        provider = Web3.HTTPProvider(urls[0])
+
+    w3 = Web3(provider)
     status = w3.is_connected()
 
     return w3, status
 
 
+async def async_connect_to_web3(network='goerli',
+                                api_key=None,
+                                pool_size=100,
+                                timeout=30):
+    """Connect to async web3 with a pooled keep-alive HTTP session.
+
+    All the requests of the returned object share one `aiohttp` session, so
+    hundreds of RPC calls can run concurrently over at most `pool_size`
+    connections. The session is returned too, and should be closed with
+    `await session.close()` once the web3 object is not needed anymore.
+
+    Parameters
+    ----------
+    network : str, optional
+        The network to connect to, by default 'goerli'.
+    api_key : str
+        The API key for the Alchemy API.
+    pool_size : int, optional
+        The maximum number of open connections, by default 100.
+    timeout : float, optional
+        The timeout of each request in seconds, by default 30.
+
+    Returns
+    -------
+    w3 : AsyncWeb3
+        The async web3 object.
+    status : bool
+        The connection status.
+    session : aiohttp.ClientSession
+        The HTTP session of the requests, to be closed by the caller.
+    """
+
+    url = get_network_url(network, api_key)
+
+    session = ClientSession(connector=TCPConnector(limit=pool_size),
+                            timeout=ClientTimeout(total=timeout))
+
+    try:
+        provider = AsyncHTTPProvider(url)
+        await provider.cache_async_session(session)
+
+        w3 = AsyncWeb3(provider)
+        status = await w3.is_connected()
+    except Exception:
+        await session.close()
+        raise
+
+    return w3, status, session
+
+
 def load_contract(w3, contract_address, abi_path):
     """Load the contract ABI from a JSON contract file.
     
@@ -69,3 +188,4 @@ def load_contract(w3, contract_address, abi_path):
     contract = w3.eth.contract(address=contract_address, abi=abi)
 
     return contract
+
@@ -0,0 +1,178 @@
+"""Executor utilities to sign messages outside of the event loop."""
+
+import asyncio
+import os
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
+# Per-worker signer, set by the pool initializer
+_worker_signer = None
+
+
+def _init_worker(signer):
+    """Initialize the signer of a pool worker.
+
+    Parameters
+    ----------
+    signer : MessageSigner
+        The signer used to sign messages.
+    """
+
+    global _worker_signer
+
+    _worker_signer = signer
+
+
+def _sign_in_worker(message):
+    """Sign a message inside a pool worker.
+
+    Parameters
+    ----------
+    message : str
+        The message to sign.
+
+    Returns
+    -------
+    message_hash : str
+        The message hash.
+    signature : str
+        The signature.
+    """
+
+    return _worker_signer.sign(message)
+
+
+class SigningExecutor:
+    """Pool of workers that sign messages off the event loop.
+
+    Parameters
+    ----------
+    signer : MessageSigner
+        The signer used to sign messages. Thread workers share it, process
+        workers receive their own copy of the parsed key.
+    kind : str, optional
+        The kind of pool, either 'thread' or 'process', by default 'thread'.
+    workers : int, optional
+        The number of workers, by default the number of CPUs.
+    """
+
+    def __init__(self, signer, kind='thread', workers=None):
+        if workers is None or workers <= 0:
+            workers = os.cpu_count() or 1
+
+        if kind == 'thread':
+            pool_class = ThreadPoolExecutor
+        elif kind == 'process':
+            pool_class = ProcessPoolExecutor
+        else:
+            raise ValueError('Invalid executor kind')
+
+        self.kind = kind
+        self.workers = workers
+        self._pool = pool_class(max_workers=workers,
+                                initializer=_init_worker,
+                                initargs=(signer, ))
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    async def sign(self, message):
+        """Sign a message in the pool without blocking the event loop.
+
+        Parameters
+        ----------
+        message : str
+            The message to sign.
+
+        Returns
+        -------
+        message_hash : str
+            The message hash.
+        signature : str
+            The signature.
+        """
+
+        with self._lock:
+            self._pending += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, _sign_in_worker,
+                                              message)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        """Return the pool size and the current queue depth.
+
+        Returns
+        -------
+        stats : dict
+            The executor kind, number of workers, pending signatures and
+            signatures waiting for a free worker.
+        """
+
+        with self._lock:
+            pending = self._pending
+
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'pending': pending,
+            'queue_depth': max(0, pending - self.workers),
+        }
+
+    def shutdown(self):
+        """Shutdown the pool and wait for running signatures."""
+
+        self._pool.shutdown(wait=True)
+
+
+def sign_many(signer, messages, workers=None, chunksize=256):
+    """Sign many messages in a pool of processes, one per CPU by default.
+
+    Parameters
+    ----------
+    signer : MessageSigner
+        The signer used to sign messages.
+    messages : list
+        The messages to sign.
+    workers : int, optional
+        The number of worker processes, by default the number of CPUs.
+    chunksize : int, optional
+        The number of messages sent to a worker at once, by default 256.
+
+    Returns
+    -------
+    signed : list
+        The message hash and signature of each message, in the same order.
+    """
+
+    with ProcessPoolExecutor(max_workers=workers or None,
+                             initializer=_init_worker,
+                             initargs=(signer, )) as pool:
+        return list(pool.map(_sign_in_worker, messages, chunksize=chunksize))
+
+
+def create_signing_executor(config, signer):
+    """Create a signing executor from the `[signer]` config section.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+    signer : MessageSigner
+        The signer used to sign messages.
+
+    Returns
+    -------
+    executor : SigningExecutor
+        The signing executor.
+    """
+
+    kind = config.get('signer', 'executor', fallback='thread')
+    workers = config.getint('signer', 'workers', fallback=0)
+
+    return SigningExecutor(signer, kind=kind, workers=workers)
@@ -0,0 +1,259 @@
+"""EIP-1559 fee oracle built on `eth_feeHistory`."""
+
+import asyncio
+import logging
+import threading
+import time
+
+from collections import deque
+from weakref import WeakKeyDictionary
+
+# Fee oracles shared by every helper using the same web3 object
+_oracles = WeakKeyDictionary()
+_oracles_lock = threading.Lock()
+
+
+class FeeOracle:
+    """Suggest fees from a rolling window of recent blocks.
+
+    The first refresh reads the fee history of `window` blocks, later ones
+    only read the `step` newest blocks and roll them into the window. The
+    history is refreshed at most once every `interval` seconds and the fees
+    only change when a new block is seen.
+
+    The priority fee is the median, over the window, of the `percentile`-th
+    tip paid in each block. The max fee leaves room for the base fee to grow
+    during `base_fee_multiplier` full blocks in a row. Chains without
+    EIP-1559 get a `gasPrice` instead. If the fee history cannot be read,
+    the gas price is used until it is read again after `retry_after`
+    seconds.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    window : int, optional
+        The number of blocks of the rolling window, by default 20.
+    percentile : float, optional
+        The tip percentile read in each block, by default 50.
+    step : int, optional
+        The number of blocks read by later refreshes, by default 5.
+    interval : float, optional
+        Seconds between refreshes, by default 1.
+    base_fee_multiplier : float, optional
+        The multiplier of the next base fee in the max fee, by default 2.
+    retry_after : float, optional
+        Seconds before reading the fee history again after an error, by
+        default 30.
+    """
+
+    def __init__(self,
+                 w3,
+                 window=20,
+                 percentile=50,
+                 step=5,
+                 interval=1.0,
+                 base_fee_multiplier=2,
+                 retry_after=30.0):
+        self.w3 = w3
+        self.window = window
+        self.percentile = percentile
+        self.step = step
+        self.interval = interval
+        self.base_fee_multiplier = base_fee_multiplier
+        self.retry_after = retry_after
+        self.tips = deque(maxlen=window)
+        self.base_fee = None
+        self.newest_block = None
+        self._legacy = False
+        self._retry_at = 0.0
+        self._fees = None
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            history = self.w3.eth.fee_history(self._count(), 'latest',
+                                              [self.percentile])
+        except ValueError as exc:
+            self._history_failed(exc)
+            return
+
+        self._roll(history)
+
+    def _count(self):
+        return self.step if self.tips else self.window
+
+    def _history_failed(self, exc):
+        # Errors may be transient, e.g. rate limits, so retry later
+        logging.getLogger('minter').warning(
+            f'Fee history unavailable, using the gas price for '
+            f'{self.retry_after:g}s: {exc}')
+        self._retry_at = time.monotonic() + self.retry_after
+
+    def _roll(self, history):
+        oldest = history['oldestBlock']
+        if isinstance(oldest, str):
+            oldest = int(oldest, 16)
+
+        rewards = history.get('reward') or []
+        for offset, reward in enumerate(rewards):
+            block = oldest + offset
+
+            if self.newest_block is not None and block <= self.newest_block:
+                continue
+
+            self.tips.append(reward[0] if reward else 0)
+            self.newest_block = block
+
+        # The last base fee is the one of the next block
+        self.base_fee = history['baseFeePerGas'][-1]
+        self._legacy = not any(history['baseFeePerGas'])
+
+    def _suggest(self, newest_block):
+        cached = self._fees is not None and 'gasPrice' not in self._fees
+        if cached and self.newest_block == newest_block:
+            return self._fees
+
+        tips = sorted(self.tips)
+        tip = tips[len(tips) // 2] if tips else 0
+        max_fee = int(self.base_fee * self.base_fee_multiplier) + tip
+
+        self._fees = {
+            'maxFeePerGas': max_fee,
+            'maxPriorityFeePerGas': tip,
+        }
+
+        return self._fees
+
+    def fees(self):
+        """Return the fee parameters for the next block.
+
+        Returns
+        -------
+        fees : dict
+            The `maxFeePerGas` and `maxPriorityFeePerGas`, or `gasPrice` on
+            legacy chains.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            fresh = now - self._refreshed_at < self.interval
+
+            if self._fees is not None and fresh:
+                return self._fees
+
+            newest_block = self.newest_block
+            if not self._legacy and now >= self._retry_at:
+                self._refresh()
+            self._refreshed_at = now
+
+            if self._legacy or time.monotonic() < self._retry_at:
+                self._fees = {'gasPrice': self.w3.eth.gas_price}
+                return self._fees
+
+            return self._suggest(newest_block)
+
+
+class AsyncFeeOracle(FeeOracle):
+    """Suggest fees from a rolling window of recent blocks with async web3.
+
+    Async version of `FeeOracle`, with the same parameters.
+
+    Parameters
+    ----------
+    w3 : AsyncWeb3
+        The async web3 object.
+    **kwargs
+        The parameters of `FeeOracle`.
+    """
+
+    def __init__(self, w3, **kwargs):
+        super().__init__(w3, **kwargs)
+        self._lock = asyncio.Lock()
+
+    async def _refresh(self):
+        try:
+            history = await self.w3.eth.fee_history(self._count(), 'latest',
+                                                    [self.percentile])
+        except ValueError as exc:
+            self._history_failed(exc)
+            return
+
+        self._roll(history)
+
+    async def fees(self):
+        """Return the fee parameters for the next block.
+
+        Returns
+        -------
+        fees : dict
+            The `maxFeePerGas` and `maxPriorityFeePerGas`, or `gasPrice` on
+            legacy chains.
+        """
+
+        async with self._lock:
+            now = time.monotonic()
+            fresh = now - self._refreshed_at < self.interval
+
+            if self._fees is not None and fresh:
+                return self._fees
+
+            newest_block = self.newest_block
+            if not self._legacy and now >= self._retry_at:
+                await self._refresh()
+            self._refreshed_at = now
+
+            if self._legacy or time.monotonic() < self._retry_at:
+                self._fees = {'gasPrice': await self.w3.eth.gas_price}
+                return self._fees
+
+            return self._suggest(newest_block)
+
+
+def get_fee_oracle(w3):
+    """Return the fee oracle shared by all helpers of a web3 object.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+
+    Returns
+    -------
+    oracle : FeeOracle
+        The shared fee oracle.
+    """
+
+    with _oracles_lock:
+        oracle = _oracles.get(w3)
+
+        if oracle is None:
+            oracle = FeeOracle(w3)
+            _oracles[w3] = oracle
+
+        return oracle
+
+
+def get_async_fee_oracle(w3):
+    """Return the fee oracle shared by all helpers of an async web3 object.
+
+    Parameters
+    ----------
+    w3 : AsyncWeb3
+        The async web3 object.
+
+    Returns
+    -------
+    oracle : AsyncFeeOracle
+        The shared fee oracle.
+    """
+
+    with _oracles_lock:
+        oracle = _oracles.get(w3)
+
+        if oracle is None:
+            oracle = AsyncFeeOracle(w3)
+            _oracles[w3] = oracle
+
+        return oracle
@@ -0,0 +1,264 @@
+"""Local index of token owners built from `Transfer` event logs.
+
+The `Transfer` logs of the contract are read with `eth_getLogs` in block
+ranges that adapt to the provider limits, and the latest owner of each token
+is stored in a SQLite database with the last indexed block. Later syncs only
+read the blocks after it.
+"""
+
+import logging
+import sqlite3
+import threading
+
+import requests
+
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+from utils.rpc import EndpointError
+from utils.rpc import is_log_limit_error
+
+# Topic of `Transfer(address,address,uint256)`
+TRANSFER_TOPIC = '0x' + keccak(text='Transfer(address,address,uint256)').hex()
+
+ZERO_ADDRESS = bytes(20)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS owners (
+    token BLOB PRIMARY KEY,
+    owner BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS owners_owner ON owners (owner);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _token_key(token_id):
+    return int(token_id).to_bytes(32, 'big')
+
+
+class OwnershipIndex:
+    """SQLite index of the owner of each token.
+
+    Token ids are stored as 32 bytes and owners as 20 bytes, with an index on
+    the owner to list the tokens of each account.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite database file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Close the database connection."""
+
+        self._conn.close()
+
+    def last_block(self):
+        """Return the last indexed block, or None if nothing was indexed."""
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'last_block'").fetchone()
+
+        return row[0] if row else None
+
+    def apply(self, logs, to_block):
+        """Apply `Transfer` logs and mark the blocks up to `to_block` indexed.
+
+        Both are written in one transaction, so an interrupted sync resumes
+        from the last applied range.
+
+        Parameters
+        ----------
+        logs : list
+            The `Transfer` logs, in chain order.
+        to_block : int
+            The last block covered by the logs.
+        """
+
+        with self._lock, self._conn:
+            for log in logs:
+                topics = log['topics']
+
+                # ERC-721 transfers index the sender, receiver and token id
+                if len(topics) != 4:
+                    continue
+
+                token = HexBytes(topics[3])
+                owner = HexBytes(topics[2])[-20:]
+
+                if owner == ZERO_ADDRESS:
+                    self._conn.execute('DELETE FROM owners WHERE token = ?',
+                                       (bytes(token), ))
+                else:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO owners (token, owner) '
+                        'VALUES (?, ?)', (bytes(token), bytes(owner)))
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) "
+                "VALUES ('last_block', ?)", (to_block, ))
+
+    def owners_of(self, token_ids, chunk_size=500):
+        """Return the owner of many tokens.
+
+        Parameters
+        ----------
+        token_ids : list
+            List of token IDs as int.
+        chunk_size : int, optional
+            The number of tokens per query, by default 500.
+
+        Returns
+        -------
+        owners : dict
+            The checksum owner address of each token, or None if the token is
+            not in the index.
+        """
+
+        # Imported here so the index can be read without the web3 stack
+        from web3 import Web3
+
+        owners = {token_id: None for token_id in token_ids}
+        keys = {_token_key(token_id): token_id for token_id in token_ids}
+        key_list = list(keys)
+
+        with self._lock:
+            for start in range(0, len(key_list), chunk_size):
+                chunk = key_list[start:start + chunk_size]
+                rows = self._conn.execute(
+                    'SELECT token, owner FROM owners WHERE token IN '
+                    f"({', '.join('?' * len(chunk))})", chunk).fetchall()
+
+                for token, owner in rows:
+                    owners[keys[token]] = Web3.to_checksum_address(owner)
+
+        return owners
+
+    def tokens_of(self, owner):
+        """Return the tokens of an owner.
+
+        Parameters
+        ----------
+        owner : str
+            The owner address.
+
+        Returns
+        -------
+        tokens : list
+            The token IDs as int.
+        """
+
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT token FROM owners WHERE owner = ? ORDER BY token',
+                (bytes(HexBytes(owner)), )).fetchall()
+
+        return [int.from_bytes(token, 'big') for token, in rows]
+
+    def count(self):
+        """Return the number of indexed tokens."""
+
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM owners').fetchone()[0]
+
+
+def sync_index(w3,
+               contract_address,
+               index,
+               start_block=0,
+               confirmations=5,
+               block_range=2000,
+               max_range=100000,
+               target_logs=5000,
+               progress=None):
+    """Index the `Transfer` logs of a contract up to the latest block.
+
+    The logs are read in block ranges that are halved when the provider
+    rejects a request for returning too many logs or times out, and doubled
+    while the responses have less than half of `target_logs`.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract_address : str
+        The address of the contract.
+    index : OwnershipIndex
+        The index to update.
+    start_block : int, optional
+        The first block of a new index, e.g. the deployment block, by
+        default 0.
+    confirmations : int, optional
+        The number of recent blocks left out, as they can be reorganized,
+        by default 5.
+    block_range : int, optional
+        The initial number of blocks per request, by default 2000.
+    max_range : int, optional
+        The maximum number of blocks per request, by default 100000.
+    target_logs : int, optional
+        The number of logs per response aimed at, by default 5000.
+    progress : tqdm, optional
+        Progress bar updated with the number of indexed blocks.
+
+    Returns
+    -------
+    last_block : int
+        The last indexed block.
+    """
+
+    logger = logging.getLogger('minter')
+
+    contract_address = w3.to_checksum_address(contract_address)
+    last_block = index.last_block()
+    from_block = start_block if last_block is None else last_block + 1
+    head = w3.eth.block_number - confirmations
+
+    if progress is not None:
+        progress.total = max(0, head - from_block + 1)
+        progress.refresh()
+
+    while from_block <= head:
+        to_block = min(from_block + block_range - 1, head)
+
+        try:
+            logs = w3.eth.get_logs({
+                'address': contract_address,
+                'fromBlock': from_block,
+                'toBlock': to_block,
+                'topics': [TRANSFER_TOPIC],
+            })
+        except (ValueError, requests.Timeout, EndpointError) as exc:
+            if not is_log_limit_error(exc) or block_range == 1:
+                raise
+
+            block_range = max(1, block_range // 2)
+            logger.info(f'Too many logs, reducing the range to '
+                        f'{block_range} blocks: {exc}')
+            continue
+
+        index.apply(logs, to_block)
+
+        if progress is not None:
+            progress.update(to_block - from_block + 1)
+
+        if len(logs) < target_logs // 2:
+            block_range = min(max_range, block_range * 2)
+
+        from_block = to_block + 1
+
+    logger.info(f'Indexed {index.count()} tokens up to block '
+                f'{index.last_block()}')
+
+    return index.last_block()
@@ -0,0 +1,617 @@
+"""Persistent journal of bulk mint and transfer transactions.
+
+Every planned transaction of a run is stored in a local SQLite database with
+its signed raw transaction, hash and confirmation status. The raw transaction
+is written before it is broadcast, so an interrupted run can be resumed:
+completed entries are skipped, pending ones are rebroadcast or replaced and
+the rest are sent.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from hexbytes import HexBytes
+from web3.exceptions import TimeExhausted
+
+from utils.nonce import get_nonce_manager
+from utils.nonce import is_known_transaction
+from utils.nonce import is_nonce_error
+from utils.receipts import ReceiptPoller
+from utils.rpc import RPCError
+from utils.rpc import batch_request
+from utils.rpc import to_int
+from utils.transaction import replacement_fees
+from utils.transaction import sign_transaction
+
+# Statuses of a journal entry
+PLANNED = 'planned'
+SIGNED = 'signed'
+SENT = 'sent'
+CONFIRMED = 'confirmed'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    nonce INTEGER,
+    fees TEXT,
+    raw_txn BLOB,
+    txn_hash TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_run ON entries (run, status);
+CREATE TABLE IF NOT EXISTS hashes (
+    entry_id INTEGER NOT NULL REFERENCES entries (id),
+    txn_hash TEXT NOT NULL,
+    PRIMARY KEY (entry_id, txn_hash)
+);
+"""
+
+
+class Journal:
+    """SQLite journal of the transactions of bulk runs.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite database file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Close the database connection."""
+
+        self._conn.close()
+
+    def has_run(self, run):
+        """Check whether a run has been planned.
+
+        Parameters
+        ----------
+        run : str
+            The name of the run.
+
+        Returns
+        -------
+        exists : bool
+            True if the run has entries.
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM entries WHERE run = ? LIMIT 1',
+                (run, )).fetchone()
+
+        return row is not None
+
+    def plan(self, run, kind, sender, payloads):
+        """Add the planned transactions of a run.
+
+        Parameters
+        ----------
+        run : str
+            The name of the run.
+        kind : str
+            The kind of transaction, either 'owner_mint' or 'transfer'.
+        sender : str
+            The sender address of the transactions.
+        payloads : iterable
+            The arguments of each transaction, as JSON serializable dicts.
+        """
+
+        now = time.time()
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO entries (run, kind, sender, payload, status, '
+                'updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                ((run, kind, sender, json.dumps(payload), PLANNED, now)
+                 for payload in payloads))
+
+    def entries(self, run, statuses=None):
+        """Return the entries of a run in planning order.
+
+        Parameters
+        ----------
+        run : str
+            The name of the run.
+        statuses : list, optional
+            Only return entries with these statuses, by default all.
+
+        Returns
+        -------
+        entries : list
+            List of dicts with the columns of each entry, the decoded
+            payload and fees, and the `txn_hashes` of every transaction
+            signed for the entry, oldest first.
+        """
+
+        query = 'SELECT * FROM entries WHERE run = ?'
+        args = [run]
+
+        if statuses is not None:
+            query += f" AND status IN ({', '.join('?' * len(statuses))})"
+            args.extend(statuses)
+
+        with self._lock:
+            rows = self._conn.execute(query + ' ORDER BY id', args).fetchall()
+            hash_rows = self._conn.execute(
+                'SELECT hashes.entry_id, hashes.txn_hash FROM hashes '
+                'JOIN entries ON entries.id = hashes.entry_id '
+                'WHERE entries.run = ? ORDER BY hashes.rowid',
+                (run, )).fetchall()
+
+        txn_hashes = {}
+        for entry_id, txn_hash in hash_rows:
+            txn_hashes.setdefault(entry_id, []).append(txn_hash)
+
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry['payload'] = json.loads(entry['payload'])
+            entry['fees'] = json.loads(entry['fees'] or '{}')
+            hashes = txn_hashes.get(entry['id'], [])
+
+            # Journals written before hashes were kept only have the last one
+            if entry['txn_hash'] and entry['txn_hash'] not in hashes:
+                hashes.append(entry['txn_hash'])
+
+            entry['txn_hashes'] = hashes
+
+            entries.append(entry)
+
+        return entries
+
+    def mark_signed(self, entry_id, nonce, fees, raw_txn, txn_hash):
+        """Store the signed transaction of an entry before broadcasting it.
+
+        The hashes of earlier transactions of the entry, e.g. replaced ones,
+        are kept, since any of them may be mined.
+
+        Parameters
+        ----------
+        entry_id : int
+            The id of the entry.
+        nonce : int
+            The nonce of the transaction.
+        fees : dict
+            The fee parameters of the transaction.
+        raw_txn : bytes
+            The signed raw transaction.
+        txn_hash : str
+            The transaction hash.
+        """
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE entries SET status = ?, nonce = ?, fees = ?, '
+                'raw_txn = ?, txn_hash = ?, updated_at = ? WHERE id = ?',
+                (SIGNED, nonce, json.dumps(fees), bytes(raw_txn), txn_hash,
+                 time.time(), entry_id))
+            self._conn.execute(
+                'INSERT OR IGNORE INTO hashes (entry_id, txn_hash) '
+                'VALUES (?, ?)', (entry_id, txn_hash))
+
+    def mark(self, entry_id, status, txn_hash=None):
+        """Update the status of an entry.
+
+        Parameters
+        ----------
+        entry_id : int
+            The id of the entry.
+        status : str
+            The new status.
+        txn_hash : str, optional
+            The hash of the mined transaction of the entry, if it is not the
+            last one signed.
+        """
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE entries SET status = ?, '
+                'txn_hash = COALESCE(?, txn_hash), updated_at = ? '
+                'WHERE id = ?', (status, txn_hash, time.time(), entry_id))
+
+    def summary(self, run):
+        """Return the number of entries per status of a run.
+
+        Parameters
+        ----------
+        run : str
+            The name of the run.
+
+        Returns
+        -------
+        summary : dict
+            The number of entries per status.
+        """
+
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT status, COUNT(*) FROM entries WHERE run = ? '
+                'GROUP BY status', (run, )).fetchall()
+
+        return {status: count for status, count in rows}
+
+
+def build_call(contract, kind, payload):
+    """Build the contract function call of a journal entry.
+
+    Parameters
+    ----------
+    contract
+        The contract object.
+    kind : str
+        The kind of transaction, either 'owner_mint' or 'transfer'.
+    payload : dict
+        The arguments of the transaction.
+
+    Returns
+    -------
+    contract_function
+        The contract function call.
+    """
+
+    if kind == 'owner_mint':
+        return contract.functions.ownerMint(payload['tokens'],
+                                            payload['owners'])
+
+    if kind == 'transfer':
+        return contract.functions.safeTransferFrom(payload['from'],
+                                                   payload['to'],
+                                                   payload['token_id'])
+
+    raise ValueError(f'Invalid journal entry kind: {kind}')
+
+
+def _fees(txn):
+    fee_keys = ('maxFeePerGas', 'maxPriorityFeePerGas', 'gasPrice')
+
+    return {key: txn[key] for key in fee_keys if key in txn}
+
+
+def _broadcast(w3, raw_txn):
+    try:
+        w3.eth.send_raw_transaction(raw_txn)
+    except ValueError as exc:
+        # The node already has it, e.g. from a send retried after a timeout
+        if not is_known_transaction(exc):
+            raise
+
+
+def _find_receipt(w3, txn_hashes):
+    receipts = batch_request(w3, [('eth_getTransactionReceipt', [txn_hash])
+                                  for txn_hash in txn_hashes])
+
+    for txn_hash, receipt in zip(txn_hashes, receipts):
+        if isinstance(receipt, RPCError):
+            raise receipt
+
+        if receipt is not None:
+            return txn_hash, receipt
+
+    return None
+
+
+def _rejected(exc):
+    # Errors answered by the node mean the transaction was not accepted,
+    # except a used nonce, which may have been used by this very transaction
+    if not isinstance(exc, ValueError):
+        return False
+
+    return 'nonce too low' not in str(exc).lower()
+
+
+def _sign_entry(w3,
+                contract,
+                journal,
+                entry,
+                private_key,
+                nonce=None,
+                fees=None):
+    # Entries without a gas limit are estimated by the builder
+    params = dict(fees or {})
+    if 'gas' in entry['payload']:
+        params['gas'] = entry['payload']['gas']
+
+    txn, txn_signed = sign_transaction(w3,
+                                       build_call(contract, entry['kind'],
+                                                  entry['payload']),
+                                       private_key,
+                                       entry['sender'],
+                                       params,
+                                       nonce=nonce)
+
+    journal.mark_signed(entry['id'], txn['nonce'], _fees(txn),
+                        txn_signed.rawTransaction, txn_signed.hash.hex())
+    entry.update(nonce=txn['nonce'], fees=_fees(txn))
+
+    return txn_signed.rawTransaction, txn_signed.hash.hex()
+
+
+def execute_run(w3,
+                contract,
+                journal,
+                run,
+                private_key,
+                max_pending=16,
+                poll_interval=1.0,
+                progress=None,
+                replace_after=None,
+                timeout=120):
+    """Sign, send and confirm the entries of a run.
+
+    Planned entries are signed and stored in the journal before being
+    broadcast. Entries already sent are only tracked until they are mined.
+    Entries pending for `replace_after` blocks are replaced with higher fees.
+    Entries not mined within `timeout` seconds stay sent, so that
+    `resume_run` checks them again.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    journal : Journal
+        The journal of the run.
+    run : str
+        The name of the run.
+    private_key : str
+        The private key of the sender of the run.
+    max_pending : int, optional
+        Maximum number of transactions in flight, by default 16.
+    poll_interval : float, optional
+        Seconds between receipt checks, by default 1.
+    progress : tqdm, optional
+        Progress bar updated with the size of each confirmed entry.
+    replace_after : int, optional
+        Number of blocks after which a pending entry is replaced, by default
+        None (never).
+    timeout : float, optional
+        Seconds to wait for the receipt of an entry, by default 120.
+
+    Returns
+    -------
+    summary : dict
+        The number of entries per status of the run.
+    """
+
+    logger = logging.getLogger('minter')
+
+    def replace(entry):
+        raw_txn, txn_hash = _sign_entry(w3,
+                                        contract,
+                                        journal,
+                                        entry,
+                                        private_key,
+                                        nonce=entry['nonce'],
+                                        fees=replacement_fees(
+                                            w3, entry['fees']))
+        _broadcast(w3, raw_txn)
+        journal.mark(entry['id'], SENT)
+
+        return txn_hash
+
+    def on_mined(entry, future):
+        if future.exception() is not None:
+            return
+
+        receipt = future.result()
+        status = CONFIRMED if to_int(receipt['status']) == 1 else FAILED
+
+        # The receipt has the hash of the replacement, if any was mined
+        journal.mark(entry['id'],
+                     status,
+                     txn_hash=HexBytes(receipt['transactionHash']).hex())
+
+        if progress is not None:
+            progress.update(len(entry['payload'].get('tokens', [None])))
+
+    with ReceiptPoller(w3,
+                       poll_interval=poll_interval,
+                       timeout=timeout,
+                       replace_after=replace_after) as poller:
+        futures = []
+
+        # Track the entries sent before, e.g. rebroadcast by `resume_run`
+        for entry in journal.entries(run, [SENT]):
+            futures.append(
+                poller.track(entry['txn_hash'],
+                             callback=lambda f, e=entry: on_mined(e, f),
+                             sender=entry['sender'],
+                             replace=lambda _, e=entry: replace(e)))
+
+        for entry in journal.entries(run, [PLANNED]):
+            while poller.pending() >= max_pending:
+                time.sleep(poll_interval)
+
+            raw_txn, txn_hash = _sign_entry(w3, contract, journal, entry,
+                                            private_key)
+
+            try:
+                _broadcast(w3, raw_txn)
+            except Exception as exc:
+                get_nonce_manager(w3).resync(
+                    w3.to_checksum_address(entry['sender']))
+
+                # Only a rejected transaction can be planned again. After
+                # other errors, e.g. timeouts, the node may have accepted it,
+                # so the entry stays signed for `resume_run` to check
+                if _rejected(exc):
+                    journal.mark(entry['id'], PLANNED)
+                raise
+
+            journal.mark(entry['id'], SENT)
+            logger.info(f"Sent {entry['kind']} entry {entry['id']} with "
+                        f"hash: {txn_hash}")
+
+            futures.append(
+                poller.track(txn_hash,
+                             callback=lambda f, e=entry: on_mined(e, f),
+                             sender=entry['sender'],
+                             replace=lambda _, e=entry: replace(e)))
+
+        for future in futures:
+            try:
+                future.result()
+            except TimeExhausted as exc:
+                logger.warning(f'Entry of run {run} not mined: {exc}')
+
+    return journal.summary(run)
+
+
+def resume_run(w3,
+               contract,
+               journal,
+               run,
+               private_key,
+               replace=False,
+               max_pending=16,
+               poll_interval=1.0,
+               progress=None,
+               replace_after=None,
+               timeout=120):
+    """Resume an interrupted run.
+
+    The receipts of every transaction signed for the entries signed or sent
+    before the interruption, including replaced ones, are requested in one
+    batch, after the confirmed nonce of each sender. Entries with a mined
+    transaction are marked as completed. Entries whose nonce was consumed by
+    another transaction are planned again, once their receipts are checked
+    again. The remaining ones are rebroadcast, or replaced with higher fees
+    when `replace` is set. Then the run is executed to completion.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    journal : Journal
+        The journal of the run.
+    run : str
+        The name of the run.
+    private_key : str
+        The private key of the sender of the run.
+    replace : bool, optional
+        Replace pending transactions with higher fees instead of
+        rebroadcasting them, by default False.
+    max_pending : int, optional
+        Maximum number of transactions in flight, by default 16.
+    poll_interval : float, optional
+        Seconds between receipt checks, by default 1.
+    progress : tqdm, optional
+        Progress bar updated with the size of each confirmed entry.
+    replace_after : int, optional
+        Number of blocks after which a pending entry is replaced, by default
+        None (never).
+    timeout : float, optional
+        Seconds to wait for the receipt of an entry, by default 120.
+
+    Returns
+    -------
+    summary : dict
+        The number of entries per status of the run.
+    """
+
+    logger = logging.getLogger('minter')
+
+    def complete(entry, txn_hash, receipt):
+        status = CONFIRMED if to_int(receipt['status']) == 1 else FAILED
+        journal.mark(entry['id'], status, txn_hash=txn_hash)
+
+    def plan_again(entry):
+        # A transaction mined since its receipt was requested also uses the
+        # nonce, so the receipts are checked once more before sending again
+        found = _find_receipt(w3, entry['txn_hashes'])
+        if found is not None:
+            complete(entry, *found)
+            return
+
+        logger.info(f"Entry {entry['id']} was dropped, planning again")
+        journal.mark(entry['id'], PLANNED)
+
+    entries = journal.entries(run, [SIGNED, SENT])
+
+    # The nonces are read before the receipts, so a transaction mined in
+    # between has a receipt instead of looking dropped
+    confirmed_nonces = {}
+    for entry in entries:
+        sender = w3.to_checksum_address(entry['sender'])
+        if sender not in confirmed_nonces:
+            confirmed_nonces[sender] = w3.eth.get_transaction_count(
+                sender, 'latest')
+
+    calls = [(entry['id'], txn_hash) for entry in entries
+             for txn_hash in entry['txn_hashes']]
+    receipts = batch_request(w3, [('eth_getTransactionReceipt', [txn_hash])
+                                  for _, txn_hash in calls])
+
+    # Transactions of an entry share a nonce, so at most one is mined
+    mined = {}
+    for (entry_id, txn_hash), receipt in zip(calls, receipts):
+        if isinstance(receipt, RPCError):
+            raise receipt
+
+        if receipt is not None:
+            mined[entry_id] = (txn_hash, receipt)
+
+    for entry in entries:
+        if entry['id'] in mined:
+            complete(entry, *mined[entry['id']])
+            continue
+
+        # The nonce was used by another transaction, so this one was dropped
+        sender = w3.to_checksum_address(entry['sender'])
+        if entry['nonce'] < confirmed_nonces[sender]:
+            plan_again(entry)
+            continue
+
+        raw_txn = entry['raw_txn']
+        if replace:
+            raw_txn, txn_hash = _sign_entry(w3,
+                                            contract,
+                                            journal,
+                                            entry,
+                                            private_key,
+                                            nonce=entry['nonce'],
+                                            fees=replacement_fees(
+                                                w3, entry['fees']))
+            entry['txn_hashes'].append(txn_hash)
+            logger.info(f"Replacing entry {entry['id']} with higher fees")
+
+        try:
+            _broadcast(w3, raw_txn)
+        except ValueError as exc:
+            if not is_nonce_error(exc):
+                raise
+
+            # The nonce was used meanwhile, otherwise the node still has the
+            # transaction in its pool
+            if 'nonce too low' in str(exc).lower():
+                plan_again(entry)
+                continue
+
+        journal.mark(entry['id'], SENT)
+
+    # Fresh nonces are needed for the entries planned again
+    for sender in confirmed_nonces:
+        get_nonce_manager(w3).resync(sender)
+
+    return execute_run(w3, contract, journal, run, private_key, max_pending,
+                       poll_interval, progress, replace_after, timeout)
@@ -0,0 +1,330 @@
+"""Concurrent fetching of token metadata with a content-addressed cache.
+
+The metadata of each token is served at its `tokenURI`, the base URI of the
+contract followed by the decimal token ID. Responses are stored on disk under
+the SHA-256 of their content, and indexed by URL with their `ETag` and
+`Last-Modified` headers, so later fetches are revalidated with conditional
+requests and unchanged metadata is not downloaded again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+class MetadataCache:
+    """Content-addressed disk cache of HTTP responses.
+
+    Parameters
+    ----------
+    directory : str
+        The cache directory, created if needed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.db'),
+                                     check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Close the index database connection."""
+
+        self._conn.close()
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def lookup(self, url):
+        """Return the cache entry of a URL.
+
+        Parameters
+        ----------
+        url : str
+            The URL.
+
+        Returns
+        -------
+        entry : dict or None
+            The `digest`, `etag`, `last_modified` and `fetched_at` of the
+            cached response, or None if it is not cached.
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT digest, etag, last_modified, fetched_at FROM entries '
+                'WHERE url = ?', (url, )).fetchone()
+
+        if row is None or not os.path.exists(self._object_path(row[0])):
+            return None
+
+        return dict(zip(('digest', 'etag', 'last_modified', 'fetched_at'),
+                        row))
+
+    def read(self, digest):
+        """Return the content stored under a digest.
+
+        Parameters
+        ----------
+        digest : str
+            The SHA-256 hex digest of the content.
+
+        Returns
+        -------
+        content : bytes
+            The content.
+        """
+
+        with open(self._object_path(digest), 'rb') as f:
+            return f.read()
+
+    def store(self, url, content, etag=None, last_modified=None):
+        """Store the response of a URL.
+
+        Parameters
+        ----------
+        url : str
+            The URL.
+        content : bytes
+            The response body.
+        etag : str, optional
+            The `ETag` header of the response.
+        last_modified : str, optional
+            The `Last-Modified` header of the response.
+
+        Returns
+        -------
+        digest : str
+            The SHA-256 hex digest of the content.
+        """
+
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+
+        # Identical responses are stored once
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (url, digest, etag, '
+                'last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)',
+                (url, digest, etag, last_modified, time.time()))
+
+        return digest
+
+    def touch(self, url):
+        """Mark the cached response of a URL as just revalidated.
+
+        Parameters
+        ----------
+        url : str
+            The URL.
+        """
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE entries SET fetched_at = ? WHERE url = ?',
+                (time.time(), url))
+
+
+def create_session(pool_size=16, retries=3, backoff=0.5):
+    """Create an HTTP session with pooled connections and retries.
+
+    Connection errors and 429/5xx responses are retried with exponential
+    backoff, honoring the `Retry-After` header.
+
+    Parameters
+    ----------
+    pool_size : int, optional
+        The number of keep-alive connections per host, by default 16.
+    retries : int, optional
+        The number of retries of each request, by default 3.
+    backoff : float, optional
+        The backoff factor in seconds, by default 0.5.
+
+    Returns
+    -------
+    session : requests.Session
+        The HTTP session.
+    """
+
+    retry = Retry(total=retries,
+                  backoff_factor=backoff,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size,
+                          max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+def fetch_url(session, cache, url, timeout=10, max_age=None):
+    """Fetch a URL through the cache.
+
+    Parameters
+    ----------
+    session : requests.Session
+        The HTTP session.
+    cache : MetadataCache
+        The response cache.
+    url : str
+        The URL.
+    timeout : float, optional
+        The HTTP timeout in seconds, by default 10.
+    max_age : float, optional
+        Seconds during which a cached response is used without revalidation,
+        by default None (always revalidate).
+
+    Returns
+    -------
+    content : bytes
+        The response body.
+    """
+
+    entry = cache.lookup(url)
+
+    headers = {}
+    if entry is not None:
+        if max_age is not None and time.time() - entry['fetched_at'] < max_age:
+            return cache.read(entry['digest'])
+
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    response = session.get(url, headers=headers, timeout=timeout)
+
+    if response.status_code == 304 and entry is not None:
+        cache.touch(url)
+        return cache.read(entry['digest'])
+
+    response.raise_for_status()
+    cache.store(url, response.content, response.headers.get('ETag'),
+                response.headers.get('Last-Modified'))
+
+    return response.content
+
+
+def fetch_metadata(base_uri,
+                   token_ids,
+                   cache,
+                   workers=16,
+                   retries=3,
+                   backoff=0.5,
+                   timeout=10,
+                   max_age=None,
+                   progress=None):
+    """Fetch the metadata of many tokens concurrently.
+
+    Parameters
+    ----------
+    base_uri : str
+        The base token URI, e.g. from `getBaseURI`.
+    token_ids : list
+        List of token IDs as int.
+    cache : MetadataCache
+        The response cache.
+    workers : int, optional
+        The maximum number of concurrent requests, by default 16.
+    retries : int, optional
+        The number of retries of each request, by default 3.
+    backoff : float, optional
+        The backoff factor of the retries in seconds, by default 0.5.
+    timeout : float, optional
+        The HTTP timeout in seconds, by default 10.
+    max_age : float, optional
+        Seconds during which a cached response is used without revalidation,
+        by default None (always revalidate).
+    progress : tqdm, optional
+        Progress bar updated with each fetched token.
+
+    Returns
+    -------
+    metadata : dict
+        The decoded JSON metadata of each token, or None if it could not be
+        fetched.
+    """
+
+    logger = logging.getLogger('minter')
+
+    session = create_session(workers, retries, backoff)
+
+    def fetch(token_id):
+        url = f'{base_uri}{token_id}'
+
+        try:
+            return json.loads(fetch_url(session, cache, url, timeout, max_age))
+        except (requests.RequestException, ValueError) as exc:
+            logger.warning(f'Fetching metadata of {url} failed: {exc}')
+            return None
+        finally:
+            if progress is not None:
+                progress.update(1)
+
+    with session, ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(token_ids, pool.map(fetch, token_ids)))
+
+
+def fetch_token_metadata(contract, token_ids, cache, **kwargs):
+    """Fetch the metadata of many tokens from the base URI of the contract.
+
+    The base URI is read once with `getBaseURI` instead of one `tokenURI`
+    call per token.
+
+    Parameters
+    ----------
+    contract
+        The contract object.
+    token_ids : list
+        List of token IDs as int.
+    cache : MetadataCache
+        The response cache.
+    **kwargs
+        Keyword arguments of `fetch_metadata`.
+
+    Returns
+    -------
+    metadata : dict
+        The decoded JSON metadata of each token, or None if it could not be
+        fetched.
+    """
+
+    base_uri = contract.functions.getBaseURI().call()
+
+    return fetch_metadata(base_uri, token_ids, cache, **kwargs)
@@ -4,20 +4,36 @@ import logging
 
 import requests
 
+from utils.journal import execute_run
+from utils.journal import resume_run
+from utils.transaction import async_send_transaction
+from utils.transaction import async_wait_for_receipt
+from utils.transaction import send_transaction
+from utils.transaction import wait_for_receipt
 
-def get_token_id(url):
+# Keep-alive session shared by the unbuffered token ID requests
+_session = requests.Session()
+
+
+def get_token_id(url, buffer=None):
     """Obtain a token ID from GET request in URL.
-    
+
     Parameters
     ----------
     url : str
         The URL to GET request.
+    buffer : TokenIdBuffer, optional
+        Buffer of prefetched token IDs from the same URL. If given, the ID is
+        taken from it instead of requesting one.
     """
 
     logger = logging.getLogger('minter')
 
+    if buffer is not None:
+        return buffer.get()
+
     # Make a GET request to the URL
-    r = requests.get(url, timeout=5)
+    r = _session.get(url, timeout=5)
 
     # Check if the request was successful
     if r.status_code != 200:
@@ -30,7 +46,13 @@ def get_token_id(url):
     return token_id
 
 
-def verify_and_mint(w3, contract, private_key, signature, address, token_id):
+def verify_and_mint(w3,
+                    contract,
+                    private_key,
+                    signature,
+                    address,
+                    token_id,
+                    wait=True):
     """Mint an NFT.
 
     Parameters
@@ -47,6 +69,9 @@ def verify_and_mint(w3, contract, private_key, signature, address, token_id):
         The owner address.
     token_id : int
         The token ID.
+    wait : bool, optional
+        Wait for the transaction receipt, by default True. Otherwise the
+        transaction hash is returned right after sending the transaction.
 
     Returns
     -------
@@ -56,20 +81,15 @@ def verify_and_mint(w3, contract, private_key, signature, address, token_id):
 
     logger = logging.getLogger('minter')
 
-    txn = contract.functions.verifyAndMint(
-        signature, token_id).build_transaction({
-            'nonce':
-            w3.eth.get_transaction_count(address),
-            'gas':
-            1000000
-        })
+    # Send the transaction and wait for the transaction receipt if required
+    txn_hash = send_transaction(
+        w3, contract.functions.verifyAndMint(signature, token_id),
+        private_key, address, {})
 
-    # Sign the transaction
-    txn_signed = w3.eth.account.sign_transaction(txn, private_key)
+    if not wait:
+        return txn_hash.hex()
 
-    # Send the transaction and wait for the transaction receipt
-    txn_hash = w3.eth.send_raw_transaction(txn_signed.rawTransaction)
-    txn_receipt = w3.eth.wait_for_transaction_receipt(txn_hash)
+    txn_receipt = wait_for_receipt(w3, txn_hash, address)
     txn_receipt = txn_receipt.transactionHash.hex()
 
     log_msg = f"TXN with hash: { txn_receipt }"
@@ -78,7 +98,13 @@ def verify_and_mint(w3, contract, private_key, signature, address, token_id):
     return txn_receipt
 
 
-def transfer(w3, contract, from_address, to_address, private_key, token_id):
+def transfer(w3,
+             contract,
+             from_address,
+             to_address,
+             private_key,
+             token_id,
+             wait=True):
     """Mint an NFT.
 
     Parameters
@@ -95,6 +121,212 @@ def transfer(w3, contract, from_address, to_address, private_key, token_id):
         The private key.
     token_id : int
         The token ID.
+    wait : bool, optional
+        Wait for the transaction receipt, by default True. Otherwise the
+        transaction hash is returned right after sending the transaction.
+
+    Returns
+    -------
+    txn : dict
+        The transaction dictionary.
+    """
+
+    logger = logging.getLogger('minter')
+
+    from_address = w3.to_checksum_address(from_address.lower())
+    to_address = w3.to_checksum_address(to_address.lower())
+
+    # Send the transaction and wait for the transaction receipt if required
+    txn_hash = send_transaction(
+        w3,
+        contract.functions.safeTransferFrom(from_address, to_address,
+                                            token_id), private_key,
+        from_address, {})
+
+    if not wait:
+        return txn_hash.hex()
+
+    txn_receipt = wait_for_receipt(w3, txn_hash, from_address)
+    txn_receipt = txn_receipt.transactionHash.hex()
+
+    log_msg = f"TXN with hash: { txn_receipt }"
+    logger.info(log_msg)
+
+    return txn_receipt
+
+
+def transfer_many(w3,
+                  contract,
+                  journal,
+                  run,
+                  from_address,
+                  private_key,
+                  transfers,
+                  max_pending=16,
+                  timeout=120):
+    """Transfer many NFTs from one address, recording them in a journal.
+
+    If the run already exists in the journal it is resumed instead, so
+    transfers already confirmed are not sent again.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    journal : Journal
+        The journal of the run.
+    run : str
+        The name of the run.
+    from_address : str
+        The from address.
+    private_key : str
+        The private key.
+    transfers : list
+        List of `(to_address, token_id)` tuples.
+    max_pending : int, optional
+        Maximum number of transactions in flight, by default 16.
+    timeout : float, optional
+        Seconds to wait for the receipt of a transfer, by default 120.
+
+    Returns
+    -------
+    summary : dict
+        The number of transfers per status of the run.
+    """
+
+    from_address = w3.to_checksum_address(from_address.lower())
+
+    if journal.has_run(run):
+        return resume_run(w3,
+                          contract,
+                          journal,
+                          run,
+                          private_key,
+                          max_pending=max_pending,
+                          timeout=timeout)
+
+    journal.plan(run, 'transfer', from_address,
+                 [{
+                     'from': from_address,
+                     'to': w3.to_checksum_address(to_address.lower()),
+                     'token_id': token_id
+                 } for to_address, token_id in transfers])
+
+    return execute_run(w3,
+                       contract,
+                       journal,
+                       run,
+                       private_key,
+                       max_pending=max_pending,
+                       timeout=timeout)
+
+
+async def async_get_token_id(session, url):
+    """Obtain a token ID from GET request in URL with an async session.
+
+    Parameters
+    ----------
+    session : aiohttp.ClientSession
+        The HTTP session, reused across requests.
+    url : str
+        The URL to GET request.
+    """
+
+    logger = logging.getLogger('minter')
+
+    # Make a GET request to the URL
+    async with session.get(url) as r:
+        # Check if the request was successful
+        if r.status != 200:
+            logger.error('GET request failed!')
+            return None
+
+        # Get the token ID from the response
+        token_id = (await r.json())['id']
+
+    return token_id
+
+
+async def async_verify_and_mint(w3,
+                                contract,
+                                private_key,
+                                signature,
+                                address,
+                                token_id,
+                                wait=True):
+    """Mint an NFT with async web3.
+
+    Parameters
+    ----------
+    w3 : AsyncWeb3
+        The async web3 object.
+    contract
+        The async contract object.
+    private_key : str
+        The private key.
+    signature : str
+        The signature.
+    address : str
+        The owner address.
+    token_id : int
+        The token ID.
+    wait : bool, optional
+        Wait for the transaction receipt, by default True. Otherwise the
+        transaction hash is returned right after sending the transaction.
+
+    Returns
+    -------
+    txn : dict
+        The transaction dictionary.
+    """
+
+    logger = logging.getLogger('minter')
+
+    # Send the transaction and wait for the transaction receipt if required
+    txn_hash = await async_send_transaction(
+        w3, contract.functions.verifyAndMint(signature, token_id), private_key,
+        address, {})
+
+    if not wait:
+        return txn_hash.hex()
+
+    txn_receipt = await async_wait_for_receipt(w3, txn_hash, address)
+    txn_receipt = txn_receipt.transactionHash.hex()
+
+    log_msg = f"TXN with hash: { txn_receipt }"
+    logger.info(log_msg)
+
+    return txn_receipt
+
+
+async def async_transfer(w3,
+                         contract,
+                         from_address,
+                         to_address,
+                         private_key,
+                         token_id,
+                         wait=True):
+    """Transfer an NFT with async web3.
+
+    Parameters
+    ----------
+    w3 : AsyncWeb3
+        The async web3 object.
+    contract
+        The async contract object.
+    from_address : str
+        The from address.
+    to_address : str
+        The to address.
+    private_key : str
+        The private key.
+    token_id : int
+        The token ID.
+    wait : bool, optional
+        Wait for the transaction receipt, by default True. Otherwise the
+        transaction hash is returned right after sending the transaction.
 
     Returns
     -------
@@ -107,20 +339,17 @@ def transfer(w3, contract, from_address, to_address, private_key, token_id):
     from_address = w3.to_checksum_address(from_address.lower())
     to_address = w3.to_checksum_address(to_address.lower())
 
-    txn = contract.functions.safeTransferFrom(
-        from_address, to_address, token_id).build_transaction({
-            'nonce':
-            w3.eth.get_transaction_count(from_address),
-            'gas':
-            1000000
-        })
+    # Send the transaction and wait for the transaction receipt if required
+    txn_hash = await async_send_transaction(
+        w3,
+        contract.functions.safeTransferFrom(from_address, to_address,
+                                            token_id), private_key,
+        from_address, {})
 
-    # Sign the transaction
-    txn_signed = w3.eth.account.sign_transaction(txn, private_key)
+    if not wait:
+        return txn_hash.hex()
 
-    # Send the transaction and wait for the transaction receipt
-    txn_hash = w3.eth.send_raw_transaction(txn_signed.rawTransaction)
-    txn_receipt = w3.eth.wait_for_transaction_receipt(txn_hash)
+    txn_receipt = await async_wait_for_receipt(w3, txn_hash, from_address)
     txn_receipt = txn_receipt.transactionHash.hex()
 
     log_msg = f"TXN with hash: { txn_receipt }"
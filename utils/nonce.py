@@ -0,0 +1,238 @@
+"""Local nonce management for transaction senders."""
+
+import asyncio
+import logging
+import threading
+
+from weakref import WeakKeyDictionary
+
+# Fragments of provider errors rejecting a transaction for its nonce
+NONCE_ERRORS = (
+    'nonce too low',
+    'nonce too high',
+    'invalid nonce',
+)
+
+# Fragments of provider errors about a transaction already in the mempool
+KNOWN_ERRORS = (
+    'already known',
+    'known transaction',
+)
+
+# Nonce managers shared by every helper using the same web3 object
+_managers = WeakKeyDictionary()
+_managers_lock = threading.Lock()
+
+
+class NonceManager:
+    """Hand out nonces locally, fetching them once per account.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self._nonces = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _account_lock(self, address):
+        with self._lock:
+            return self._locks.setdefault(address, threading.Lock())
+
+    def next_nonce(self, address):
+        """Return the next nonce of an account.
+
+        The first call fetches the pending transaction count of the account,
+        later calls are served from memory.
+
+        Parameters
+        ----------
+        address : str
+            The checksum address of the sender.
+
+        Returns
+        -------
+        nonce : int
+            The nonce to use in the next transaction.
+        """
+
+        with self._account_lock(address):
+            nonce = self._nonces.get(address)
+
+            if nonce is None:
+                nonce = self.w3.eth.get_transaction_count(
+                    address, 'pending')
+
+            self._nonces[address] = nonce + 1
+
+            return nonce
+
+    def resync(self, address):
+        """Forget the local nonce of an account, so it is fetched again.
+
+        Parameters
+        ----------
+        address : str
+            The checksum address of the sender.
+        """
+
+        logger = logging.getLogger('minter')
+
+        with self._account_lock(address):
+            self._nonces.pop(address, None)
+
+        logger.info(f'Nonce of {address} will be resynced')
+
+
+class AsyncNonceManager:
+    """Hand out nonces locally for async web3, fetching them once per account.
+
+    Parameters
+    ----------
+    w3 : AsyncWeb3
+        The async web3 object.
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self._nonces = {}
+        self._locks = {}
+
+    def _account_lock(self, address):
+        return self._locks.setdefault(address, asyncio.Lock())
+
+    async def next_nonce(self, address):
+        """Return the next nonce of an account.
+
+        Parameters
+        ----------
+        address : str
+            The checksum address of the sender.
+
+        Returns
+        -------
+        nonce : int
+            The nonce to use in the next transaction.
+        """
+
+        async with self._account_lock(address):
+            nonce = self._nonces.get(address)
+
+            if nonce is None:
+                nonce = await self.w3.eth.get_transaction_count(
+                    address, 'pending')
+
+            self._nonces[address] = nonce + 1
+
+            return nonce
+
+    async def resync(self, address):
+        """Forget the local nonce of an account, so it is fetched again.
+
+        Parameters
+        ----------
+        address : str
+            The checksum address of the sender.
+        """
+
+        logger = logging.getLogger('minter')
+
+        async with self._account_lock(address):
+            self._nonces.pop(address, None)
+
+        logger.info(f'Nonce of {address} will be resynced')
+
+
+def get_nonce_manager(w3):
+    """Return the nonce manager shared by all helpers of a web3 object.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+
+    Returns
+    -------
+    nonce_manager : NonceManager
+        The shared nonce manager.
+    """
+
+    with _managers_lock:
+        manager = _managers.get(w3)
+
+        if manager is None:
+            manager = NonceManager(w3)
+            _managers[w3] = manager
+
+        return manager
+
+
+def get_async_nonce_manager(w3):
+    """Return the nonce manager shared by all helpers of an async web3 object.
+
+    Parameters
+    ----------
+    w3 : AsyncWeb3
+        The async web3 object.
+
+    Returns
+    -------
+    nonce_manager : AsyncNonceManager
+        The shared nonce manager.
+    """
+
+    with _managers_lock:
+        manager = _managers.get(w3)
+
+        if manager is None:
+            manager = AsyncNonceManager(w3)
+            _managers[w3] = manager
+
+        return manager
+
+
+def is_nonce_error(exc):
+    """Check whether a provider rejected a transaction for its nonce.
+
+    A rejected transaction was not added to the mempool, so it can be signed
+    again with a fresh nonce. Replacements of a pending transaction that are
+    underpriced are not nonce errors, the pending one may be a copy of the
+    same transaction.
+
+    Parameters
+    ----------
+    exc : Exception
+        The error raised by the provider.
+
+    Returns
+    -------
+    is_nonce_error : bool
+        True if the error is about the nonce.
+    """
+
+    message = str(exc).lower()
+
+    return any(fragment in message for fragment in NONCE_ERRORS)
+
+
+def is_known_transaction(exc):
+    """Check whether a provider error means the transaction was already sent.
+
+    Parameters
+    ----------
+    exc : Exception
+        The error raised by the provider.
+
+    Returns
+    -------
+    is_known : bool
+        True if the same signed transaction is already in the mempool.
+    """
+
+    message = str(exc).lower()
+
+    return any(fragment in message for fragment in KNOWN_ERRORS)
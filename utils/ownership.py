@@ -0,0 +1,188 @@
+"""Batched reads of token existence and ownership."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from hexbytes import HexBytes
+
+from utils.rpc import RPCError
+from utils.rpc import batch_request
+
+
+def _token_calls(contract, token_ids, fn_names, block_identifier):
+    if isinstance(block_identifier, int):
+        block_identifier = hex(block_identifier)
+
+    calls = []
+    for token_id in token_ids:
+        for fn_name in fn_names:
+            data = contract.encodeABI(fn_name=fn_name, args=[token_id])
+            calls.append(('eth_call', [{
+                'to': contract.address,
+                'data': data
+            }, block_identifier]))
+
+    return calls
+
+
+def _fetch_batch(w3, contract, token_ids, block_identifier, retries):
+    # Only reverts are caused by the tokens, other errors are retried
+    results = batch_request(w3,
+                            _token_calls(contract, token_ids,
+                                         ('exists', 'ownerOf'),
+                                         block_identifier),
+                            retries=retries)
+
+    owners = {}
+    for index, token_id in enumerate(token_ids):
+        exists, owner_of = results[2 * index], results[2 * index + 1]
+
+        if isinstance(exists, RPCError):
+            raise exists
+
+        if not w3.codec.decode(['bool'], HexBytes(exists))[0]:
+            owners[token_id] = None
+            continue
+
+        if isinstance(owner_of, RPCError):
+            raise owner_of
+
+        owner = w3.codec.decode(['address'], HexBytes(owner_of))[0]
+        owners[token_id] = w3.to_checksum_address(owner)
+
+    return owners
+
+
+def fetch_owners(w3,
+                 contract,
+                 token_ids,
+                 batch_size=100,
+                 workers=4,
+                 block_identifier='latest',
+                 progress=None,
+                 retries=3):
+    """Fetch the owner of many tokens with batched `exists`/`ownerOf` calls.
+
+    Each JSON-RPC batch packs both calls of `batch_size` tokens, and up to
+    `workers` batches are sent concurrently. Calls failing for other reasons
+    than a revert, e.g. rate limits, are sent again with exponential
+    backoff.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    token_ids : list
+        List of token IDs as int.
+    batch_size : int, optional
+        The number of tokens per batch, by default 100.
+    workers : int, optional
+        The number of concurrent batches, by default 4.
+    block_identifier : str or int, optional
+        The block to read the state from, by default 'latest'.
+    progress : tqdm, optional
+        Progress bar updated with the size of each fetched batch.
+    retries : int, optional
+        The number of times calls failed by the node are sent again, by
+        default 3.
+
+    Returns
+    -------
+    owners : dict
+        The checksum owner address of each token, or None if the token does
+        not exist.
+
+    Raises
+    ------
+    RPCError
+        If a call reverts, or still fails after the retries.
+    """
+
+    batches = [
+        token_ids[start:start + batch_size]
+        for start in range(0, len(token_ids), batch_size)
+    ]
+
+    owners = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch_owners in pool.map(
+                lambda batch: _fetch_batch(
+                    w3, contract, batch, block_identifier, retries), batches):
+            owners.update(batch_owners)
+
+            if progress is not None:
+                progress.update(len(batch_owners))
+
+    return owners
+
+
+def fetch_statuses(w3,
+                   contract,
+                   token_ids,
+                   block_identifier='latest',
+                   retries=3):
+    """Fetch the existence, owner and URI of tokens in one batch.
+
+    Calls failing for other reasons than a revert are sent again with
+    exponential backoff.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    token_ids : list
+        List of token IDs as int.
+    block_identifier : str or int, optional
+        The block to read the state from, by default 'latest'.
+    retries : int, optional
+        The number of times calls failed by the node are sent again, by
+        default 3.
+
+    Returns
+    -------
+    statuses : dict
+        Dict with the `exists`, `owner` and `token_uri` fields of each token.
+        The owner and URI are None for tokens that do not exist.
+
+    Raises
+    ------
+    RPCError
+        If a call reverts, or still fails after the retries.
+    """
+
+    fn_names = ('exists', 'ownerOf', 'tokenURI')
+    results = batch_request(w3,
+                            _token_calls(contract, token_ids, fn_names,
+                                         block_identifier),
+                            retries=retries)
+
+    statuses = {}
+    for index, token_id in enumerate(token_ids):
+        exists, owner_of, token_uri = results[3 * index:3 * index + 3]
+
+        if isinstance(exists, RPCError):
+            raise exists
+
+        if not w3.codec.decode(['bool'], HexBytes(exists))[0]:
+            statuses[token_id] = {
+                'exists': False,
+                'owner': None,
+                'token_uri': None
+            }
+            continue
+
+        for result in (owner_of, token_uri):
+            if isinstance(result, RPCError):
+                raise result
+
+        owner = w3.codec.decode(['address'], HexBytes(owner_of))[0]
+        statuses[token_id] = {
+            'exists': True,
+            'owner': w3.to_checksum_address(owner),
+            'token_uri': w3.codec.decode(['string'], HexBytes(token_uri))[0],
+        }
+
+    return statuses
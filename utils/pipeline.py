@@ -0,0 +1,466 @@
+"""Streaming pipeline minting tokens from the token service to receipts."""
+
+import logging
+import queue
+import threading
+import time
+
+from hexbytes import HexBytes
+
+from utils.builder import get_transaction_builder
+from utils.consumer import consume_api
+from utils.receipts import ReceiptPoller
+from utils.rpc import to_int
+from utils.transaction import send_transaction
+from utils.transaction import speed_up_transaction
+
+# Marks the end of the items of a queue
+_DONE = object()
+
+
+class Stage:
+    """Workers of a pipeline stage and their statistics.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage.
+    workers : int
+        The number of worker threads.
+    queue_size : int
+        The maximum number of items waiting for the stage.
+    """
+
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = max(1, workers)
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self._running = self.workers
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok=True):
+        """Record an item handled by the stage.
+
+        Parameters
+        ----------
+        latency : float
+            Seconds spent on the item.
+        ok : bool, optional
+            Whether the item succeeded, by default True.
+        """
+
+        with self._lock:
+            self.busy += latency
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+    def finish_worker(self):
+        """Mark a worker as finished.
+
+        Returns
+        -------
+        last : bool
+            Whether it was the last running worker of the stage.
+        """
+
+        with self._lock:
+            self._running -= 1
+            return self._running == 0
+
+    def stats(self, elapsed):
+        """Return the statistics of the stage.
+
+        Parameters
+        ----------
+        elapsed : float
+            Seconds since the pipeline started.
+
+        Returns
+        -------
+        stats : dict
+            The workers, processed and failed items, mean latency in seconds,
+            throughput in items per second and waiting items.
+        """
+
+        with self._lock:
+            handled = self.processed + self.failed
+
+            return {
+                'workers': self.workers,
+                'processed': self.processed,
+                'failed': self.failed,
+                'mean_latency': self.busy / handled if handled else None,
+                'throughput': self.processed / elapsed if elapsed else 0.0,
+                'queued': self.inbox.qsize(),
+            }
+
+
+def request_signature(w3, address, token_id):
+    """Request the signature of a token from the signing API.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    address : str
+        The owner address.
+    token_id : int
+        The token ID.
+
+    Returns
+    -------
+    signature : bytes
+        The signature.
+    """
+
+    response = consume_api(address, hex(token_id))
+
+    if response is None:
+        raise ValueError('Signature request failed')
+
+    return w3.to_bytes(hexstr=response['signature'])
+
+
+class MintPipeline:
+    """Mint tokens through stages connected by bounded queues.
+
+    Each item flows through the stages fetch (token ID from the service),
+    signature (request to the signing API), build (contract call and gas
+    estimate), submit (transaction signed with a local nonce and sent) and
+    confirm (receipt polled in batches). Each stage runs its own worker
+    threads, and a full queue blocks the stage before it, so a slow stage
+    throttles the others instead of piling up work. At most `max_pending`
+    transactions wait for their receipt.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    private_key : str
+        The private key of the minting account.
+    address : str
+        The minting account address.
+    next_token_id : callable
+        Function returning a new token ID, e.g. `TokenIdBuffer.get`.
+    signature_fn : callable, optional
+        Function called with the web3 object, address and token ID returning
+        the signature, by default `request_signature`.
+    workers : dict, optional
+        The number of workers of each stage by name, by default 2 fetching,
+        8 requesting signatures, 4 building and 1 submitting transactions.
+    queue_size : int, optional
+        The maximum number of items waiting for each stage, by default 32.
+    max_pending : int, optional
+        The maximum number of transactions waiting for a receipt, by default
+        64.
+    poll_interval : float, optional
+        Seconds between receipt checks, by default 1.
+    replace_after : int, optional
+        Number of blocks after which a pending transaction is replaced with
+        higher fees, by default None (never).
+    timeout : float, optional
+        Seconds to wait for the receipt of a transaction, by default 120.
+    """
+
+    STAGES = ('fetch', 'signature', 'build', 'submit')
+
+    def __init__(self,
+                 w3,
+                 contract,
+                 private_key,
+                 address,
+                 next_token_id,
+                 signature_fn=request_signature,
+                 workers=None,
+                 queue_size=32,
+                 max_pending=64,
+                 poll_interval=1.0,
+                 replace_after=None,
+                 timeout=120):
+        self.w3 = w3
+        self.contract = contract
+        self.private_key = private_key
+        self.address = w3.to_checksum_address(address)
+        self.next_token_id = next_token_id
+        self.signature_fn = signature_fn
+        self.queue_size = queue_size
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.replace_after = replace_after
+        self.timeout = timeout
+        self.workers = {
+            'fetch': 2,
+            'signature': 8,
+            'build': 4,
+            'submit': 1,
+            **(workers or {}),
+        }
+        self.stages = {}
+        self.confirm = None
+        self.results = []
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._send_lock = threading.Lock()
+        self._poller = None
+        self._started_at = None
+
+    def _fetch(self, item):
+        token_id = self.next_token_id()
+
+        if token_id is None:
+            raise ValueError('No token ID from the service')
+
+        item['token_id'] = token_id
+
+    def _signature(self, item):
+        item['signature'] = self.signature_fn(self.w3, self.address,
+                                              item['token_id'])
+
+    def _build(self, item):
+        contract_function = self.contract.functions.verifyAndMint(
+            item['signature'], item['token_id'])
+
+        # The gas estimate also catches mints that would revert
+        item['call'] = contract_function
+        item['gas'] = get_transaction_builder(self.w3).gas_limit(
+            contract_function, self.address)
+
+    def _submit(self, item):
+        # Backpressure from the transactions waiting for a receipt
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._in_flight < self.max_pending)
+            self._in_flight += 1
+
+        # The nonce is taken right before sending, so nonces resynced after
+        # a failed send are not held by transactions waiting in a queue, and
+        # sends are serialized so the nonces reach the node in order
+        try:
+            with self._send_lock:
+                txn_hash = send_transaction(self.w3, item['call'],
+                                            self.private_key, self.address,
+                                            {'gas': item['gas']})
+        except Exception:
+            self._released()
+            raise
+
+        item['txn_hash'] = txn_hash.hex()
+        item['sent_at'] = time.monotonic()
+
+        self._poller.track(
+            txn_hash,
+            callback=lambda future, item=item: self._confirmed(item, future),
+            sender=self.address,
+            replace=lambda h: speed_up_transaction(self.w3, h, self.private_key
+                                                   ))
+
+    def _released(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _confirmed(self, item, future):
+        latency = time.monotonic() - item['sent_at']
+
+        try:
+            if future.exception() is not None:
+                item['status'] = 'error'
+                item['error'] = str(future.exception())
+            else:
+                receipt = future.result()
+                # The receipt has the hash of the replacement, if any was
+                # mined
+                item['txn_hash'] = HexBytes(receipt['transactionHash']).hex()
+                item['status'] = ('success' if to_int(receipt['status']) == 1
+                                  else 'failed')
+
+            self.confirm.record(latency, item['status'] == 'success')
+        finally:
+            self._released()
+            self._finish(item)
+
+    def _finish(self, item):
+        result = {
+            key: item.get(key)
+            for key in ('index', 'token_id', 'txn_hash', 'status', 'stage',
+                        'error')
+        }
+
+        with self._condition:
+            self.results.append(result)
+            self._condition.notify_all()
+
+    def _work(self, stage, handler, next_stage):
+        logger = logging.getLogger('minter')
+
+        while True:
+            item = stage.inbox.get()
+
+            if item is _DONE:
+                break
+
+            start = time.monotonic()
+            try:
+                handler(item)
+            except Exception as exc:  # pylint: disable=broad-except
+                stage.record(time.monotonic() - start, ok=False)
+                logger.warning(f"Mint pipeline item {item['index']} failed "
+                               f"in the {stage.name} stage: {exc}")
+                item.update(status='error', stage=stage.name, error=str(exc))
+                self._finish(item)
+                continue
+
+            stage.record(time.monotonic() - start)
+
+            if next_stage is not None:
+                next_stage.inbox.put(item)
+
+        # The last worker closes the queue of the next stage
+        if stage.finish_worker() and next_stage is not None:
+            for _ in range(next_stage.workers):
+                next_stage.inbox.put(_DONE)
+
+    def run(self, count):
+        """Mint a number of tokens and wait for their receipts.
+
+        Parameters
+        ----------
+        count : int
+            The number of tokens to mint.
+
+        Returns
+        -------
+        results : list
+            The `index`, `token_id`, `txn_hash` and `status` of each item,
+            ordered by index. The status is 'success' or 'failed' once mined,
+            or 'error' with the failed `stage` and the `error` message.
+        """
+
+        self.stages = {
+            name: Stage(name, self.workers[name], self.queue_size)
+            for name in self.STAGES
+        }
+        self.confirm = Stage('confirm', 1, 0)
+        self.results = []
+        self._in_flight = 0
+        self._started_at = time.monotonic()
+
+        handlers = {
+            'fetch': self._fetch,
+            'signature': self._signature,
+            'build': self._build,
+            'submit': self._submit,
+        }
+
+        with ReceiptPoller(self.w3,
+                           poll_interval=self.poll_interval,
+                           timeout=self.timeout,
+                           replace_after=self.replace_after) as poller:
+            self._poller = poller
+
+            threads = []
+            for position, name in enumerate(self.STAGES):
+                next_name = self.STAGES[position + 1] if position + 1 < len(
+                    self.STAGES) else None
+                stage = self.stages[name]
+
+                for number in range(stage.workers):
+                    thread = threading.Thread(
+                        target=self._work,
+                        args=(stage, handlers[name],
+                              self.stages.get(next_name)),
+                        name=f'mint-{name}-{number}',
+                        daemon=True)
+                    thread.start()
+                    threads.append(thread)
+
+            fetch = self.stages['fetch']
+            for index in range(count):
+                fetch.inbox.put({'index': index})
+            for _ in range(fetch.workers):
+                fetch.inbox.put(_DONE)
+
+            for thread in threads:
+                thread.join()
+
+            # Every item finishes, failed in a stage, mined or timed out
+            with self._condition:
+                self._condition.wait_for(lambda: len(self.results) >= count)
+
+        self._poller = None
+
+        return sorted(self.results, key=lambda result: result['index'])
+
+    def stats(self):
+        """Return the statistics of each stage.
+
+        Returns
+        -------
+        stats : dict
+            The statistics of the fetch, signature, build, submit and
+            confirm stages. The latency of confirm is the time from sending
+            a transaction to getting its receipt.
+        """
+
+        if self._started_at is None:
+            return {}
+
+        elapsed = time.monotonic() - self._started_at
+        stages = {**self.stages, 'confirm': self.confirm}
+
+        return {name: stage.stats(elapsed) for name, stage in stages.items()}
+
+
+def create_mint_pipeline(config, w3, contract, next_token_id):
+    """Create a mint pipeline from the `[pipeline]` config section.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    next_token_id : callable
+        Function returning a new token ID.
+
+    Returns
+    -------
+    pipeline : MintPipeline
+        The mint pipeline.
+    """
+
+    workers = {
+        name: config.getint('pipeline', f'{name}_workers', fallback=default)
+        for name, default in (('fetch', 2), ('signature', 8), ('build', 4),
+                              ('submit', 1))
+    }
+    replace_after = config.getint('pipeline', 'replace_after', fallback=0)
+
+    return MintPipeline(w3,
+                        contract,
+                        config['account']['private_key'],
+                        config['account']['address'],
+                        next_token_id,
+                        workers=workers,
+                        queue_size=config.getint('pipeline',
+                                                 'queue_size',
+                                                 fallback=32),
+                        max_pending=config.getint('pipeline',
+                                                  'max_pending',
+                                                  fallback=64),
+                        poll_interval=config.getfloat('pipeline',
+                                                      'poll_interval',
+                                                      fallback=1.0),
+                        replace_after=replace_after or None,
+                        timeout=config.getfloat('pipeline',
+                                                'receipt_timeout',
+                                                fallback=120))
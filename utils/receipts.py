@@ -0,0 +1,314 @@
+"""Receipt tracking for transactions sent without waiting."""
+
+import logging
+import threading
+import time
+
+from concurrent.futures import Future
+
+from hexbytes import HexBytes
+from web3.exceptions import TimeExhausted
+
+from utils.nonce import get_nonce_manager
+from utils.rpc import RPCError
+from utils.rpc import batch_request
+from utils.rpc import to_int
+
+
+class ReceiptPoller:
+    """Poll the receipts of many pending transactions together.
+
+    A background thread checks the block number every `poll_interval`
+    seconds. When a new block arrives, the receipts of all the pending
+    transactions are requested in JSON-RPC batches and the futures of the
+    mined ones are resolved.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    poll_interval : float, optional
+        Seconds between block number checks, by default 1.
+    batch_size : int, optional
+        Maximum number of receipts requested per batch, by default 100.
+    timeout : float, optional
+        Seconds after which a pending transaction fails with `TimeExhausted`
+        and the nonce of its sender is resynced, by default 120. None waits
+        forever.
+    replace_after : int, optional
+        Number of blocks after which a pending transaction tracked with a
+        `replace` function is replaced, by default None (never). 0 also
+        disables replacements.
+    """
+
+    def __init__(self,
+                 w3,
+                 poll_interval=1.0,
+                 batch_size=100,
+                 timeout=120,
+                 replace_after=None):
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.replace_after = replace_after
+        self.records = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_block = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Start the polling thread."""
+
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name='receipt-poller',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the polling thread."""
+
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def track(self, txn_hash, callback=None, sender=None, replace=None):
+        """Track a sent transaction until it is mined.
+
+        A transaction still pending `replace_after` blocks after it was first
+        seen pending is replaced by calling `replace`. Both the original and
+        the replacement are then tracked, and the future is resolved by the
+        first one mined.
+
+        Parameters
+        ----------
+        txn_hash : str or bytes
+            The transaction hash.
+        callback : callable, optional
+            Function called with the future once the transaction is mined.
+        sender : str, optional
+            The sender address, resynced in the nonce manager if the
+            transaction times out.
+        replace : callable, optional
+            Function called with the hash of the stuck transaction, sending a
+            replacement with the same nonce and returning its hash.
+
+        Returns
+        -------
+        future : Future
+            A future resolved with the raw transaction receipt.
+        """
+
+        txn_hash = HexBytes(txn_hash).hex()
+        future = Future()
+
+        if callback is not None:
+            future.add_done_callback(callback)
+
+        with self._lock:
+            self.records[txn_hash] = {
+                'status': 'pending',
+                'submitted_at': time.time(),
+                'mined_at': None,
+                'elapsed': None,
+                'block_number': None,
+                'sender': sender,
+                'sent_block': None,
+                'replace': replace,
+            }
+            self._pending[txn_hash] = future
+
+        return future
+
+    def pending(self):
+        """Return the number of transactions still pending.
+
+        Returns
+        -------
+        pending : int
+            The number of pending transactions.
+        """
+
+        with self._lock:
+            # Replaced transactions share the future of their replacement
+            return len({id(future) for future in self._pending.values()})
+
+    def stats(self):
+        """Return the number of transactions per status.
+
+        Returns
+        -------
+        stats : dict
+            Count of transactions per status and mean time to be mined.
+        """
+
+        with self._lock:
+            records = list(self.records.values())
+
+        stats = {}
+        for record in records:
+            stats[record['status']] = stats.get(record['status'], 0) + 1
+
+        elapsed = [r['elapsed'] for r in records if r['elapsed'] is not None]
+        stats['mean_elapsed'] = None
+        if elapsed:
+            stats['mean_elapsed'] = sum(elapsed) / len(elapsed)
+
+        return stats
+
+    def _run(self):
+        logger = logging.getLogger('minter')
+
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning(f'Receipt polling failed: {exc}')
+
+    def poll(self):
+        """Check the receipts of the pending transactions once.
+
+        Receipts are only requested when a new block has been mined since the
+        previous check.
+        """
+
+        with self._lock:
+            hashes = list(self._pending)
+
+        if not hashes:
+            return
+
+        block_number = self.w3.eth.block_number
+        if block_number == self._last_block:
+            self._expire(hashes)
+            return
+
+        self._last_block = block_number
+
+        for start in range(0, len(hashes), self.batch_size):
+            chunk = hashes[start:start + self.batch_size]
+            receipts = batch_request(
+                self.w3,
+                [('eth_getTransactionReceipt', [txn_hash])
+                 for txn_hash in chunk])
+
+            for txn_hash, receipt in zip(chunk, receipts):
+                if receipt is None or isinstance(receipt, RPCError):
+                    continue
+
+                self._resolve(txn_hash, receipt)
+
+        if self.replace_after:
+            self._replace_stuck(block_number)
+
+        self._expire(hashes)
+
+    def _resolve(self, txn_hash, receipt):
+        logger = logging.getLogger('minter')
+
+        mined_at = time.time()
+
+        with self._lock:
+            future = self._pending.pop(txn_hash, None)
+            record = self.records[txn_hash]
+
+            # The other transactions with the same nonce will not be mined
+            for other_hash, other_future in list(self._pending.items()):
+                if other_future is future:
+                    del self._pending[other_hash]
+                    self.records[other_hash]['status'] = 'replaced'
+            record['status'] = 'success' if to_int(
+                receipt['status']) == 1 else 'failed'
+            record['mined_at'] = mined_at
+            record['elapsed'] = mined_at - record['submitted_at']
+            record['block_number'] = to_int(receipt['blockNumber'])
+
+        logger.info(f"TXN with hash: { txn_hash } {record['status']} in "
+                    f"block {record['block_number']}")
+
+        if future is not None and not future.done():
+            future.set_result(receipt)
+
+    def _replace_stuck(self, block_number):
+        logger = logging.getLogger('minter')
+
+        stuck = []
+        with self._lock:
+            for txn_hash, future in self._pending.items():
+                record = self.records[txn_hash]
+
+                if record['replace'] is None:
+                    continue
+
+                if record['sent_block'] is None:
+                    record['sent_block'] = block_number
+                elif block_number - record['sent_block'] >= self.replace_after:
+                    stuck.append((txn_hash, future, record))
+
+        for txn_hash, future, record in stuck:
+            try:
+                new_hash = HexBytes(record['replace'](txn_hash)).hex()
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning(f'Replacing TXN {txn_hash} failed: {exc}')
+                record['sent_block'] = block_number
+                continue
+
+            with self._lock:
+                if future.done():
+                    continue
+
+                # Only the newest transaction is replaced again
+                self.records[new_hash] = {
+                    **record,
+                    'sent_block': block_number,
+                }
+                record['replace'] = None
+                self._pending[new_hash] = future
+
+    def _expire(self, hashes):
+        if self.timeout is None:
+            return
+
+        now = time.time()
+
+        for txn_hash in hashes:
+            with self._lock:
+                record = self.records[txn_hash]
+
+                if txn_hash not in self._pending:
+                    continue
+
+                if now - record['submitted_at'] < self.timeout:
+                    continue
+
+                future = self._pending.pop(txn_hash, None)
+                record['status'] = 'timeout'
+
+                # Its replacements expire with it, they share the deadline
+                for other_hash, other_future in list(self._pending.items()):
+                    if other_future is future:
+                        del self._pending[other_hash]
+                        self.records[other_hash]['status'] = 'timeout'
+
+            # The transaction was probably dropped
+            if record['sender'] is not None:
+                get_nonce_manager(self.w3).resync(
+                    self.w3.to_checksum_address(record['sender']))
+
+            if future is not None and not future.done():
+                future.set_exception(
+                    TimeExhausted(f'Transaction {txn_hash} is not in the '
+                                  f'chain after {self.timeout} seconds'))
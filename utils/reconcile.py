@@ -0,0 +1,77 @@
+"""Reconciliation of the desired owners of tokens with the chain state."""
+
+# Actions of a reconciliation plan
+MINT = 'mint'
+TRANSFER = 'transfer'
+OK = 'ok'
+
+
+def plan_reconciliation(token_ids, desired_owners, current_owners):
+    """Plan the actions that bring tokens to their desired owners.
+
+    Tokens that do not exist are minted, tokens owned by another account are
+    transferred and the rest are left as they are. Addresses are compared
+    regardless of their case.
+
+    Parameters
+    ----------
+    token_ids : list
+        List of token IDs as int.
+    desired_owners : list
+        The desired owner of each token.
+    current_owners : dict
+        The current owner of each token, or None if it does not exist, e.g.
+        from `fetch_owners` or `OwnershipIndex.owners_of`.
+
+    Returns
+    -------
+    plan : dict
+        The `mint` list of `(token_id, owner)` tuples, the `transfer` list of
+        `(token_id, current_owner, owner)` tuples and the `ok` list of token
+        IDs.
+    """
+
+    plan = {MINT: [], TRANSFER: [], OK: []}
+
+    for token_id, owner in zip(token_ids, desired_owners):
+        current_owner = current_owners.get(token_id)
+
+        if current_owner is None:
+            plan[MINT].append((token_id, owner))
+        elif current_owner.lower() == owner.lower():
+            plan[OK].append(token_id)
+        else:
+            plan[TRANSFER].append((token_id, current_owner, owner))
+
+    return plan
+
+
+def plan_to_json(plan):
+    """Convert a reconciliation plan to JSON serializable data.
+
+    Parameters
+    ----------
+    plan : dict
+        The plan from `plan_reconciliation`.
+
+    Returns
+    -------
+    data : dict
+        The plan with hex token IDs, and a `summary` with the number of
+        tokens per action.
+    """
+
+    return {
+        'summary': {action: len(items)
+                    for action, items in plan.items()},
+        MINT: [{
+            'token': hex(token_id),
+            'owner': owner
+        } for token_id, owner in plan[MINT]],
+        TRANSFER: [{
+            'token': hex(token_id),
+            'from': current_owner,
+            'to': owner
+        } for token_id, current_owner, owner in plan[TRANSFER]],
+        OK: [hex(token_id) for token_id in plan[OK]],
+    }
@@ -0,0 +1,264 @@
+"""Utility functions for raw JSON-RPC requests."""
+
+import threading
+import time
+
+import requests
+
+# HTTP sessions shared by all batches sent to the same endpoint
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Fragments of provider errors caused by too many logs or a too wide range
+LOG_LIMIT_ERRORS = (
+    'query returned more than',
+    'query exceeds max results',
+    'response size exceeded',
+    'maximum block range',
+    'block range is too wide',
+    'block range too large',
+    'block range limit',
+    'eth_getlogs is limited',
+    'too many blocks',
+    'query timeout exceeded',
+)
+
+
+class RPCError(Exception):
+    """Error returned by the node for a single JSON-RPC call."""
+
+    def __init__(self, error):
+        super().__init__(error.get('message', error))
+        self.error = error
+
+    @property
+    def reverted(self):
+        """Whether the call was reverted by the EVM, not failed by the node."""
+
+        return (self.error.get('code') == 3
+                or 'execution reverted' in str(self).lower())
+
+
+class EndpointError(Exception):
+    """Error of an endpoint that should fail over to the next one."""
+
+
+def is_log_limit_error(exc):
+    """Return whether an error was caused by requesting too many logs.
+
+    Parameters
+    ----------
+    exc : Exception or dict
+        The exception, or the JSON-RPC error object.
+
+    Returns
+    -------
+    is_log_limit_error : bool
+        Whether the request should be retried over a smaller block range.
+    """
+
+    # Requests timing out usually read too many logs
+    if isinstance(exc, requests.Timeout) or isinstance(
+            getattr(exc, '__cause__', None), requests.Timeout):
+        return True
+
+    if isinstance(exc, dict):
+        exc = exc.get('message', '')
+
+    message = str(exc).lower()
+
+    return any(fragment in message for fragment in LOG_LIMIT_ERRORS)
+
+
+def _get_session(endpoint_uri):
+    with _sessions_lock:
+        session = _sessions.get(endpoint_uri)
+
+        if session is None:
+            session = requests.Session()
+            _sessions[endpoint_uri] = session
+
+        return session
+
+
+def batch_request(w3, calls, timeout=30, retries=0):
+    """Send many JSON-RPC calls in a single batch request.
+
+    HTTP providers receive one JSON-RPC batch, and providers with a
+    `send_batch` method, like the pooled provider, send it themselves. Other
+    providers, without an endpoint URI, get the calls one after another
+    through web3, so their results are already formatted. Calls served by
+    the block cache installed on the web3 object are not sent.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    calls : list
+        List of `(method, params)` tuples.
+    timeout : float, optional
+        The HTTP timeout in seconds, by default 30.
+    retries : int, optional
+        The number of times calls failed by the node, e.g. by rate limits or
+        missing block headers, are sent again with exponential backoff, by
+        default 0. Reverted calls are not retried.
+
+    Returns
+    -------
+    results : list
+        The raw result of each call, in the same order, or an `RPCError`
+        instance for the calls that failed.
+    """
+
+    results = _batch_request(w3, calls, timeout)
+
+    for attempt in range(retries):
+        pending = [
+            index for index, result in enumerate(results)
+            if isinstance(result, RPCError) and not result.reverted
+        ]
+
+        if not pending:
+            break
+
+        time.sleep(0.5 * 2**attempt)
+
+        retried = _batch_request(w3, [calls[index] for index in pending],
+                                 timeout)
+        for index, result in zip(pending, retried):
+            results[index] = result
+
+    return results
+
+
+def _batch_request(w3, calls, timeout):
+    if not calls:
+        return []
+
+    provider = w3.provider
+    endpoint_uri = getattr(provider, 'endpoint_uri', None)
+    send_batch = getattr(provider, 'send_batch', None)
+
+    if endpoint_uri is None and send_batch is None:
+        results = []
+        for method, params in calls:
+            # Failed calls are returned, like in a batch, instead of raised
+            try:
+                results.append(w3.manager.request_blocking(method, params))
+            except Exception as exc:  # pylint: disable=broad-except
+                error = exc.args[0] if exc.args else {}
+                if not isinstance(error, dict):
+                    error = {'message': str(exc)}
+                results.append(RPCError(error))
+
+        return results
+
+    # Imported here, the cache module depends on this one
+    from utils.rpc_cache import get_block_cache
+
+    cache = get_block_cache(w3)
+    if cache is None:
+        return _send_batch(provider, calls, timeout)
+
+    # Serve the cached calls and send the rest
+    results = [None] * len(calls)
+    keys, misses = {}, []
+    for index, (method, params) in enumerate(calls):
+        key = cache.key(method, params, lambda: w3.eth.block_number)
+        found, response = cache.get(key) if key else (False, None)
+
+        if found:
+            results[index] = response['result']
+            continue
+
+        keys[index] = key
+        misses.append(index)
+
+    if not misses:
+        return results
+
+    sent = _send_batch(provider, [calls[index] for index in misses], timeout)
+    for index, result in zip(misses, sent):
+        results[index] = result
+
+        if keys[index] and result is not None and not isinstance(
+                result, RPCError):
+            cache.put(keys[index], {'result': result})
+
+    return results
+
+
+def _send_batch(provider, calls, timeout):
+    payload = [{
+        'jsonrpc': '2.0',
+        'id': index,
+        'method': method,
+        'params': params,
+    } for index, (method, params) in enumerate(calls)]
+
+    send_batch = getattr(provider, 'send_batch', None)
+    if send_batch is not None:
+        return parse_batch_response(send_batch(payload), len(calls))
+
+    endpoint_uri = provider.endpoint_uri
+    response = _get_session(endpoint_uri).post(endpoint_uri,
+                                               json=payload,
+                                               timeout=timeout)
+    response.raise_for_status()
+
+    return parse_batch_response(response.json(), len(calls))
+
+
+def parse_batch_response(responses, size):
+    """Order the responses of a JSON-RPC batch by request id.
+
+    Parameters
+    ----------
+    responses : list or dict
+        The decoded JSON body of the batch response.
+    size : int
+        The number of calls in the batch.
+
+    Returns
+    -------
+    results : list
+        The raw result of each call, or an `RPCError` for failed calls.
+    """
+
+    # Some nodes answer a whole batch with a single error object
+    if isinstance(responses, dict):
+        return [RPCError(responses.get('error', responses))] * size
+
+    results = [RPCError({'message': 'Missing response'})] * size
+    for response in responses:
+        index = response.get('id')
+
+        if not isinstance(index, int) or not 0 <= index < size:
+            continue
+
+        if 'error' in response:
+            results[index] = RPCError(response['error'])
+        else:
+            results[index] = response.get('result')
+
+    return results
+
+
+def to_int(value):
+    """Convert a JSON-RPC quantity to int.
+
+    Parameters
+    ----------
+    value : str or int
+        A hex encoded quantity or an int.
+
+    Returns
+    -------
+    value : int
+        The quantity as int.
+    """
+
+    if isinstance(value, str):
+        return int(value, 16)
+
+    return value
@@ -0,0 +1,345 @@
+"""Block-aware cache of JSON-RPC responses for contract reads."""
+
+import json
+import threading
+import time
+
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+
+from utils.rpc import to_int
+
+# Methods whose result never changes
+IMMUTABLE_METHODS = {'eth_chainId', 'net_version'}
+
+# Methods reading the state at a block, with the index of the block parameter
+BLOCK_METHODS = {
+    'eth_call': 1,
+    'eth_getBalance': 1,
+    'eth_getCode': 1,
+    'eth_getStorageAt': 2,
+}
+
+# Block tags that follow the chain head
+HEAD_TAGS = {'latest', 'safe', 'finalized'}
+
+# Caches installed on each web3 object
+_caches = WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def _encode(method, params):
+    return json.dumps([method, params],
+                      sort_keys=True,
+                      default=lambda o: '0x' + bytes(o).hex()
+                      if isinstance(o, bytes) else str(o))
+
+
+class BlockCache:
+    """LRU cache of JSON-RPC responses invalidated by new blocks.
+
+    Results of immutable requests, like the chain id or calls at a fixed
+    block number, are kept until evicted. Calls at the latest block are kept
+    until a new block arrives. The current block number is requested at most
+    once every `block_interval` seconds.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        The maximum number of responses of each kind, by default 10000.
+    block_interval : float, optional
+        Seconds between checks of the current block number, by default 1.
+    """
+
+    def __init__(self, maxsize=10000, block_interval=1.0):
+        self.maxsize = maxsize
+        self.block_interval = block_interval
+        self.block = None
+        self.hits = 0
+        self.misses = 0
+        self._checked_at = 0.0
+        self._immutable = OrderedDict()
+        self._latest = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_block(self, block):
+        """Set the current block number, dropping the outdated responses.
+
+        Parameters
+        ----------
+        block : int
+            The current block number.
+        """
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+
+            if block != self.block:
+                self.block = block
+                self._latest.clear()
+
+    def block_number(self, fetch_block):
+        """Return the current block number.
+
+        Parameters
+        ----------
+        fetch_block : callable
+            Function requesting the block number, called at most once every
+            `block_interval` seconds.
+
+        Returns
+        -------
+        block : int
+            The current block number.
+        """
+
+        with self._lock:
+            fresh = time.monotonic() - self._checked_at < self.block_interval
+
+            if fresh and self.block is not None:
+                return self.block
+
+        self.set_block(fetch_block())
+
+        return self.block
+
+    def key(self, method, params, fetch_block):
+        """Return the cache key of a request.
+
+        Parameters
+        ----------
+        method : str
+            The JSON-RPC method.
+        params : list
+            The JSON-RPC parameters.
+        fetch_block : callable
+            Function requesting the block number.
+
+        Returns
+        -------
+        key : tuple or None
+            The key, with the block number for requests at the latest block,
+            or None if the request can not be cached.
+        """
+
+        if self.maxsize <= 0:
+            return None
+
+        if method in IMMUTABLE_METHODS:
+            return None, _encode(method, params)
+
+        index = BLOCK_METHODS.get(method)
+        if index is None:
+            return None
+
+        block = params[index] if len(params) > index else 'latest'
+        if block == 'pending':
+            return None
+
+        if isinstance(block, str) and block in HEAD_TAGS:
+            return self.block_number(fetch_block), _encode(method, params)
+
+        return None, _encode(method, params)
+
+    def get(self, key):
+        """Look up a response.
+
+        Parameters
+        ----------
+        key : tuple
+            The key returned by `key`.
+
+        Returns
+        -------
+        found : bool
+            Whether the response was cached.
+        response
+            The cached response, or None.
+        """
+
+        store = self._immutable if key[0] is None else self._latest
+
+        with self._lock:
+            if key[0] is None or key[0] == self.block:
+                response = store.get(key[1])
+
+                if response is not None:
+                    store.move_to_end(key[1])
+                    self.hits += 1
+                    return True, response
+
+            self.misses += 1
+
+        return False, None
+
+    def put(self, key, response):
+        """Store a response.
+
+        Parameters
+        ----------
+        key : tuple
+            The key returned by `key`.
+        response
+            The response.
+        """
+
+        store = self._immutable if key[0] is None else self._latest
+
+        with self._lock:
+            # The block changed while the request was in flight
+            if key[0] is not None and key[0] != self.block:
+                return
+
+            store[key[1]] = response
+            store.move_to_end(key[1])
+
+            if len(store) > self.maxsize:
+                store.popitem(last=False)
+
+    def stats(self):
+        """Return the usage statistics of the cache.
+
+        Returns
+        -------
+        stats : dict
+            The block, sizes, hits, misses and hit rate.
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                'block': self.block,
+                'immutable': len(self._immutable),
+                'latest': len(self._latest),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def construct_block_cache_middleware(cache):
+    """Create a web3 middleware serving cacheable requests from a cache.
+
+    Parameters
+    ----------
+    cache : BlockCache
+        The cache of the responses.
+
+    Returns
+    -------
+    middleware
+        The web3 middleware.
+    """
+
+    def middleware(make_request, w3):  # pylint: disable=unused-argument
+
+        def fetch_block():
+            response = make_request('eth_blockNumber', [])
+
+            if 'error' in response:
+                raise ValueError(response['error'])
+
+            return to_int(response['result'])
+
+        def cached_request(method, params):
+            key = cache.key(method, params, fetch_block)
+
+            if key is None:
+                response = make_request(method, params)
+
+                if method == 'eth_blockNumber' and 'result' in response:
+                    cache.set_block(to_int(response['result']))
+
+                return response
+
+            found, response = cache.get(key)
+            if found:
+                return response
+
+            response = make_request(method, params)
+            if 'error' not in response and response.get('result') is not None:
+                cache.put(key, response)
+
+            return response
+
+        return cached_request
+
+    return middleware
+
+
+def install_block_cache(w3, maxsize=10000, block_interval=1.0):
+    """Cache the immutable and latest block reads of a web3 object.
+
+    The cache is also used by `utils.rpc.batch_request`.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    maxsize : int, optional
+        The maximum number of responses of each kind, by default 10000.
+    block_interval : float, optional
+        Seconds between checks of the current block number, by default 1.
+
+    Returns
+    -------
+    cache : BlockCache
+        The installed cache.
+    """
+
+    with _caches_lock:
+        cache = _caches.get(w3)
+
+        if cache is None:
+            cache = BlockCache(maxsize, block_interval)
+            w3.middleware_onion.add(construct_block_cache_middleware(cache),
+                                    name='block_cache')
+            _caches[w3] = cache
+
+    return cache
+
+
+def get_block_cache(w3):
+    """Return the cache installed on a web3 object.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+
+    Returns
+    -------
+    cache : BlockCache or None
+        The cache, or None if none is installed.
+    """
+
+    with _caches_lock:
+        return _caches.get(w3)
+
+
+def create_block_cache(w3, config):
+    """Install the RPC response cache configured in the `[rpc_cache]` section.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    config : ConfigParser
+        The configuration object.
+
+    Returns
+    -------
+    cache : BlockCache or None
+        The installed cache, or None if it is disabled.
+    """
+
+    maxsize = config.getint('rpc_cache', 'size', fallback=10000)
+    block_interval = config.getfloat('rpc_cache',
+                                     'block_interval',
+                                     fallback=1.0)
+
+    if maxsize <= 0:
+        return None
+
+    return install_block_cache(w3, maxsize, block_interval)
@@ -0,0 +1,322 @@
+"""Multi-endpoint RPC provider with latency-based routing and failover."""
+
+import logging
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+import requests
+
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+from utils.rpc import EndpointError
+from utils.rpc import is_log_limit_error
+
+# Methods without side effects, which can be hedged on a second endpoint
+READ_METHODS = {
+    'eth_blockNumber',
+    'eth_call',
+    'eth_chainId',
+    'eth_estimateGas',
+    'eth_feeHistory',
+    'eth_gasPrice',
+    'eth_getBalance',
+    'eth_getBlockByHash',
+    'eth_getBlockByNumber',
+    'eth_getCode',
+    'eth_getLogs',
+    'eth_getTransactionByHash',
+    'eth_getTransactionCount',
+    'eth_getTransactionReceipt',
+    'eth_maxPriorityFeePerGas',
+    'net_version',
+    'web3_clientVersion',
+}
+
+# JSON-RPC error codes of rate-limited or overloaded endpoints
+RETRYABLE_CODES = {429, -32005, -32603}
+
+
+def _is_endpoint_failure(error):
+    if error.get('code') not in RETRYABLE_CODES:
+        return False
+
+    # Infura also answers -32005 to log queries over its result limit, which
+    # every endpoint rejects, so the caller has to narrow the query instead
+    return not is_log_limit_error(error)
+
+
+class Endpoint:
+    """Health and latency statistics of one RPC endpoint.
+
+    Parameters
+    ----------
+    url : str
+        The RPC URL.
+    alpha : float, optional
+        The weight of new samples in the moving averages, by default 0.2.
+    """
+
+    def __init__(self, url, alpha=0.2, request_kwargs=None):
+        self.url = url
+        self.alpha = alpha
+        self.provider = Web3.HTTPProvider(url, request_kwargs=request_kwargs)
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def record(self, latency=None, error=False, cooldown=30):
+        """Record the outcome of a request.
+
+        Parameters
+        ----------
+        latency : float, optional
+            The latency of a successful request in seconds.
+        error : bool, optional
+            Whether the request failed, by default False.
+        cooldown : float, optional
+            Seconds an endpoint is skipped after 3 consecutive failures, by
+            default 30.
+        """
+
+        with self._lock:
+            self.requests += 1
+            self.error_rate += self.alpha * (float(error) - self.error_rate)
+
+            if error:
+                self.failures += 1
+                if self.failures >= 3:
+                    self.down_until = time.monotonic() + cooldown
+                return
+
+            self.failures = 0
+            self.latencies.append(latency)
+
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.alpha * (latency - self.latency)
+
+    def healthy(self):
+        """Return whether the endpoint is not cooling down after failures."""
+
+        return time.monotonic() >= self.down_until
+
+    def score(self):
+        """Return the routing score, lower is better.
+
+        Endpoints without samples get a score of 0, so they are tried first.
+        """
+
+        if self.latency is None:
+            return 0.0
+
+        return self.latency * (1 + 10 * self.error_rate)
+
+    def p95(self):
+        """Return the 95th percentile latency, or None without samples."""
+
+        with self._lock:
+            latencies = sorted(self.latencies)
+
+        if len(latencies) < 20:
+            return None
+
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    def stats(self):
+        """Return the statistics of the endpoint."""
+
+        return {
+            'url': self.url,
+            'healthy': self.healthy(),
+            'latency': self.latency,
+            'p95': self.p95(),
+            'error_rate': self.error_rate,
+            'requests': self.requests,
+        }
+
+
+class PooledHTTPProvider(JSONBaseProvider):
+    """Web3 provider routing each request to the best of many endpoints.
+
+    Requests go to the healthy endpoint with the lowest EWMA latency,
+    weighted by its error rate. Connection errors, HTTP errors and rate
+    limit errors fail over to the next endpoint, and are raised as
+    `EndpointError` once every endpoint failed. Errors of the request
+    itself, like a log query over the result limit, are returned as usual.
+    Read-only requests can be hedged: when the first endpoint is slower than
+    its p95 latency, a duplicate is sent to the second one and the first
+    answer wins.
+
+    Parameters
+    ----------
+    urls : list
+        The RPC URLs.
+    hedge : bool, optional
+        Hedge read-only requests, by default False.
+    alpha : float, optional
+        The weight of new samples in the moving averages, by default 0.2.
+    cooldown : float, optional
+        Seconds an endpoint is skipped after 3 consecutive failures, by
+        default 30.
+    request_kwargs : dict, optional
+        Keyword arguments of the HTTP requests, e.g. the timeout.
+    """
+
+    def __init__(self,
+                 urls,
+                 hedge=False,
+                 alpha=0.2,
+                 cooldown=30,
+                 request_kwargs=None):
+        super().__init__()
+
+        if not urls:
+            raise ValueError('At least one RPC endpoint is required')
+
+        self.endpoints = [Endpoint(url, alpha, request_kwargs) for url in urls]
+        self.hedge = hedge
+        self.cooldown = cooldown
+        self.request_kwargs = request_kwargs or {'timeout': 30}
+        self._pool = ThreadPoolExecutor(max_workers=2 * len(urls),
+                                        thread_name_prefix='rpc-hedge')
+        self._session = requests.Session()
+
+    def __str__(self):
+        return f"Pooled RPC connection {[e.url for e in self.endpoints]}"
+
+    def ranked(self):
+        """Return the endpoints ordered by routing preference.
+
+        Returns
+        -------
+        endpoints : list
+            Healthy endpoints by score, then endpoints cooling down.
+        """
+
+        healthy = [e for e in self.endpoints if e.healthy()]
+        down = [e for e in self.endpoints if not e.healthy()]
+
+        return sorted(healthy, key=Endpoint.score) + down
+
+    def stats(self):
+        """Return the statistics of every endpoint."""
+
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+    def _call(self, endpoint, method, params):
+        start = time.monotonic()
+
+        try:
+            response = endpoint.provider.make_request(method, params)
+        except requests.RequestException as exc:
+            endpoint.record(error=True, cooldown=self.cooldown)
+            raise EndpointError(f'{endpoint.url}: {exc}') from exc
+
+        error = response.get('error')
+        if isinstance(error, dict) and _is_endpoint_failure(error):
+            endpoint.record(error=True, cooldown=self.cooldown)
+            raise EndpointError(f"{endpoint.url}: {error.get('message')}")
+
+        endpoint.record(latency=time.monotonic() - start)
+
+        return response
+
+    def _failover(self, endpoints, method, params):
+        logger = logging.getLogger('minter')
+
+        last_exc = None
+        for endpoint in endpoints:
+            try:
+                return self._call(endpoint, method, params)
+            except EndpointError as exc:
+                logger.warning(f'RPC endpoint failed, failing over: {exc}')
+                last_exc = exc
+
+        raise last_exc
+
+    def _hedged(self, endpoints, method, params):
+        primary, secondary = endpoints[0], endpoints[1]
+        delay = primary.p95()
+
+        first = self._pool.submit(self._failover, endpoints, method, params)
+        if delay is None:
+            return first.result()
+
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        # The primary endpoint is slow, race a duplicate on the secondary
+        second = self._pool.submit(self._failover, [secondary] + endpoints,
+                                   method, params)
+        futures = {first, second}
+
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+
+        return first.result()
+
+    def make_request(self, method, params):
+        endpoints = self.ranked()
+
+        if self.hedge and method in READ_METHODS and len(endpoints) > 1:
+            return self._hedged(endpoints, method, params)
+
+        return self._failover(endpoints, method, params)
+
+    def send_batch(self, payload):
+        """Send a JSON-RPC batch with failover.
+
+        Parameters
+        ----------
+        payload : list
+            The JSON-RPC batch requests.
+
+        Returns
+        -------
+        responses : list or dict
+            The decoded JSON body of the batch response.
+        """
+
+        logger = logging.getLogger('minter')
+
+        last_exc = None
+        for endpoint in self.ranked():
+            start = time.monotonic()
+
+            try:
+                response = self._session.post(endpoint.url,
+                                              json=payload,
+                                              **self.request_kwargs)
+                response.raise_for_status()
+                responses = response.json()
+            except (requests.RequestException, ValueError) as exc:
+                endpoint.record(error=True, cooldown=self.cooldown)
+                logger.warning(f'RPC endpoint failed, failing over: {exc}')
+                last_exc = exc
+                continue
+
+            endpoint.record(latency=(time.monotonic() - start) /
+                            max(1, len(payload)))
+
+            return responses
+
+        raise EndpointError(f'All RPC endpoints failed: {last_exc}')
+
+    def is_connected(self, show_traceback=False):
+        return any(endpoint.provider.is_connected()
+                   for endpoint in self.endpoints)
@@ -1,9 +1,16 @@
 """Signer utility functions."""
 
-from eth_account.messages import encode_defunct
+from eth_keys.backends import CoinCurveECCBackend
+from eth_keys.backends import NativeECCBackend
+from eth_keys.backends import is_coincurve_available
+from eth_keys.datatypes import PrivateKey
+from eth_utils import keccak
 
+# Prefix of EIP-191 personal messages for a 32 bytes payload
+ETH_SIGNED_MESSAGE_PREFIX = b'\x19Ethereum Signed Message:\n32'
 
-def set_signer(web3_obj, private_key, contract, signer_address):
+
+def set_signer(web3_obj, private_key, contract, signer_address, wait=True):
     """Sets the signer address.
     
     Parameters
@@ -16,22 +23,27 @@ def set_signer(web3_obj, private_key, contract, signer_address):
         The contract object.
     signer_address : str
         The signer address.
+    wait : bool, optional
+        Wait for the transaction receipt, by default True. Otherwise the
+        transaction hash is returned right after sending the transaction.
     """
 
-    # Set the signer address
-    txn = contract.functions.setSigner(signer_address).build_transaction({
-        'nonce':
-        web3_obj.eth.get_transaction_count(signer_address),
-        'gas':
-        100000
-    })
+    # Imported here so offline signers do not load the web3 stack
+    from utils.transaction import send_transaction
+    from utils.transaction import wait_for_receipt
+
+    # The transaction is sent by the owner of the private key
+    sender = web3_obj.eth.account.from_key(private_key).address
+
+    # Set the signer address, wait for the transaction receipt if required
+    txn_hash = send_transaction(web3_obj,
+                                contract.functions.setSigner(signer_address),
+                                private_key, sender, {})
 
-    # Sign the transaction
-    txn_signed = web3_obj.eth.account.sign_transaction(txn, private_key)
+    if not wait:
+        return txn_hash.hex()
 
-    # Send the transaction and wait for the transaction receipt
-    txn_hash = web3_obj.eth.send_raw_transaction(txn_signed.rawTransaction)
-    txn_receipt = web3_obj.eth.wait_for_transaction_receipt(txn_hash)
+    txn_receipt = wait_for_receipt(web3_obj, txn_hash, sender)
     txn_receipt = txn_receipt.transactionHash.hex()
 
     return txn_receipt
@@ -57,6 +69,10 @@ def sign_message(web3_obj, private_key, message):
         The signature.
     """
 
+    # Imported here since eth_account pulls in a heavy import chain that
+    # offline signers using `MessageSigner` never need
+    from eth_account.messages import encode_defunct
+
     # Sign the message
     base_message = web3_obj.keccak(text=message)
     message = encode_defunct(base_message)
@@ -67,3 +83,90 @@ def sign_message(web3_obj, private_key, message):
     signature = signed_message.signature.hex()
 
     return message_hash, signature
+
+
+def build_message(data):
+    """Validate token data and build the message to sign.
+
+    Parameters
+    ----------
+    data : dict
+        The token data with `address` and hex `token_id` fields.
+
+    Returns
+    -------
+    message : str
+        The message to sign.
+
+    Raises
+    ------
+    ValueError
+        If the token ID or the address are not valid.
+    """
+
+    try:
+        token_id = int(data['token_id'], 16)
+    except ValueError as exc:
+        raise ValueError("Invalid token_id!") from exc
+
+    wallet_address = data['address']
+
+    if len(wallet_address) != 42:
+        raise ValueError("Address is probably wrong!")
+
+    return f"{wallet_address}_{token_id}"
+
+
+class MessageSigner:
+    """Long-lived signer holding a pre-parsed private key.
+
+    Produces the same message hashes and signatures as `sign_message`, but
+    parses the key once and signs with the fastest available secp256k1
+    backend (coincurve when installed) instead of the web3 account layer.
+
+    Parameters
+    ----------
+    private_key : bytes
+        The private key loaded from config.
+    """
+
+    def __init__(self, private_key):
+        if is_coincurve_available():
+            backend = CoinCurveECCBackend()
+        else:
+            backend = NativeECCBackend()
+
+        self._private_key = private_key
+        self._key = PrivateKey(private_key, backend=backend)
+        self.address = self._key.public_key.to_checksum_address()
+
+    def __reduce__(self):
+        # Pickle only the raw key so process pool workers re-parse it once
+        return (MessageSigner, (self._private_key, ))
+
+    def sign(self, message):
+        """Signs a message with the server's private key.
+
+        Parameters
+        ----------
+        message : str
+            The message to sign.
+
+        Returns
+        -------
+        message_hash : str
+            The message hash.
+        signature : str
+            The signature.
+        """
+
+        # Hash the message as an EIP-191 personal message of its keccak
+        base_message = keccak(text=message)
+        message_hash = keccak(ETH_SIGNED_MESSAGE_PREFIX + base_message)
+
+        # Sign the hash, with `v` in the Ethereum format (27 or 28)
+        v, r, s = self._key.sign_msg_hash(message_hash).vrs
+        signature = r.to_bytes(32, 'big') + s.to_bytes(32, 'big') + bytes(
+            [v + 27])
+
+        return '0x' + message_hash.hex(), '0x' + signature.hex()
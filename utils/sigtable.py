@@ -0,0 +1,198 @@
+"""Tables of pre-generated signatures served from a memory-mapped file.
+
+The table starts with a header holding a magic string, the address of the
+signer and the number of records. Each record holds the keccak of a message,
+its EIP-191 message hash and its 65-byte signature, and the records are
+sorted by the keccak of the message so they can be binary searched.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import tempfile
+
+from eth_utils import keccak
+from eth_utils import to_checksum_address
+
+from utils.executor import sign_many
+
+MAGIC = b'SIGTAB01'
+HEADER = struct.Struct('<8s20sQ')
+
+KEY_SIZE = 32
+HASH_SIZE = 32
+SIGNATURE_SIZE = 65
+RECORD_SIZE = KEY_SIZE + HASH_SIZE + SIGNATURE_SIZE
+
+
+def build_signature_table(messages, signer, path, workers=None, chunksize=256):
+    """Sign messages on all cores and write them to a signature table.
+
+    Parameters
+    ----------
+    messages : iterable
+        The messages to sign. Repeated messages are stored once.
+    signer : MessageSigner
+        The signer used to sign the messages.
+    path : str
+        The path to the table file, replaced atomically.
+    workers : int, optional
+        The number of worker processes, by default the number of CPUs.
+    chunksize : int, optional
+        The number of messages sent to a worker at once, by default 256.
+
+    Returns
+    -------
+    count : int
+        The number of records of the table.
+    """
+
+    messages = list(dict.fromkeys(messages))
+    signed = sign_many(signer, messages, workers, chunksize)
+
+    # The key leads the record, so records sort by key
+    records = sorted(
+        keccak(text=message) + bytes.fromhex(message_hash[2:]) +
+        bytes.fromhex(signature[2:])
+        for message, (message_hash, signature) in zip(messages, signed))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(
+            HEADER.pack(MAGIC, bytes.fromhex(signer.address[2:]),
+                        len(records)))
+        f.writelines(records)
+    os.replace(tmp_path, path)
+
+    return len(records)
+
+
+class SignatureTable:
+    """Memory-mapped table of pre-generated signatures.
+
+    Parameters
+    ----------
+    path : str
+        The path to the table file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, signer, self.count = HEADER.unpack_from(self._mmap)
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a signature table')
+
+            if len(self._mmap) != HEADER.size + RECORD_SIZE * self.count:
+                raise ValueError(f'Truncated signature table {path}')
+        except (ValueError, struct.error):
+            self._mmap.close()
+            raise
+
+        self.signer = to_checksum_address(signer)
+
+    def close(self):
+        """Unmap the table file."""
+
+        self._mmap.close()
+
+    def get(self, message):
+        """Find the signature of a message.
+
+        Parameters
+        ----------
+        message : str
+            The signed message.
+
+        Returns
+        -------
+        value : tuple or None
+            The message hash and signature, or None if the message is not in
+            the table.
+        """
+
+        key = keccak(text=message)
+        low, high = 0, self.count
+
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * RECORD_SIZE
+
+            if self._mmap[offset:offset + KEY_SIZE] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        offset = HEADER.size + low * RECORD_SIZE
+        if low == self.count or self._mmap[offset:offset + KEY_SIZE] != key:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        offset += KEY_SIZE
+        message_hash = self._mmap[offset:offset + HASH_SIZE]
+        signature = self._mmap[offset + HASH_SIZE:offset + HASH_SIZE +
+                               SIGNATURE_SIZE]
+
+        return '0x' + message_hash.hex(), '0x' + signature.hex()
+
+    def stats(self):
+        """Return the usage statistics of the table.
+
+        Returns
+        -------
+        stats : dict
+            The number of records, hits and misses.
+        """
+
+        return {
+            'size': self.count,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def load_signature_table(config, signer_address):
+    """Load the signature table of the `[signer]` config section.
+
+    The table is only used if it was generated by the current signer.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+    signer_address : str
+        The address of the signing key.
+
+    Returns
+    -------
+    table : SignatureTable or None
+        The signature table, or None if none is configured or it belongs to
+        another signer.
+    """
+
+    logger = logging.getLogger('minter')
+
+    path = config.get('signer', 'signature_table', fallback='')
+    if not path:
+        return None
+
+    table = SignatureTable(path)
+
+    if table.signer != signer_address:
+        logger.warning(f'Signature table {path} was generated by '
+                       f'{table.signer}, not {signer_address}, ignoring it')
+        table.close()
+        return None
+
+    logger.info(f'Loaded {table.count} signatures from {path}')
+
+    return table
@@ -0,0 +1,377 @@
+"""Compact snapshots of token IDs and their owners for bulk migrations.
+
+Token IDs are stored as 32-byte big-endian records and owners are interned
+into a table of 20-byte addresses referenced by index, instead of Python
+ints and strings. A snapshot is built from a `{hex token: owner}` JSON file
+with a streaming parser, so the file is never fully loaded, and can be saved
+in a binary format that is memory-mapped when loaded.
+
+The binary format is a header with a magic string, the number of tokens and
+the number of owners, followed by the token IDs, the owner index of each
+token as little-endian 32-bit integers and the owner table.
+"""
+
+import mmap
+import re
+import struct
+import sys
+
+from array import array
+from collections.abc import Sequence
+
+from eth_utils import to_checksum_address
+
+MAGIC = b'TOKSNAP1'
+HEADER = struct.Struct('<8sQQ')
+
+TOKEN_SIZE = 32
+ADDRESS_SIZE = 20
+
+# A `"key": "value"` pair of a flat JSON object and the separator after it
+_PAIR = re.compile(r'\s*"([^"\\]*)"\s*:\s*"([^"\\]*)"\s*([,}])')
+_EMPTY = re.compile(r'\s*}\s*')
+
+
+def iter_token_pairs(path, chunk_size=1 << 20):
+    """Iterate over the pairs of a `{hex token: owner}` JSON file.
+
+    The file is read in chunks, so memory use does not grow with its size.
+    Only flat objects of strings without escapes are supported, which is the
+    format of the token files. Repeated keys are yielded each time.
+
+    Parameters
+    ----------
+    path : str
+        The path to the JSON file.
+    chunk_size : int, optional
+        The number of characters read at once, by default 1 MiB.
+
+    Yields
+    ------
+    token : str
+        The hex token ID.
+    owner : str
+        The owner address.
+    """
+
+    with open(path, encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+
+        if not buffer.startswith('{'):
+            raise ValueError(f'{path} is not a JSON object')
+
+        pos, eof, empty = 1, False, True
+        while True:
+            match = _PAIR.match(buffer, pos)
+
+            if match is None:
+                if empty and _EMPTY.fullmatch(buffer, pos):
+                    return
+
+                if eof:
+                    raise ValueError(f'Invalid token file {path} near '
+                                     f'{buffer[pos:pos + 80]!r}')
+
+                chunk = f.read(chunk_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+
+            empty = False
+            yield match.group(1), match.group(2)
+            pos = match.end()
+
+            if match.group(3) == '}':
+                if buffer[pos:].strip() or f.read(chunk_size).strip():
+                    raise ValueError(f'Trailing data in token file {path}')
+                return
+
+
+class TokenIds(Sequence):
+    """Sequence of token IDs as int over 32-byte records.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The concatenated big-endian token IDs.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def __len__(self):
+        return len(self._data) // TOKEN_SIZE
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('token index out of range')
+
+        start = index * TOKEN_SIZE
+        return int.from_bytes(self._data[start:start + TOKEN_SIZE], 'big')
+
+
+class Owners(Sequence):
+    """Sequence of checksum owner addresses over an interned table.
+
+    Parameters
+    ----------
+    indices : array or memoryview
+        The index in the table of the owner of each token.
+    table : bytes-like
+        The concatenated 20-byte addresses.
+    """
+
+    def __init__(self, indices, table):
+        self._indices = indices
+        self._table = table
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+
+        return to_checksum_address(self.address(self._indices[index]))
+
+    def address(self, owner_index):
+        """Return an address of the table.
+
+        Parameters
+        ----------
+        owner_index : int
+            The index of the owner in the table.
+
+        Returns
+        -------
+        address : bytes
+            The 20-byte address.
+        """
+
+        start = owner_index * ADDRESS_SIZE
+        return bytes(self._table[start:start + ADDRESS_SIZE])
+
+
+class TokenSnapshot:
+    """Token IDs and owners in compact arrays.
+
+    `tokens` and `owners` are sequences decoding each item on access, so
+    they can be sliced and passed where lists of token IDs and owners are
+    expected without materializing the whole snapshot.
+
+    Parameters
+    ----------
+    ids : bytes-like
+        The concatenated 32-byte big-endian token IDs.
+    owner_indices : array or memoryview
+        The index in the owner table of the owner of each token.
+    owner_table : bytes-like
+        The concatenated 20-byte owner addresses.
+    """
+
+    def __init__(self, ids, owner_indices, owner_table):
+        if len(ids) != TOKEN_SIZE * len(owner_indices):
+            raise ValueError('Tokens and owners should have the same size')
+
+        self._ids = ids
+        self._owner_indices = owner_indices
+        self._owner_table = owner_table
+        self._mmap = None
+        self.tokens = TokenIds(ids)
+        self.owners = Owners(owner_indices, owner_table)
+
+    def __len__(self):
+        return len(self._owner_indices)
+
+    def __iter__(self):
+        return zip(self.tokens, self.owners)
+
+    @property
+    def owner_count(self):
+        """The number of distinct owners."""
+
+        return len(self._owner_table) // ADDRESS_SIZE
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Build a snapshot from `(token, owner)` pairs.
+
+        Like `json.load`, a repeated token keeps its first position and the
+        owner of its last pair.
+
+        Parameters
+        ----------
+        pairs : iterable
+            The token IDs, as int or hex strings, and their owner addresses.
+
+        Returns
+        -------
+        snapshot : TokenSnapshot
+            The snapshot.
+
+        Raises
+        ------
+        ValueError
+            If a token ID does not fit in 32 bytes or an owner is not an
+            address.
+        """
+
+        ids, owner_indices, owner_table = bytearray(), array('I'), bytearray()
+        interned, positions = {}, {}
+
+        for name, owner in pairs:
+            token = int(name, 16) if isinstance(name, str) else name
+
+            try:
+                record = token.to_bytes(TOKEN_SIZE, 'big')
+            except OverflowError:
+                raise ValueError(f'Token {name} does not fit in '
+                                 f'{TOKEN_SIZE} bytes') from None
+
+            address = bytes.fromhex(owner[2:] if owner[:2].lower() ==
+                                    '0x' else owner)
+            if len(address) != ADDRESS_SIZE:
+                raise ValueError(f'Invalid owner address: {owner}')
+
+            owner_index = interned.get(address)
+            if owner_index is None:
+                owner_index = len(interned)
+                interned[address] = owner_index
+                owner_table += address
+
+            position = positions.get(token)
+            if position is not None:
+                owner_indices[position] = owner_index
+                continue
+
+            positions[token] = len(owner_indices)
+            ids += record
+            owner_indices.append(owner_index)
+
+        return cls(ids, owner_indices, owner_table)
+
+    @classmethod
+    def from_json(cls, path, chunk_size=1 << 20):
+        """Build a snapshot from a `{hex token: owner}` JSON file.
+
+        Parameters
+        ----------
+        path : str
+            The path to the JSON file.
+        chunk_size : int, optional
+            The number of characters read at once, by default 1 MiB.
+
+        Returns
+        -------
+        snapshot : TokenSnapshot
+            The snapshot.
+        """
+
+        return cls.from_pairs(iter_token_pairs(path, chunk_size))
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a binary snapshot.
+
+        Parameters
+        ----------
+        path : str
+            The path to the snapshot file.
+
+        Returns
+        -------
+        snapshot : TokenSnapshot
+            The snapshot, backed by the mapped file until closed.
+        """
+
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, count, owner_count = HEADER.unpack_from(mapped)
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a token snapshot')
+
+            ids_end = HEADER.size + TOKEN_SIZE * count
+            indices_end = ids_end + 4 * count
+            table_end = indices_end + ADDRESS_SIZE * owner_count
+            if len(mapped) != table_end:
+                raise ValueError(f'Truncated token snapshot {path}')
+        except (ValueError, struct.error):
+            mapped.close()
+            raise
+
+        view = memoryview(mapped)
+        if sys.byteorder == 'little':
+            owner_indices = view[ids_end:indices_end].cast('I')
+        else:
+            owner_indices = array('I', view[ids_end:indices_end])
+            owner_indices.byteswap()
+
+        snapshot = cls(view[HEADER.size:ids_end], owner_indices,
+                       view[indices_end:table_end])
+        snapshot._mmap = (mapped, view)
+
+        return snapshot
+
+    def save(self, path):
+        """Write the snapshot in the binary format.
+
+        Parameters
+        ----------
+        path : str
+            The path to the snapshot file.
+        """
+
+        owner_indices = array('I', self._owner_indices)
+        if sys.byteorder != 'little':
+            owner_indices.byteswap()
+
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(self), self.owner_count))
+            f.write(self._ids)
+            f.write(owner_indices.tobytes())
+            f.write(self._owner_table)
+
+    def close(self):
+        """Unmap the file of a loaded snapshot."""
+
+        if self._mmap is None:
+            return
+
+        mapped, view = self._mmap
+        self._mmap = None
+
+        # The views must be released before the map is closed
+        for data in (self._ids, self._owner_indices, self._owner_table):
+            if isinstance(data, memoryview):
+                data.release()
+        view.release()
+        mapped.close()
+
+
+def load_tokens(path):
+    """Load a token snapshot from a binary snapshot or a JSON file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the binary snapshot or JSON file.
+
+    Returns
+    -------
+    snapshot : TokenSnapshot
+        The snapshot.
+    """
+
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+
+    if magic == MAGIC:
+        return TokenSnapshot.load(path)
+
+    return TokenSnapshot.from_json(path)
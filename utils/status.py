@@ -0,0 +1,248 @@
+"""Read-through cache of token statuses for the API."""
+
+import asyncio
+import time
+
+from collections import OrderedDict
+
+from utils.ownership import fetch_statuses
+
+
+class TokenStatusReader:
+    """Serve token statuses from a TTL cache, coalescing chain reads.
+
+    Lookups of the same token while a read is in flight wait for that read
+    instead of starting another one. Misses arriving within `batch_window`
+    seconds of each other are read together in one JSON-RPC batch, so a
+    burst of requests costs one chain read per token at most.
+
+    It must be used from a single event loop.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    maxsize : int, optional
+        The maximum number of cached statuses, by default 100000. A value of
+        0 disables the cache, but reads are still coalesced.
+    ttl : float, optional
+        The time to live of each status in seconds, by default 10.
+    batch_window : float, optional
+        Seconds misses wait for others to be read in the same batch, by
+        default 0.005.
+    batch_size : int, optional
+        The maximum number of tokens per batch, by default 100.
+    """
+
+    def __init__(self,
+                 w3,
+                 contract,
+                 maxsize=100000,
+                 ttl=10,
+                 batch_window=0.005,
+                 batch_size=100):
+        self.w3 = w3
+        self.contract = contract
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.reads = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._queue = []
+        self._flush_handle = None
+        self._tasks = set()
+
+    def _cached(self, token_id):
+        entry = self._entries.get(token_id)
+
+        if entry is None:
+            return None
+
+        expires_at, token_status = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[token_id]
+            return None
+
+        self._entries.move_to_end(token_id)
+
+        return token_status
+
+    def _store(self, token_id, token_status):
+        if self.maxsize <= 0:
+            return
+
+        self._entries[token_id] = (time.monotonic() + self.ttl, token_status)
+        self._entries.move_to_end(token_id)
+
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get_many(self, token_ids):
+        """Return the status of many tokens.
+
+        Parameters
+        ----------
+        token_ids : list
+            List of token IDs as int.
+
+        Returns
+        -------
+        statuses : dict
+            Dict with the `exists`, `owner` and `token_uri` fields of each
+            token.
+
+        Raises
+        ------
+        Exception
+            The error of the first failed read, e.g. an `RPCError`.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        statuses, waiting = {}, {}
+        for token_id in dict.fromkeys(token_ids):
+            token_status = self._cached(token_id)
+
+            if token_status is not None:
+                self.hits += 1
+                statuses[token_id] = token_status
+                continue
+
+            self.misses += 1
+            future = self._inflight.get(token_id)
+
+            if future is not None:
+                self.coalesced += 1
+            else:
+                future = loop.create_future()
+                self._inflight[token_id] = future
+                self._queue.append(token_id)
+
+            waiting[token_id] = future
+
+        if self._queue and self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window,
+                                                 self._flush)
+
+        # Shielded so a cancelled request does not cancel shared reads, and
+        # gathered to the end so every failed read is retrieved
+        shielded = [asyncio.shield(future) for future in waiting.values()]
+        results = await asyncio.gather(*shielded, return_exceptions=True)
+
+        for token_id, result in zip(waiting, results):
+            if isinstance(result, Exception):
+                raise result
+
+            statuses[token_id] = result
+
+        return statuses
+
+    async def get(self, token_id):
+        """Return the status of a token.
+
+        Parameters
+        ----------
+        token_id : int
+            The token ID.
+
+        Returns
+        -------
+        status : dict
+            The `exists`, `owner` and `token_uri` fields of the token.
+        """
+
+        return (await self.get_many([token_id]))[token_id]
+
+    def _flush(self):
+        self._flush_handle = None
+        queue, self._queue = self._queue, []
+
+        for start in range(0, len(queue), self.batch_size):
+            task = asyncio.ensure_future(
+                self._read(queue[start:start + self.batch_size]))
+
+            # Keep a reference until the read is done
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _read(self, token_ids):
+        loop = asyncio.get_running_loop()
+        self.reads += 1
+
+        try:
+            statuses = await loop.run_in_executor(None, fetch_statuses,
+                                                  self.w3, self.contract,
+                                                  token_ids)
+        except Exception as exc:  # pylint: disable=broad-except
+            for token_id in token_ids:
+                future = self._inflight.pop(token_id)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for token_id in token_ids:
+            self._store(token_id, statuses[token_id])
+
+            future = self._inflight.pop(token_id)
+            if not future.done():
+                future.set_result(statuses[token_id])
+
+    def stats(self):
+        """Return the usage statistics of the reader.
+
+        Returns
+        -------
+        stats : dict
+            The size, hits, misses, coalesced lookups, batched reads and hit
+            rate.
+        """
+
+        lookups = self.hits + self.misses
+
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'reads': self.reads,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def create_token_status_reader(config, w3, contract):
+    """Create a token status reader from the `[status]` config section.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+
+    Returns
+    -------
+    reader : TokenStatusReader
+        The token status reader.
+    """
+
+    return TokenStatusReader(w3,
+                             contract,
+                             maxsize=config.getint('status',
+                                                   'size',
+                                                   fallback=100000),
+                             ttl=config.getfloat('status', 'ttl', fallback=10),
+                             batch_window=config.getfloat('status',
+                                                          'batch_window',
+                                                          fallback=0.005),
+                             batch_size=config.getint('status',
+                                                      'batch_size',
+                                                      fallback=100))
@@ -0,0 +1,330 @@
+"""Buffer of token IDs prefetched from the minting service."""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from collections import deque
+
+import requests
+
+
+class TokenIdBuffer:
+    """Keep a bounded buffer of token IDs fetched ahead of time.
+
+    A background thread refills the buffer whenever it drops to `low_water`
+    IDs, over one keep-alive HTTP session. Consumers take IDs from memory and
+    only wait for the service when the buffer runs empty.
+
+    If `batch_size` is set, the service is asked for that many IDs at once
+    with a `count` query parameter and may answer a JSON list of `{"id": ...}`
+    objects. A single object is accepted too, so services without batch
+    support still work, one ID per request.
+
+    The IDs were reserved by the service, so the ones still buffered when
+    the buffer stops are logged and returned, and saved to `unused_path` if
+    set. The IDs of that file are served first by the next buffer using it.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the service.
+    size : int, optional
+        The maximum number of buffered IDs, by default 64.
+    low_water : int, optional
+        The number of buffered IDs that triggers a refill, by default 16.
+    batch_size : int, optional
+        The number of IDs requested at once, by default 0 (one per request).
+    timeout : float, optional
+        The HTTP timeout in seconds, by default 5.
+    backoff : float, optional
+        Seconds waited after a failed request, doubled on each failure up to
+        30 seconds, by default 0.5.
+    alpha : float, optional
+        The smoothing factor of the average refill latency, by default 0.2.
+    unused_path : str, optional
+        JSON file of the IDs left unused by an earlier buffer, by default
+        None.
+    """
+
+    def __init__(self,
+                 url,
+                 size=64,
+                 low_water=16,
+                 batch_size=0,
+                 timeout=5,
+                 backoff=0.5,
+                 alpha=0.2,
+                 unused_path=None):
+        self.url = url
+        self.size = size
+        self.low_water = min(low_water, size - 1)
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.backoff = backoff
+        self.alpha = alpha
+        self.served = 0
+        self.fetched = 0
+        self.requests = 0
+        self.errors = 0
+        self.waits = 0
+        self.last_latency = None
+        self.mean_latency = None
+        self.unused_path = unused_path
+        self._ids = queue.Queue(maxsize=size)
+        self._spare = deque(self._load_unused())
+        self._session = requests.Session()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Start the refill thread."""
+
+        if self._thread is None:
+            self._stop.clear()
+            self._wakeup.set()
+            self._thread = threading.Thread(target=self._run,
+                                            name='token-id-buffer',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the refill thread and close the HTTP session.
+
+        Returns
+        -------
+        unused : list
+            The IDs fetched but not served, also saved to `unused_path`.
+        """
+
+        logger = logging.getLogger('minter')
+
+        self._stop.set()
+        self._wakeup.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self._session.close()
+
+        unused = list(self._spare)
+        self._spare.clear()
+        while True:
+            try:
+                unused.append(self._ids.get_nowait())
+            except queue.Empty:
+                break
+
+        if unused:
+            logger.warning(f'{len(unused)} reserved token IDs were not '
+                           f'used: {unused}')
+
+        if self.unused_path is not None:
+            self._save_unused(unused)
+
+        return unused
+
+    def _load_unused(self):
+        if self.unused_path is None or not os.path.exists(self.unused_path):
+            return []
+
+        with open(self.unused_path, encoding='utf-8') as f:
+            token_ids = json.load(f)
+
+        # Claimed right away, so a crashed run does not serve them twice
+        self._save_unused([])
+
+        return token_ids
+
+    def _save_unused(self, token_ids):
+        with open(self.unused_path, 'w', encoding='utf-8') as f:
+            json.dump(token_ids, f)
+
+    def depth(self):
+        """Return the number of buffered IDs."""
+
+        return self._ids.qsize() + len(self._spare)
+
+    def get(self, timeout=None):
+        """Take a token ID from the buffer.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for an ID when the buffer is empty, by default
+            None (twice the HTTP timeout).
+
+        Returns
+        -------
+        token_id : int or None
+            The token ID, or None if none arrived in time.
+        """
+
+        if timeout is None:
+            timeout = 2 * self.timeout
+
+        try:
+            # IDs left over by an earlier run or a large answer go first
+            token_id = self._spare.popleft()
+        except IndexError:
+            token_id = None
+
+        try:
+            if token_id is None:
+                token_id = self._ids.get_nowait()
+        except queue.Empty:
+            self.waits += 1
+            self._wakeup.set()
+
+            try:
+                token_id = self._ids.get(timeout=timeout)
+            except queue.Empty:
+                logging.getLogger('minter').error(
+                    'No token ID available from the service!')
+                return None
+
+        self.served += 1
+
+        if self._ids.qsize() <= self.low_water:
+            self._wakeup.set()
+
+        return token_id
+
+    def _fetch(self, count):
+        params = {'count': count} if self.batch_size else None
+
+        r = self._session.get(self.url, params=params, timeout=self.timeout)
+        r.raise_for_status()
+
+        data = r.json()
+        if isinstance(data, dict):
+            data = data.get('ids', [data])
+
+        return [
+            item['id'] if isinstance(item, dict) else item for item in data
+        ]
+
+    def _refill(self):
+        while not self._stop.is_set():
+            missing = self.size - self._ids.qsize()
+            if missing <= 0:
+                return
+
+            count = min(missing, self.batch_size) if self.batch_size else 1
+
+            start = time.monotonic()
+            token_ids = self._fetch(count)
+            latency = time.monotonic() - start
+
+            if not token_ids:
+                raise ValueError('The service returned no token IDs')
+
+            self.requests += 1
+            self.last_latency = latency
+            if self.mean_latency is None:
+                self.mean_latency = latency
+            else:
+                self.mean_latency += self.alpha * (latency - self.mean_latency)
+
+            for token_id in token_ids:
+                self.fetched += 1
+
+                # Services may answer more IDs than requested, keep them all
+                try:
+                    self._ids.put_nowait(token_id)
+                except queue.Full:
+                    self._spare.append(token_id)
+
+    def _run(self):
+        logger = logging.getLogger('minter')
+        delay = self.backoff
+
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+            try:
+                self._refill()
+            except (requests.RequestException, ValueError, KeyError,
+                    TypeError) as exc:
+                self.errors += 1
+                logger.warning(f'Token ID refill failed: {exc}')
+
+                # Retry later, unless stopped meanwhile
+                self._stop.wait(delay)
+                delay = min(30, delay * 2)
+                self._wakeup.set()
+                continue
+
+            delay = self.backoff
+
+    def stats(self):
+        """Return the usage statistics of the buffer.
+
+        Returns
+        -------
+        stats : dict
+            The buffer depth, served and fetched IDs, requests, errors,
+            consumer waits and the last and mean refill latency in seconds.
+        """
+
+        return {
+            'depth': self.depth(),
+            'size': self.size,
+            'served': self.served,
+            'fetched': self.fetched,
+            'requests': self.requests,
+            'errors': self.errors,
+            'waits': self.waits,
+            'last_latency': self.last_latency,
+            'mean_latency': self.mean_latency,
+        }
+
+
+def create_token_id_buffer(config):
+    """Create and start a token ID buffer from the config.
+
+    The service URL is read from `[service] url` and the buffer settings
+    from the `[token_ids]` section, including the `unused_file` keeping the
+    IDs left unused between runs.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+
+    Returns
+    -------
+    buffer : TokenIdBuffer
+        The started token ID buffer.
+    """
+
+    unused_path = config.get('token_ids', 'unused_file', fallback='') or None
+    buffer = TokenIdBuffer(config['service']['url'],
+                           size=config.getint('token_ids', 'size',
+                                              fallback=64),
+                           low_water=config.getint('token_ids',
+                                                   'low_water',
+                                                   fallback=16),
+                           batch_size=config.getint('token_ids',
+                                                    'batch_size',
+                                                    fallback=0),
+                           timeout=config.getfloat('token_ids',
+                                                   'timeout',
+                                                   fallback=5),
+                           unused_path=unused_path)
+    buffer.start()
+
+    return buffer
@@ -0,0 +1,398 @@
+"""Utility functions for sending transactions."""
+
+import logging
+import math
+
+from hexbytes import HexBytes
+from web3.exceptions import TimeExhausted
+from web3.exceptions import TransactionNotFound
+
+from utils.builder import get_async_transaction_builder
+from utils.builder import get_transaction_builder
+from utils.fees import get_fee_oracle
+from utils.nonce import get_async_nonce_manager
+from utils.nonce import get_nonce_manager
+from utils.nonce import is_known_transaction
+from utils.nonce import is_nonce_error
+
+
+def sign_transaction(w3,
+                     contract_function,
+                     private_key,
+                     sender,
+                     params,
+                     nonce=None):
+    """Build and sign a contract transaction with a local nonce.
+
+    The transaction is built by the transaction builder shared by the web3
+    object, from the cached chain id and fees, so no RPC is needed once the
+    cache is warm.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract_function
+        The contract function call, e.g. `contract.functions.X(...)`.
+    private_key : str
+        The private key of the sender.
+    sender : str
+        The sender address.
+    params : dict
+        The transaction parameters, without the nonce.
+    nonce : int, optional
+        The nonce to use, e.g. to replace a pending transaction. By default
+        the next nonce of the shared nonce manager.
+
+    Returns
+    -------
+    txn : dict
+        The transaction dictionary.
+    txn_signed : SignedTransaction
+        The signed transaction.
+    """
+
+    nonce_manager = get_nonce_manager(w3)
+    sender = w3.to_checksum_address(sender)
+    managed = nonce is None
+
+    if managed:
+        nonce = nonce_manager.next_nonce(sender)
+
+    try:
+        txn = get_transaction_builder(w3).build(contract_function, sender,
+                                                params, nonce)
+
+        # Sign the transaction
+        txn_signed = w3.eth.account.sign_transaction(txn, private_key)
+    except Exception:
+        # The nonce was not used, so the local sequence has a gap
+        if managed:
+            nonce_manager.resync(sender)
+        raise
+
+    return txn, txn_signed
+
+
+def send_signed_transaction(w3, txn_signed):
+    """Send a signed transaction, tolerating copies that were already sent.
+
+    A send retried after a timeout, or failed over to another endpoint, may
+    find the transaction already in the mempool or even mined. Its hash is
+    returned then, instead of an error that would make the caller send a
+    second copy with a new nonce.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    txn_signed : SignedTransaction
+        The signed transaction.
+
+    Returns
+    -------
+    txn_hash : HexBytes
+        The transaction hash.
+    """
+
+    try:
+        return w3.eth.send_raw_transaction(txn_signed.rawTransaction)
+    except ValueError as exc:
+        if is_known_transaction(exc):
+            return HexBytes(txn_signed.hash)
+
+        if not is_nonce_error(exc):
+            raise
+
+        # The nonce may have been used by this very transaction
+        try:
+            w3.eth.get_transaction(txn_signed.hash)
+        except TransactionNotFound:
+            raise exc from None
+
+        return HexBytes(txn_signed.hash)
+
+
+def send_transaction(w3, contract_function, private_key, sender, params):
+    """Build, sign and send a contract transaction with a local nonce.
+
+    The nonce is taken from the nonce manager shared by the web3 object. If
+    the provider rejects the nonce, the account is resynced and the
+    transaction is signed once more with a fresh nonce. Transactions the
+    provider already knows are not sent again.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract_function
+        The contract function call, e.g. `contract.functions.X(...)`.
+    private_key : str
+        The private key of the sender.
+    sender : str
+        The sender address.
+    params : dict
+        The transaction parameters, without the nonce.
+
+    Returns
+    -------
+    txn_hash : HexBytes
+        The transaction hash.
+    """
+
+    logger = logging.getLogger('minter')
+
+    nonce_manager = get_nonce_manager(w3)
+    sender = w3.to_checksum_address(sender)
+
+    for attempt in range(2):
+        txn, txn_signed = sign_transaction(w3, contract_function, private_key,
+                                           sender, params)
+
+        try:
+            # Send the transaction
+            return send_signed_transaction(w3, txn_signed)
+        except ValueError as exc:
+            # The nonce was not used, so the local sequence has a gap
+            nonce_manager.resync(sender)
+
+            if attempt > 0 or not is_nonce_error(exc):
+                raise
+
+            logger.warning(f"Nonce {txn['nonce']} rejected for {sender}: "
+                           f"{exc}")
+        except Exception:
+            nonce_manager.resync(sender)
+            raise
+
+    return None
+
+
+def bump_fees(txn, factor=1.125):
+    """Return the fee parameters of a transaction increased by a factor.
+
+    Nodes only accept a replacement of a pending transaction when its fees
+    are at least 10% higher, so the default factor is 12.5%.
+
+    Parameters
+    ----------
+    txn : dict
+        The transaction dictionary, or just its fee parameters.
+    factor : float, optional
+        The increase factor, by default 1.125.
+
+    Returns
+    -------
+    fees : dict
+        The increased `maxFeePerGas` and `maxPriorityFeePerGas`, or
+        `gasPrice` for legacy transactions.
+    """
+
+    fee_keys = ('maxFeePerGas', 'maxPriorityFeePerGas', 'gasPrice')
+
+    return {
+        key: math.ceil(txn[key] * factor) + 1
+        for key in fee_keys if txn.get(key) is not None
+    }
+
+
+def replacement_fees(w3, txn, factor=1.125):
+    """Return the fees of a replacement of a pending transaction.
+
+    The fees of the transaction are bumped by `factor`, and raised to the
+    current suggestion of the fee oracle if the market moved further.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    txn : dict
+        The pending transaction, or just its fee parameters.
+    factor : float, optional
+        The minimum increase factor, by default 1.125.
+
+    Returns
+    -------
+    fees : dict
+        The fee parameters of the replacement.
+    """
+
+    # Dynamic fee transactions also report their effective gas price
+    if txn.get('maxFeePerGas') is not None:
+        txn = {
+            'maxFeePerGas': txn['maxFeePerGas'],
+            'maxPriorityFeePerGas': txn['maxPriorityFeePerGas'],
+        }
+
+    fees = bump_fees(txn, factor)
+    current = get_fee_oracle(w3).fees()
+
+    return {
+        key: max(value, current.get(key, 0))
+        for key, value in fees.items()
+    }
+
+
+def speed_up_transaction(w3, txn_hash, private_key, factor=1.125):
+    """Replace a pending transaction with the same nonce and higher fees.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    txn_hash : str or bytes
+        The hash of the pending transaction.
+    private_key : str
+        The private key of the sender.
+    factor : float, optional
+        The minimum increase factor of the fees, by default 1.125.
+
+    Returns
+    -------
+    txn_hash : HexBytes
+        The hash of the replacement transaction.
+    """
+
+    logger = logging.getLogger('minter')
+
+    pending = w3.eth.get_transaction(txn_hash)
+
+    txn = {
+        'chainId': get_transaction_builder(w3).chain_id,
+        'nonce': pending['nonce'],
+        'to': pending['to'],
+        'value': pending['value'],
+        'data': pending.get('input', pending.get('data')),
+        'gas': pending['gas'],
+        **replacement_fees(w3, pending, factor),
+    }
+
+    txn_signed = w3.eth.account.sign_transaction(txn, private_key)
+    new_hash = send_signed_transaction(w3, txn_signed)
+
+    logger.info(f"Replaced TXN {HexBytes(txn_hash).hex()} with "
+                f"{new_hash.hex()} (nonce {txn['nonce']})")
+
+    return new_hash
+
+
+def wait_for_receipt(w3, txn_hash, sender, timeout=120):
+    """Wait for the receipt of a transaction.
+
+    If the transaction is not mined in time it was probably dropped, so the
+    nonce of the sender is resynced before raising.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    txn_hash : HexBytes
+        The transaction hash.
+    sender : str
+        The sender address.
+    timeout : float, optional
+        The time to wait in seconds, by default 120.
+
+    Returns
+    -------
+    txn_receipt : AttributeDict
+        The transaction receipt.
+    """
+
+    try:
+        return w3.eth.wait_for_transaction_receipt(txn_hash, timeout=timeout)
+    except TimeExhausted:
+        get_nonce_manager(w3).resync(w3.to_checksum_address(sender))
+        raise
+
+
+async def async_send_transaction(w3, contract_function, private_key, sender,
+                                 params):
+    """Build, sign and send a contract transaction with async web3.
+
+    Async version of `send_transaction`, with nonces from the nonce manager
+    and transactions built by the transaction builder shared by the async
+    web3 object.
+
+    Parameters
+    ----------
+    w3 : AsyncWeb3
+        The async web3 object.
+    contract_function
+        The async contract function call, e.g. `contract.functions.X(...)`.
+    private_key : str
+        The private key of the sender.
+    sender : str
+        The sender address.
+    params : dict
+        The transaction parameters, without the nonce.
+
+    Returns
+    -------
+    txn_hash : HexBytes
+        The transaction hash.
+    """
+
+    logger = logging.getLogger('minter')
+
+    nonce_manager = get_async_nonce_manager(w3)
+    sender = w3.to_checksum_address(sender)
+
+    for attempt in range(2):
+        nonce = await nonce_manager.next_nonce(sender)
+
+        try:
+            txn = await get_async_transaction_builder(w3).build(
+                contract_function, sender, params, nonce)
+
+            # Sign the transaction
+            txn_signed = w3.eth.account.sign_transaction(txn, private_key)
+
+            # Send the transaction
+            return await w3.eth.send_raw_transaction(txn_signed.rawTransaction)
+        except ValueError as exc:
+            # The same transaction was already sent, e.g. by a retry
+            if is_known_transaction(exc):
+                return HexBytes(txn_signed.hash)
+
+            # The nonce was not used, so the local sequence has a gap
+            await nonce_manager.resync(sender)
+
+            if attempt > 0 or not is_nonce_error(exc):
+                raise
+
+            logger.warning(f'Nonce {nonce} rejected for {sender}: {exc}')
+        except Exception:
+            await nonce_manager.resync(sender)
+            raise
+
+    return None
+
+
+async def async_wait_for_receipt(w3, txn_hash, sender, timeout=120):
+    """Wait for the receipt of a transaction with async web3.
+
+    Parameters
+    ----------
+    w3 : AsyncWeb3
+        The async web3 object.
+    txn_hash : HexBytes
+        The transaction hash.
+    sender : str
+        The sender address.
+    timeout : float, optional
+        The time to wait in seconds, by default 120.
+
+    Returns
+    -------
+    txn_receipt : AttributeDict
+        The transaction receipt.
+    """
+
+    try:
+        return await w3.eth.wait_for_transaction_receipt(txn_hash,
+                                                         timeout=timeout)
+    except TimeExhausted:
+        await get_async_nonce_manager(w3).resync(w3.to_checksum_address(sender)
+                                                 )
+        raise
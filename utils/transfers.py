@@ -0,0 +1,314 @@
+"""Parallel transfers of tokens from many sender wallets."""
+
+import logging
+import math
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from eth_account import Account
+from hexbytes import HexBytes
+
+from utils.receipts import ReceiptPoller
+from utils.rpc import to_int
+from utils.transaction import send_transaction
+from utils.transaction import speed_up_transaction
+
+
+class RateLimiter:
+    """Token bucket limiting the rate of requests across threads.
+
+    Parameters
+    ----------
+    rate : float
+        The number of requests per second, None or 0 for no limit.
+    burst : int, optional
+        The number of requests allowed at once, by default the rate rounded
+        up.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, math.ceil(rate or 1))
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request is allowed."""
+
+        if not self.rate:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class TransferExecutor:
+    """Send transfers from many senders, in parallel across senders.
+
+    Jobs are grouped into one queue per sender. Each sender sends its
+    transfers in order with nonces from the shared local nonce manager,
+    without waiting for the receipts, up to `max_pending` transactions in
+    flight. Up to `workers` senders run at the same time, and all of them
+    share a receipt poller and a limit of sent transactions per second.
+
+    Parameters
+    ----------
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+    workers : int, optional
+        The number of senders sending at the same time, by default 8.
+    max_pending : int, optional
+        The maximum number of transactions in flight per sender, by default
+        8.
+    rate : float, optional
+        The maximum number of transactions sent per second across senders,
+        by default None (no limit).
+    poll_interval : float, optional
+        Seconds between receipt checks, by default 1.
+    replace_after : int, optional
+        Number of blocks after which a pending transfer is replaced with
+        higher fees, by default None (never).
+    timeout : float, optional
+        Seconds to wait for the receipt of a transfer, by default 120. The
+        nonce of the sender is resynced when a transfer times out.
+    """
+
+    def __init__(self,
+                 w3,
+                 contract,
+                 workers=8,
+                 max_pending=8,
+                 rate=None,
+                 poll_interval=1.0,
+                 replace_after=None,
+                 timeout=120):
+        self.w3 = w3
+        self.contract = contract
+        self.workers = workers
+        self.max_pending = max_pending
+        self.limiter = RateLimiter(rate)
+        self.poll_interval = poll_interval
+        self.replace_after = replace_after
+        self.timeout = timeout
+        self._pending = {}
+        self._condition = threading.Condition()
+
+    def _released(self, sender):
+        with self._condition:
+            self._pending[sender] -= 1
+            self._condition.notify_all()
+
+    def _send_jobs(self, poller, sender, jobs, results):
+        logger = logging.getLogger('minter')
+
+        # Keys are checked once, the jobs of a sender usually share one
+        valid_keys = {}
+
+        for job in jobs:
+            result = results[job['index']]
+            private_key = job['key']
+
+            if private_key not in valid_keys:
+                try:
+                    valid_keys[private_key] = Account.from_key(
+                        private_key).address == sender
+                except ValueError:
+                    valid_keys[private_key] = False
+
+            if not valid_keys[private_key]:
+                result.update(status='error',
+                              error='The key does not match the sender')
+                continue
+
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending[sender] < self.max_pending)
+                self._pending[sender] += 1
+
+            self.limiter.acquire()
+
+            try:
+                txn_hash = send_transaction(
+                    self.w3,
+                    self.contract.functions.safeTransferFrom(
+                        sender, job['to'], job['token_id']), private_key,
+                    sender, {})
+            except Exception as exc:  # pylint: disable=broad-except
+                self._released(sender)
+                logger.warning(f"Transfer of token {job['token_id']} from "
+                               f"{sender} failed: {exc}")
+                result.update(status='error', error=str(exc))
+                continue
+
+            result.update(status='pending',
+                          txn_hash=txn_hash.hex(),
+                          sent_at=time.monotonic())
+
+            result['future'] = poller.track(
+                txn_hash,
+                callback=partial(self._confirmed, sender, result),
+                sender=sender,
+                replace=lambda h, key=private_key: speed_up_transaction(
+                    self.w3, h, key))
+
+    def _confirmed(self, sender, result, future):
+        self._released(sender)
+
+        result['elapsed'] = time.monotonic() - result.pop('sent_at')
+
+        if future.exception() is not None:
+            result.update(status='error', error=str(future.exception()))
+            return
+
+        receipt = future.result()
+        # The receipt has the hash of the replacement, if any was mined
+        result.update(
+            txn_hash=HexBytes(receipt['transactionHash']).hex(),
+            block_number=to_int(receipt['blockNumber']),
+            status='success' if to_int(receipt['status']) == 1 else 'failed')
+
+    def run(self, jobs):
+        """Send transfer jobs and wait for their receipts.
+
+        Parameters
+        ----------
+        jobs : list
+            List of `(from_address, to_address, token_id, private_key)`
+            tuples.
+
+        Returns
+        -------
+        report : list
+            The result of each job, in the same order, with its `from`, `to`,
+            `token_id`, `status`, `txn_hash`, `block_number`, `elapsed`
+            seconds from sending to mining and `error`. The status is
+            'success' or 'failed' once mined, or 'error' if the transfer was
+            not sent or not mined within `timeout` seconds.
+        """
+
+        queues, results = {}, []
+        for index, (from_address, to_address, token_id,
+                    private_key) in enumerate(jobs):
+            sender = self.w3.to_checksum_address(from_address.lower())
+            job = {
+                'index': index,
+                'to': self.w3.to_checksum_address(to_address.lower()),
+                'token_id': token_id,
+                'key': private_key,
+            }
+
+            queues.setdefault(sender, []).append(job)
+            results.append({
+                'from': sender,
+                'to': job['to'],
+                'token_id': token_id,
+                'status': None,
+                'txn_hash': None,
+                'block_number': None,
+                'elapsed': None,
+                'error': None,
+            })
+
+        self._pending = {sender: 0 for sender in queues}
+
+        with ReceiptPoller(self.w3,
+                           poll_interval=self.poll_interval,
+                           timeout=self.timeout,
+                           replace_after=self.replace_after) as poller:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for future in [
+                        pool.submit(self._send_jobs, poller, sender,
+                                    sender_jobs, results)
+                        for sender, sender_jobs in queues.items()
+                ]:
+                    future.result()
+
+            for result in results:
+                future = result.pop('future', None)
+
+                if future is not None:
+                    try:
+                        future.result()
+                    except Exception:  # pylint: disable=broad-except
+                        # Reported in the result of the job
+                        pass
+
+            # Callbacks may still be running right after the futures resolve
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: not any(self._pending.values()))
+
+        return results
+
+
+def summarize_report(report):
+    """Count the jobs of a transfer report per status.
+
+    Parameters
+    ----------
+    report : list
+        The report from `TransferExecutor.run`.
+
+    Returns
+    -------
+    summary : dict
+        The number of jobs per status.
+    """
+
+    summary = {}
+    for result in report:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+
+    return summary
+
+
+def create_transfer_executor(config, w3, contract):
+    """Create a transfer executor from the `[transfers]` config section.
+
+    Parameters
+    ----------
+    config : ConfigParser
+        The configuration object.
+    w3 : Web3
+        The web3 object.
+    contract
+        The contract object.
+
+    Returns
+    -------
+    executor : TransferExecutor
+        The transfer executor.
+    """
+
+    replace_after = config.getint('transfers', 'replace_after', fallback=0)
+
+    return TransferExecutor(
+        w3,
+        contract,
+        workers=config.getint('transfers', 'workers', fallback=8),
+        max_pending=config.getint('transfers', 'max_pending', fallback=8),
+        rate=config.getfloat('transfers', 'rate', fallback=0) or None,
+        poll_interval=config.getfloat('transfers',
+                                      'poll_interval',
+                                      fallback=1.0),
+        replace_after=replace_after or None,
+        timeout=config.getfloat('transfers', 'receipt_timeout', fallback=120))